@@ -1,5 +1,5 @@
-from pieapp.app.start import start_application
+from pieapp.launcher import launch
 
 
 if __name__ == '__main__':
-    start_application()
+    launch()
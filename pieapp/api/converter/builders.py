@@ -2,10 +2,27 @@ import dataclasses as dt
 from pieapp.api.converter.models import *
 
 
+# Output file format: source codecs which can be remuxed into it without encoding
+_STREAM_COPY_CODECS_MAP: dict[str, tuple[str, ...]] = {
+    "mp3": ("mp3",),
+    "wav": ("pcm_u8", "pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_f64le"),
+    "flac": ("flac",),
+    "ogg": ("vorbis", "opus", "flac"),
+    "opus": ("opus",),
+    "m4a": ("aac", "alac"),
+    "mp4": ("aac", "alac", "mp3"),
+}
+
+
+def get_file_format(file_path: Path) -> str:
+    return file_path.suffix.replace(".", "").lower()
+
+
 class QueryBuilder:
 
-    def __init__(self, media_file: MediaFile) -> None:
+    def __init__(self, media_file: MediaFile, output_path: Path = None) -> None:
         self._media_file = media_file
+        self._output_path = output_path or media_file.output_path
         self._metadata = None
         self._file_info = None
 
@@ -25,8 +42,23 @@ class QueryBuilder:
         arguments.extend(arguments)
         self._metadata = {f"metadata:g:{i}": e for i, e in enumerate(arguments)}
 
+    def can_stream_copy(self) -> bool:
+        """
+        Check if the source codec already matches the output file format,
+        so only tags have to be written and the audio stream can be copied as is
+        """
+        info = self._media_file.info
+        if info is None or info.codec is None or not info.codec.name:
+            return False
+
+        output_codecs = _STREAM_COPY_CODECS_MAP.get(get_file_format(self._output_path), ())
+        return info.codec.name.lower() in output_codecs
+
     def build_file_info(self):
         self._file_info = {}
+        if self.can_stream_copy():
+            # Remux only: copy audio stream and keep source tags, which are overridden by the new metadata
+            self._file_info = {"c:a": "copy", "map_metadata": 0}
 
     def build(self) -> dict[str, str]:
         self.build_metadata()
@@ -42,6 +74,7 @@ _BUILDER_FILE_FORMAT_MAP = {
     "mp3": QueryBuilder,
     "mp4": QueryBuilder,
     "wav": QueryBuilder,
+    "flac": QueryBuilder,
     "ogg": VorbisBuilder,
 }
 
@@ -54,3 +87,14 @@ def get_query_builder(media_file: MediaFile) -> QueryBuilder:
     query_builder = _BUILDER_FILE_FORMAT_MAP.get(file_format)
     query_builder = query_builder(media_file)
     return query_builder
+
+
+def get_output_query_builder(media_file: MediaFile, output_path: Path) -> QueryBuilder:
+    """
+    Get query builder by the output file format. Used by multi-target jobs
+    """
+    query_builder = _BUILDER_FILE_FORMAT_MAP.get(get_file_format(output_path))
+    if query_builder is None:
+        return
+
+    return query_builder(media_file, output_path)
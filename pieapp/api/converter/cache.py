@@ -0,0 +1,295 @@
+"""
+Converted outputs and probe results caches
+"""
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+import dataclasses as dt
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from pieapp.api.utils.logger import logger
+from pieapp.api.utils.files import read_json
+from pieapp.api.utils.files import write_json
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import Codec
+from pieapp.api.converter.models import FileInfo
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ProbeProfile
+from pieapp.api.converter.utils import get_content_hash
+from pieapp.api.converter.utils import get_file_fingerprint
+
+
+class ConverterCache:
+    """
+    Remembers which source and output arguments every output file was converted from
+
+    An output is up to date when it still exists unchanged and both the source
+    fingerprint and the output arguments fingerprint are the same as last time
+    """
+
+    def __init__(self, file_path: Union[str, os.PathLike], use_content_hash: bool = False) -> None:
+        self._file_path = Path(file_path)
+        self._use_content_hash = use_content_hash
+        self._lock = threading.Lock()
+        # <output path>: <entry>
+        self._entries: dict[str, dict[str, Any]] = read_json(self._file_path, {}, raise_exception=False) or {}
+        self._is_modified = False
+
+    def is_output_up_to_date(self, source_path: Path, output_path: Path, fingerprint: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(str(output_path))
+
+        if entry is None or entry["arguments"] != fingerprint:
+            return False
+
+        try:
+            if entry["output"] != get_file_fingerprint(output_path):
+                return False
+
+            # Compare content hashes only if they were calculated last time
+            source_fingerprint = get_file_fingerprint(source_path, "hash" in entry["source"])
+        except OSError:
+            return False
+
+        return entry["source"] == source_fingerprint
+
+    def is_up_to_date(self, job: ConverterJob) -> bool:
+        """
+        Check that every output of the job is up to date
+        """
+        outputs = job.get_outputs()
+        if not outputs:
+            return False
+
+        return all(
+            self.is_output_up_to_date(job.media_file.path, output_path, fingerprint)
+            for output_path, _, fingerprint in outputs
+        )
+
+    def update(self, job: ConverterJob) -> None:
+        """
+        Remember every output of successfully converted job
+        """
+        try:
+            source = get_file_fingerprint(job.media_file.path, self._use_content_hash)
+            entries = {
+                str(output_path): {
+                    "source": source,
+                    "arguments": fingerprint,
+                    "output": get_file_fingerprint(output_path),
+                }
+                for output_path, _, fingerprint in job.get_outputs()
+                if output_path.exists()
+            }
+        except OSError as e:
+            logger.debug(f"Can't fingerprint {job.name}: {e!s}")
+            return
+
+        with self._lock:
+            self._entries.update(entries)
+            self._is_modified = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._is_modified:
+                return
+
+            self._file_path.parent.mkdir(parents=True, exist_ok=True)
+            write_json(self._file_path, self._entries)
+            self._is_modified = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._is_modified = True
+
+
+def _dump_probe_model(model: Any) -> str:
+    return json.dumps(dt.asdict(model), ensure_ascii=False, default=str)
+
+
+def _load_file_info(data: str) -> FileInfo:
+    fields = json.loads(data)
+    fields["codec"] = Codec(**fields["codec"]) if fields.get("codec") else None
+    return FileInfo(**fields)
+
+
+def _load_metadata(data: str) -> Metadata:
+    fields = json.loads(data)
+    # Only presence of the attached picture is stored, it's extracted by `CoverCache` on demand
+    fields["album_cover"] = AlbumCover() if fields.get("album_cover") is not None else None
+    if fields.get("year_of_composition"):
+        fields["year_of_composition"] = datetime.date.fromisoformat(fields["year_of_composition"])
+    return Metadata(**fields)
+
+
+# Version of the probe cache schema. Cache is rebuilt when the version is changed
+PROBE_CACHE_SCHEMA_VERSION: int = 2
+
+
+class ProbeCache:
+    """
+    SQLite cache of parsed ffprobe results
+
+    An entry is valid while the file has the same absolute path, size and modification time.
+    With `use_content_hash` the entry is also found by the file content hash, e.g. after the file was copied.
+    Least recently used entries are evicted when the cache is larger than `max_entries`.
+    Summary entries never satisfy full `ProbeProfile` requests
+    """
+
+    def __init__(
+        self,
+        file_path: Union[str, os.PathLike],
+        use_content_hash: bool = False,
+        max_entries: int = 100_000
+    ) -> None:
+        self._file_path = Path(file_path)
+        self._use_content_hash = use_content_hash
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # Paths of cache hits to update their access time on `save`
+        self._accessed: set[str] = set()
+
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self._file_path, check_same_thread=False)
+        schema_version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version != PROBE_CACHE_SCHEMA_VERSION:
+            self._connection.execute("DROP TABLE IF EXISTS probes")
+            self._connection.execute(f"PRAGMA user_version = {PROBE_CACHE_SCHEMA_VERSION:d}")
+
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS probes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                profile TEXT NOT NULL,
+                info TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS probes_hash ON probes (hash);
+            CREATE INDEX IF NOT EXISTS probes_accessed_at ON probes (accessed_at);
+        """)
+
+    def get(
+        self,
+        file_path: Path,
+        profile: str = ProbeProfile.Full
+    ) -> Optional[tuple[FileInfo, Metadata, str]]:
+        """
+        Get cached `FileInfo` and `Metadata` models and their `ProbeProfile` value.
+        Returns `None` if the file was changed or never probed with the profile
+
+        Args:
+            file_path (Path): media file path
+            profile (str): requested `ProbeProfile` value. Full entries are returned for summary requests too
+        """
+        path = str(Path(file_path).absolute())
+        try:
+            fingerprint = get_file_fingerprint(file_path)
+        except OSError:
+            return
+
+        profiles = (ProbeProfile.Full, profile)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT profile, info, metadata FROM probes "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND profile IN (?, ?)",
+                (path, fingerprint["size"], fingerprint["mtime_ns"], *profiles)
+            ).fetchone()
+
+        if row is None and self._use_content_hash:
+            content_hash = get_content_hash(file_path)
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT profile, info, metadata FROM probes "
+                    "WHERE hash = ? AND size = ? AND profile IN (?, ?) LIMIT 1",
+                    (content_hash, fingerprint["size"], *profiles)
+                ).fetchone()
+
+            # Remember the new location of the same content
+            if row is not None:
+                self._insert(path, fingerprint, content_hash, *row)
+
+        if row is None:
+            return
+
+        with self._lock:
+            self._accessed.add(path)
+
+        try:
+            return _load_file_info(row[1]), _load_metadata(row[2]), row[0]
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Broken probe cache entry {path}: {e!s}")
+            self.invalidate(file_path)
+
+    def put(self, file_path: Path, info: FileInfo, metadata: Metadata, profile: str = ProbeProfile.Full) -> None:
+        path = str(Path(file_path).absolute())
+        try:
+            fingerprint = get_file_fingerprint(file_path, self._use_content_hash)
+        except OSError as e:
+            logger.debug(f"Can't fingerprint {path}: {e!s}")
+            return
+
+        self._insert(
+            path,
+            fingerprint,
+            fingerprint.get("hash"),
+            profile,
+            _dump_probe_model(info),
+            _dump_probe_model(metadata)
+        )
+
+    def _insert(
+        self,
+        path: str,
+        fingerprint: dict[str, Any],
+        content_hash: str,
+        profile: str,
+        info: str,
+        metadata: str
+    ) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, fingerprint["size"], fingerprint["mtime_ns"], content_hash, profile, info, metadata, time.time())
+            )
+
+    def invalidate(self, file_path: Path) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM probes WHERE path = ?", (str(Path(file_path).absolute()),))
+            self._connection.commit()
+
+    def save(self) -> None:
+        """
+        Update access time of cache hits, evict least recently used entries and commit changes
+        """
+        with self._lock:
+            now = time.time()
+            self._connection.executemany(
+                "UPDATE probes SET accessed_at = ? WHERE path = ?",
+                [(now, i) for i in self._accessed]
+            )
+            self._accessed.clear()
+            self._connection.execute(
+                "DELETE FROM probes WHERE path IN "
+                "(SELECT path FROM probes ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self._max_entries,)
+            )
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accessed.clear()
+            self._connection.execute("DELETE FROM probes")
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,198 @@
+"""
+Album covers cache
+
+Covers are extracted on demand and stored by their content hash,
+so tracks of one album share one image and one thumbnail
+"""
+import os
+import uuid
+import hashlib
+import dataclasses as dt
+from pathlib import Path
+from typing import Any, Optional
+
+import ffmpeg
+
+from pieapp.api.utils.logger import logger
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.utils import get_file_fingerprint
+
+
+# Image file signatures: <magic bytes>: <file format>
+_IMAGE_SIGNATURES: dict[bytes, str] = {
+    b"\xFF\xD8\xFF": "jpg",
+    b"\x89PNG": "png",
+    b"GIF8": "gif",
+    b"BM": "bmp",
+    b"RIFF": "webp",
+}
+
+# Thumbnail file name suffix and format
+THUMBNAIL_SUFFIX: str = "_small"
+THUMBNAIL_FILE_FORMAT: str = "jpg"
+
+
+def get_image_file_format(data: bytes) -> str:
+    """
+    Get image file format by its signature. Falls back to `jpg`
+    """
+    for signature, file_format in _IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return file_format
+
+    return "jpg"
+
+
+class CoverCache:
+    """
+    Content-addressed cache of extracted album covers and their thumbnails
+
+    Directory size is bounded by `max_size`. The least recently used covers are removed first
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ffmpeg_command: Path,
+        thumbnail_size: int = 264,
+        max_size: int = 64 * 1024 * 1024
+    ) -> None:
+        self._directory = directory
+        self._ffmpeg_command = ffmpeg_command
+        # Maximum thumbnail width and height in pixels
+        self._thumbnail_size = thumbnail_size
+        # Maximum size of the cache directory in bytes
+        self._max_size = max_size
+        # Already extracted covers: <source path>: (<source fingerprint>, <cover hash>)
+        self._sources: dict[str, tuple[dict[str, Any], str]] = {}
+
+    def _find_cover(self, cover_hash: str) -> Optional[Path]:
+        return next(
+            (i for i in self._directory.glob(f"{cover_hash}.*") if i.is_file()),
+            None
+        )
+
+    def _extract_cover(self, file_path: Path) -> Optional[bytes]:
+        """
+        Read the first attached picture of the file without re-encoding
+        """
+        try:
+            stdout, _ = (
+                ffmpeg
+                .input(file_path.as_posix())
+                .output("pipe:", map="0:v:0", vcodec="copy", format="image2pipe", **{"frames:v": 1})
+                .run(cmd=self._ffmpeg_command.as_posix(), capture_stdout=True, capture_stderr=True)
+            )
+        except ffmpeg.Error as e:
+            logger.debug(e.stderr)
+            return
+
+        return stdout or None
+
+    def _create_thumbnail(self, image_path: Path, thumbnail_path: Path) -> bool:
+        try:
+            (
+                ffmpeg
+                .input(image_path.as_posix())
+                .filter(
+                    "scale",
+                    self._thumbnail_size,
+                    self._thumbnail_size,
+                    force_original_aspect_ratio="decrease"
+                )
+                .output(thumbnail_path.as_posix(), **{"frames:v": 1})
+                .run(cmd=self._ffmpeg_command.as_posix(), overwrite_output=True, quiet=True)
+            )
+        except ffmpeg.Error as e:
+            logger.debug(e.stderr)
+            return False
+
+        return True
+
+    def _evict(self, keep_hash: str) -> None:
+        """
+        Remove the least recently used covers until the directory fits `max_size`
+        """
+        covers: dict[str, list[os.stat_result]] = {}
+        files: dict[str, list[Path]] = {}
+        for file in self._directory.iterdir():
+            if not file.is_file():
+                continue
+
+            cover_hash = file.stem.removesuffix(THUMBNAIL_SUFFIX)
+            covers.setdefault(cover_hash, []).append(file.stat())
+            files.setdefault(cover_hash, []).append(file)
+
+        total_size = sum(i.st_size for stats in covers.values() for i in stats)
+        if total_size <= self._max_size:
+            return
+
+        # Cover and its thumbnail are removed together
+        for cover_hash in sorted(covers, key=lambda i: max(j.st_mtime_ns for j in covers[i])):
+            if total_size <= self._max_size:
+                break
+
+            if cover_hash == keep_hash:
+                continue
+
+            for file, stat in zip(files[cover_hash], covers[cover_hash]):
+                file.unlink(missing_ok=True)
+                total_size -= stat.st_size
+
+    def get_album_cover(self, media_file: MediaFile) -> Optional[AlbumCover]:
+        """
+        Get a copy of `AlbumCover` model of the file with the cover paths, the file isn't changed.
+        Cover is extracted on the first call only
+
+        Returns `None` if the file has no attached picture or it can't be extracted
+
+        Args:
+            media_file (MediaFile): probed `MediaFile` model
+        """
+        album_cover = media_file.metadata.album_cover
+        if album_cover is None:
+            return
+
+        source_path = media_file.path.as_posix()
+        fingerprint = get_file_fingerprint(media_file.path)
+        cover_hash = None
+        image_path = None
+        if source_path in self._sources and self._sources[source_path][0] == fingerprint:
+            cover_hash = self._sources[source_path][1]
+            image_path = self._find_cover(cover_hash)
+
+        if image_path is None:
+            data = self._extract_cover(media_file.path)
+            if data is None:
+                return
+
+            # Tracks of one album usually share one picture
+            cover_hash = hashlib.sha1(data).hexdigest()
+            image_path = self._directory / f"{cover_hash}.{get_image_file_format(data)}"
+            if not image_path.exists():
+                self._directory.mkdir(parents=True, exist_ok=True)
+                temp_path = self._directory / f".{uuid.uuid4().hex}.tmp"
+                temp_path.write_bytes(data)
+                os.replace(temp_path, image_path)
+
+            self._sources[source_path] = (fingerprint, cover_hash)
+
+        thumbnail_path = self._directory / f"{cover_hash}{THUMBNAIL_SUFFIX}.{THUMBNAIL_FILE_FORMAT}"
+        if not thumbnail_path.exists() and not self._create_thumbnail(image_path, thumbnail_path):
+            thumbnail_path = None
+
+        # Modification time is used as the access time, which is often disabled
+        for file in (image_path, thumbnail_path):
+            if file is not None:
+                os.utime(file)
+
+        self._evict(cover_hash)
+
+        return dt.replace(
+            album_cover,
+            image_path=image_path,
+            image_file_format=image_path.suffix.replace(".", ""),
+            image_small_path=thumbnail_path,
+            image_small_file_format=THUMBNAIL_FILE_FORMAT if thumbnail_path else None
+        )
@@ -0,0 +1,618 @@
+import os
+import math
+import time
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+
+from pieapp.api.utils.logger import logger
+from pieapp.api.utils.files import delete_files
+from pieapp.api.utils.files import delete_directory
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ConverterJobStatus
+from pieapp.api.converter.models import ConverterTarget
+from pieapp.api.converter.models import ConverterResult
+from pieapp.api.converter.models import ConverterProgress
+from pieapp.api.converter.builders import get_output_query_builder
+from pieapp.api.converter.builders import get_file_format
+from pieapp.api.converter.cache import ConverterCache
+from pieapp.api.converter.journal import ConverterJournal
+from pieapp.api.converter.utils import get_arguments_fingerprint
+from pieapp.api.converter.progress import PROGRESS_ARGUMENTS
+from pieapp.api.converter.progress import ProgressReader
+from pieapp.api.converter.processes import ProcessLoop
+from pieapp.api.converter.processes import get_process_loop
+from pieapp.api.converter.processes import run_process
+from pieapp.api.converter.segments import get_segments
+from pieapp.api.converter.segments import write_concat_list
+from pieapp.api.converter.segments import SEGMENT_FILE_FORMATS
+from pieapp.api.converter.segments import SEGMENT_DURATION_TOLERANCE_SAMPLES
+
+
+def get_max_processes(max_processes: int = None) -> int:
+    """
+    Get number of ffmpeg processes to run at once. Defaults to the number of CPU cores
+    """
+    if not max_processes or int(max_processes) < 1:
+        return os.cpu_count() or 1
+
+    return int(max_processes)
+
+
+def split_chunks(jobs: list, chunk_size: int, max_processes: int) -> list[list]:
+    """
+    Split list of jobs into chunks
+
+    `chunk_size` is an upper bound: chunks are made smaller
+    when the batch is too small to keep every process busy
+    """
+    if not jobs:
+        return []
+
+    chunk_size = max(1, min(int(chunk_size or 1), math.ceil(len(jobs) / max_processes)))
+    return [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+
+class ConverterCancelled(Exception):
+    """
+    Raised when the running ffmpeg process was terminated by `ConverterEngine.cancel`
+    """
+
+
+class ConverterEngine:
+    """
+    Parallel ffmpeg job queue
+
+    Splits the batch into chunks and converts them in up to `max_processes` ffmpeg processes at once.
+    Processes are driven by the asyncio `ProcessLoop`: `max_processes` queue consumers take chunks
+    and convert them file by file, so no thread is blocked on a running process.
+    A failed file is recorded in the result and doesn't stop the rest of the batch
+
+    Lossless outputs of files longer than `segment_threshold` seconds are split into time segments
+    which are encoded by all processes at once and concatenated without re-encoding
+    """
+
+    def __init__(
+        self,
+        ffmpeg_command: Path,
+        chunk_size: int = 10,
+        max_processes: int = None,
+        journal: ConverterJournal = None,
+        cache: ConverterCache = None,
+        segment_threshold: float = None,
+        process_loop: ProcessLoop = None
+    ) -> None:
+        # Binary path
+        self._ffmpeg_command = ffmpeg_command
+        # Maximum number of files in one chunk
+        self._chunk_size = chunk_size
+        # Number of ffmpeg processes to run at once
+        self._max_processes = get_max_processes(max_processes)
+        # Optional on-disk journal of job statuses
+        self._journal = journal
+        # Optional cache of converted outputs to skip files which are up to date
+        self._cache = cache
+        # Minimal source duration in seconds to encode the file in parallel segments. Disabled if not set
+        self._segment_threshold = segment_threshold
+        # Event loop which runs ffmpeg processes
+        self._process_loop = process_loop or get_process_loop()
+        # Set when the whole batch is cancelled
+        self._stop_event = threading.Event()
+        # Cleared while the queue is paused. Owned by the process loop
+        self._resume_event = asyncio.Event()
+        self._resume_event.set()
+        self._is_paused = False
+        # Running ffmpeg processes: <media file name>: <processes>. Accessed from the process loop only
+        self._processes: dict[str, list[asyncio.subprocess.Process]] = {}
+        # Names of cancelled jobs
+        self._cancelled: set[str] = set()
+        self._lock = threading.Lock()
+        # Jobs with status changes which aren't written to the journal yet. Owned by the process loop
+        self._journal_pending: dict[int, ConverterJob] = {}
+        self._journal_task: Optional[asyncio.Task] = None
+
+    @property
+    def max_processes(self) -> int:
+        return self._max_processes
+
+    @property
+    def is_paused(self) -> bool:
+        return self._is_paused
+
+    # Queue control methods. Safe to call from any thread
+
+    def pause(self) -> None:
+        """
+        Don't start new jobs until `resume` is called. Running processes are finished
+        """
+        self._is_paused = True
+        self._process_loop.call_soon(self._resume_event.clear)
+
+    def resume(self) -> None:
+        self._is_paused = False
+        self._process_loop.call_soon(self._resume_event.set)
+
+    def cancel(self, name: str = None) -> None:
+        """
+        Cancel one job by the media file name or the whole batch and terminate its ffmpeg process(-es)
+        """
+        with self._lock:
+            if name is None:
+                self._stop_event.set()
+            else:
+                self._cancelled.add(name)
+
+        # Let paused consumers see the cancellation
+        if name is None:
+            self._is_paused = False
+            self._process_loop.call_soon(self._resume_event.set)
+
+        self._process_loop.call_soon(self._terminate, name)
+
+    def _terminate(self, name: str = None) -> None:
+        if name is None:
+            processes = [p for i in self._processes.values() for p in i]
+        else:
+            processes = self._processes.get(name, [])
+
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+
+    def _is_cancelled(self, name: str) -> bool:
+        with self._lock:
+            return self._stop_event.is_set() or name in self._cancelled
+
+    # Convert methods
+
+    @staticmethod
+    def create_job(media_file: MediaFile) -> ConverterJob:
+        """
+        Create a job and build its output arguments. Builder is chosen by the output file format,
+        the job is skipped if it isn't supported
+        """
+        job = ConverterJob(media_file=media_file)
+        query_builder = get_output_query_builder(media_file, media_file.output_path)
+        if query_builder:
+            job.arguments = query_builder.build()
+            job.fingerprint = get_arguments_fingerprint(job.arguments)
+
+        return job
+
+    @staticmethod
+    def create_multi_target_job(media_file: MediaFile, file_formats: list[str]) -> ConverterJob:
+        """
+        Create a job which decodes the source once and writes one output per file format
+
+        Outputs are placed next to `MediaFile.output_path` with the file format suffix.
+        Targets with unsupported file format are skipped
+
+        Args:
+            media_file (MediaFile): `MediaFile` model
+            file_formats (list[str]): list of output file formats, e.g. ["mp3", "ogg"]
+        """
+        job = ConverterJob(media_file=media_file)
+        for file_format in dict.fromkeys(i.lower().lstrip(".") for i in file_formats):
+            target = ConverterTarget(output_path=media_file.output_path.with_suffix(f".{file_format}"))
+            query_builder = get_output_query_builder(media_file, target.output_path)
+            if query_builder:
+                target.arguments = query_builder.build()
+                target.fingerprint = get_arguments_fingerprint(target.arguments)
+            else:
+                target.status = ConverterJobStatus.Skipped
+                target.error = "Unsupported file format"
+
+            job.targets.append(target)
+
+        fingerprints = [i.fingerprint for i in job.targets if i.fingerprint]
+        job.fingerprint = get_arguments_fingerprint(fingerprints) if fingerprints else None
+        return job
+
+    def _set_job_status(self, job: ConverterJob, status: str) -> None:
+        job.status = status
+        if self._journal is None:
+            return
+
+        # Status changes are written in groups with one sync to disk, see `_write_journal`
+        self._journal_pending[id(job)] = job
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.create_task(self._write_journal())
+
+    async def _write_journal(self) -> None:
+        # Jobs changed while the journal is synced to disk are written with the next group
+        while self._journal_pending:
+            jobs = list(self._journal_pending.values())
+            self._journal_pending = {}
+            # Journal is synced to disk, don't block the loop
+            await asyncio.to_thread(self._journal.extend, jobs)
+
+    async def _wait_journal(self) -> None:
+        """
+        Wait until all status changes are written to the journal
+        """
+        if self._journal_task is not None:
+            await self._journal_task
+
+    async def _run_ffmpeg(
+        self,
+        name: str,
+        stream: ffmpeg.nodes.OutputStream,
+        duration: float = None,
+        on_progress: callable = None
+    ) -> float:
+        """
+        Run ffmpeg process of the job and wait for it. Returns the last reported output time in seconds
+
+        Args:
+            name (str): media file name
+            stream (OutputStream): ffmpeg output stream
+            duration (float|None): source duration in seconds to calculate percents
+            on_progress (callable|None): called with rate-limited `ConverterProgress` models
+        """
+        if self._is_cancelled(name):
+            raise ConverterCancelled(name)
+
+        args = stream.global_args(*PROGRESS_ARGUMENTS).compile(
+            cmd=self._ffmpeg_command.as_posix(),
+            overwrite_output=True
+        )
+        reader = ProgressReader(name, duration)
+        started_processes: list[asyncio.subprocess.Process] = []
+        out_time = 0.0
+
+        def on_start(process: asyncio.subprocess.Process) -> None:
+            started_processes.append(process)
+            self._processes.setdefault(name, []).append(process)
+            # The job could be cancelled while the process was spawning
+            if self._is_cancelled(name):
+                process.terminate()
+
+        def on_line(line: str) -> None:
+            nonlocal out_time
+            progress = reader.feed(line)
+            if progress is None:
+                return
+
+            out_time = progress.out_time
+            if on_progress:
+                on_progress(progress)
+
+        try:
+            result = await run_process(args, on_line, on_start)
+        finally:
+            processes = self._processes.get(name, [])
+            for process in started_processes:
+                if process in processes:
+                    processes.remove(process)
+            if not processes:
+                self._processes.pop(name, None)
+
+        if result.returncode != 0:
+            if self._is_cancelled(name):
+                raise ConverterCancelled(name)
+            raise ffmpeg.Error("ffmpeg", None, result.stderr)
+
+        return out_time
+
+    async def convert(self, job: ConverterJob, on_progress: callable = None) -> bool:
+        """
+        Convert one file. Returns `False` if file format is not supported
+
+        Args:
+            job (ConverterJob): `ConverterJob` model
+            on_progress (callable|None): called with rate-limited `ConverterProgress` models
+        """
+        outputs = job.get_outputs()
+        if not outputs:
+            return False
+
+        # Outputs keep the folders of the opened files
+        for output_path, _, _ in outputs:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.can_split(job) and await self.convert_segmented(job, on_progress):
+            return True
+
+        media_file = job.media_file
+        audio_stream = ffmpeg.input(media_file.path.as_posix()).audio
+        # Source is decoded once and split between all outputs
+        audio_stream = ffmpeg.merge_outputs(*[
+            audio_stream.output(output_path.as_posix(), **arguments)
+            for output_path, arguments, _ in outputs
+        ])
+
+        duration = media_file.info.duration if media_file.info else None
+        await self._run_ffmpeg(media_file.name, audio_stream, duration, on_progress)
+        return True
+
+    def can_split(self, job: ConverterJob) -> bool:
+        """
+        Check that the job is long enough to be encoded in parallel segments
+        """
+        info = job.media_file.info
+        if not self._segment_threshold or self._max_processes < 2 or info is None:
+            return False
+
+        # Multi-target jobs and stream copy don't benefit from splitting
+        if job.targets or job.arguments is None or job.arguments.get("c:a") == "copy":
+            return False
+
+        # Only lossless outputs are concatenated without gaps, see `SEGMENT_FILE_FORMATS`
+        if get_file_format(job.media_file.output_path) not in SEGMENT_FILE_FORMATS:
+            return False
+
+        return bool(info.sample_rate) and bool(info.duration) and info.duration > float(self._segment_threshold)
+
+    async def convert_segmented(self, job: ConverterJob, on_progress: callable = None) -> bool:
+        """
+        Encode time segments of the source in parallel processes and concatenate them into the output
+
+        Returns `False` if the source is too short to be split
+        or the concatenated output duration doesn't match the source
+
+        Args:
+            job (ConverterJob): `ConverterJob` model
+            on_progress (callable|None): called with `ConverterProgress` models of the whole file
+        """
+        media_file = job.media_file
+        info = media_file.info
+        segments = get_segments(info.duration, int(info.sample_rate), self._max_processes)
+        if len(segments) < 2:
+            return False
+
+        # Keep segments on the output file system
+        media_file.output_path.parent.mkdir(parents=True, exist_ok=True)
+        segments_directory = Path(tempfile.mkdtemp(prefix=".segments_", dir=media_file.output_path.parent))
+        suffix = media_file.output_path.suffix
+        segment_files = [segments_directory / f"{i:04d}{suffix}" for i in range(len(segments))]
+
+        # Aggregate progress of all segments: <segment index>: <progress>
+        segments_progress: dict[int, ConverterProgress] = {}
+
+        def on_segment_progress(index: int, progress: ConverterProgress) -> None:
+            segments_progress[index] = progress
+            out_time = sum(i.out_time for i in segments_progress.values())
+            speeds = [i.speed for i in segments_progress.values() if i.speed and not i.is_end]
+            total_size = sum(i.total_size for i in segments_progress.values())
+
+            if on_progress and not progress.is_end:
+                on_progress(ConverterProgress(
+                    name=media_file.name,
+                    out_time=out_time,
+                    speed=sum(speeds) if speeds else None,
+                    total_size=total_size,
+                    percent=min(out_time * 100 / info.duration, 100.0)
+                ))
+
+        async def encode_segment(index: int) -> None:
+            start, length = segments[index]
+            input_arguments = {"ss": start} if length is None else {"ss": start, "t": length}
+            audio_stream = ffmpeg.input(media_file.path.as_posix(), **input_arguments).audio
+            audio_stream = audio_stream.output(segment_files[index].as_posix(), **job.arguments)
+            await self._run_ffmpeg(
+                media_file.name,
+                audio_stream,
+                length or info.duration - start,
+                lambda progress: on_segment_progress(index, progress)
+            )
+
+        try:
+            tasks = [asyncio.ensure_future(encode_segment(i)) for i in range(len(segments))]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Stop the rest of the segments of the failed file
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            concat_list = segments_directory / "concat.txt"
+            write_concat_list(concat_list, segment_files)
+            metadata = {k: v for k, v in job.arguments.items() if k.startswith("metadata")}
+            audio_stream = ffmpeg.input(concat_list.as_posix(), f="concat", safe=0).audio
+            audio_stream = audio_stream.output(media_file.output_path.as_posix(), c="copy", **metadata)
+            out_time = await self._run_ffmpeg(media_file.name, audio_stream)
+        finally:
+            delete_directory(segments_directory)
+
+        tolerance = SEGMENT_DURATION_TOLERANCE_SAMPLES / int(info.sample_rate)
+        if abs(out_time - info.duration) > tolerance:
+            logger.warning(
+                f"Segmented output duration of {media_file.name} is {out_time:.3f}s "
+                f"instead of {info.duration:.3f}s. Converting it in one process"
+            )
+            return False
+
+        if on_progress:
+            on_progress(ConverterProgress(
+                name=media_file.name,
+                out_time=out_time,
+                speed=None,
+                total_size=media_file.output_path.stat().st_size,
+                percent=100.0,
+                is_end=True
+            ))
+
+        logger.debug(f"Converted {media_file.name} in {len(segments)} segments")
+        return True
+
+    @staticmethod
+    def _get_output_paths(job: ConverterJob) -> list[Path]:
+        return [output_path for output_path, _, _ in job.get_outputs()]
+
+    @staticmethod
+    def _set_targets_status(job: ConverterJob, status: str, error: str = None) -> None:
+        """
+        Set status of every supported target of the multi-target job
+        """
+        for target in job.targets:
+            if target.arguments is None:
+                continue
+
+            target.status = status
+            target.error = error
+
+    async def _run_job(self, job: ConverterJob, on_progress: callable = None) -> ConverterJob:
+        # Wait while the queue is paused
+        await self._resume_event.wait()
+        if self._is_cancelled(job.name):
+            self._set_job_status(job, ConverterJobStatus.Cancelled)
+            return job
+
+        # Fingerprints may hash file contents, don't block the loop
+        if self._cache is not None and await asyncio.to_thread(self._cache.is_up_to_date, job):
+            job.error = "Output is up to date"
+            self._set_targets_status(job, ConverterJobStatus.Skipped, job.error)
+            self._set_job_status(job, ConverterJobStatus.Skipped)
+            return job
+
+        self._set_job_status(job, ConverterJobStatus.Running)
+        started_at = time.perf_counter()
+        try:
+            if await self.convert(job, on_progress):
+                status = ConverterJobStatus.Succeeded
+                if self._cache is not None:
+                    await asyncio.to_thread(self._cache.update, job)
+            else:
+                status = ConverterJobStatus.Skipped
+                job.error = "Unsupported file format"
+
+        except ConverterCancelled:
+            status = ConverterJobStatus.Cancelled
+            # Don't leave partially written output
+            delete_files(self._get_output_paths(job))
+
+        except ffmpeg.Error as e:
+            status = ConverterJobStatus.Failed
+            job.error = e.stderr.decode("utf-8", errors="replace").strip() if e.stderr else str(e)
+            logger.error(f"An error has been occurred while processing file - {job.name}: {job.error}")
+
+        except Exception as e:
+            status = ConverterJobStatus.Failed
+            job.error = str(e)
+            logger.error(f"An error has been occurred while processing file - {job.name}: {job.error}")
+
+        job.wall_time = time.perf_counter() - started_at
+        if status != ConverterJobStatus.Skipped:
+            self._set_targets_status(job, status, job.error)
+        self._set_job_status(job, status)
+        return job
+
+    async def _run_chunk(
+        self,
+        chunk: list[ConverterJob],
+        on_completed_element: callable = None,
+        on_progress: callable = None
+    ) -> None:
+        for job in chunk:
+            await self._run_job(job, on_progress)
+            if on_completed_element:
+                on_completed_element(job)
+
+    async def _consume_chunks(
+        self,
+        queue: asyncio.Queue,
+        on_completed_element: callable = None,
+        on_progress: callable = None
+    ) -> None:
+        while not queue.empty():
+            chunk = queue.get_nowait()
+            await self._run_chunk(chunk, on_completed_element, on_progress)
+
+    def run(
+        self,
+        media_files: list[MediaFile],
+        on_completed_element: callable = None,
+        on_progress: callable = None,
+        output_formats: list[str] = None
+    ) -> ConverterResult:
+        """
+        Convert all files and block the calling thread until the batch is done
+
+        Args:
+            media_files (list[MediaFile]): list of `MediaFile` models
+            on_completed_element (callable|None): called from the process loop thread with every finished `ConverterJob`
+            on_progress (callable|None): called from the process loop thread with `ConverterProgress` models
+            output_formats (list[str]|None): convert every file into several file formats at once
+        """
+        return self.run_jobs(self.create_jobs(media_files, output_formats), on_completed_element, on_progress)
+
+    @classmethod
+    def create_jobs(cls, media_files: list[MediaFile], output_formats: list[str] = None) -> list[ConverterJob]:
+        """
+        Create jobs of the files. Every file is converted into several file formats at once with `output_formats`
+        """
+        if output_formats:
+            return [cls.create_multi_target_job(i, output_formats) for i in media_files]
+
+        return [cls.create_job(i) for i in media_files]
+
+    def run_jobs(
+        self,
+        jobs: list[ConverterJob],
+        on_completed_element: callable = None,
+        on_progress: callable = None
+    ) -> ConverterResult:
+        """
+        Run already created jobs and block the calling thread. See `run`
+        """
+        return self._process_loop.run(self.run_jobs_async(jobs, on_completed_element, on_progress))
+
+    async def run_jobs_async(
+        self,
+        jobs: list[ConverterJob],
+        on_completed_element: callable = None,
+        on_progress: callable = None
+    ) -> ConverterResult:
+        """
+        Run already created jobs. Must be awaited on the process loop
+        """
+        self._stop_event.clear()
+        self._cancelled.clear()
+
+        started_at = time.perf_counter()
+        result = ConverterResult(jobs=jobs)
+        for job in jobs:
+            self._set_job_status(job, ConverterJobStatus.Queued)
+        # Queued jobs are resumed after crash, so they are on disk before the first process starts
+        await self._wait_journal()
+
+        # Long files already use every process, so they are converted one by one before the rest
+        long_jobs = [i for i in jobs if self.can_split(i)]
+        await self._run_chunk(long_jobs, on_completed_element, on_progress)
+
+        long_jobs_ids = {id(i) for i in long_jobs}
+        short_jobs = [i for i in jobs if id(i) not in long_jobs_ids]
+        chunks = split_chunks(short_jobs, self._chunk_size, self._max_processes)
+        logger.debug(f"Converting {len(jobs)} files in {len(chunks)} chunks, {self._max_processes} processes")
+
+        # Every consumer runs one ffmpeg process at a time
+        queue = asyncio.Queue()
+        for chunk in chunks:
+            queue.put_nowait(chunk)
+
+        await asyncio.gather(*[
+            self._consume_chunks(queue, on_completed_element, on_progress)
+            for _ in range(min(self._max_processes, len(chunks)))
+        ])
+
+        # Every job has reached its final status, so there is nothing to resume
+        if self._journal is not None:
+            await self._wait_journal()
+            await asyncio.to_thread(self._journal.clear)
+
+        if self._cache is not None:
+            await asyncio.to_thread(self._cache.save)
+
+        result.wall_time = time.perf_counter() - started_at
+        logger.debug(
+            f"Converted {len(result.succeeded)}, failed {len(result.failed)}, "
+            f"skipped {len(result.skipped)}, cancelled {len(result.cancelled)} in {result.wall_time:.2f}s"
+        )
+        return result
@@ -0,0 +1,211 @@
+"""
+Files import helpers
+"""
+import os
+import dataclasses as dt
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional, Union
+
+from pieapp.api.globals import Global
+from pieapp.api.utils.files import clone_file
+from pieapp.api.utils.files import read_json
+from pieapp.api.utils.files import write_json
+from pieapp.api.utils.logger import logger
+from pieapp.api.converter.models import MediaFile
+
+
+def scan_audio_files(paths: list[Path], recursive: bool = True) -> Iterator[Path]:
+    """
+    Find audio files in the given files and directories with `os.scandir`.
+    Directories are read one by one, so the found files can be processed before the scan is finished
+
+    Args:
+        paths (list[Path]): files and directories
+        recursive (bool): scan subdirectories
+    """
+    extensions = set(Global.AUDIO_EXTENSIONS)
+    directories: list[str] = []
+    for path in paths:
+        if path.is_dir():
+            directories.append(str(path))
+        elif path.is_file() and path.suffix.replace(".", "").lower() in extensions:
+            yield path
+
+    # Depth-first without recursion, so deep trees don't hit the recursion limit
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda i: i.name)
+        except OSError as e:
+            logger.debug(f"Can't scan {directory}: {e!s}")
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            try:
+                # Symbolic links to directories are skipped to avoid cycles
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1][1:].lower() in extensions:
+                    yield Path(entry.path)
+            except OSError as e:
+                logger.debug(f"Can't read {entry.path}: {e!s}")
+
+        if recursive:
+            directories.extend(reversed(subdirectories))
+
+
+def get_scan_root(paths: list[Path]) -> Optional[Path]:
+    """
+    Get common parent directory of the scanned files and directories.
+    Opened folders keep their names, e.g. `Album/CD1/01.wav`. `None` if paths are on different drives
+    """
+    try:
+        return Path(os.path.commonpath([i.parent for i in paths]))
+    except ValueError:
+        return None
+
+
+def get_relative_name(file_path: Path, root: Optional[Path]) -> str:
+    """
+    Get posix path of the file relative to the scan root. Files outside of the root are named by their file name
+    """
+    if root is not None and file_path.is_relative_to(root):
+        return file_path.relative_to(root).as_posix()
+
+    return file_path.name
+
+
+def get_unique_name(name: str, taken_names: set[str]) -> str:
+    """
+    Add a counter to the file name until it isn't taken, e.g. `Album/01 (2).wav`.
+    Names are compared without suffix and case, because outputs of `01.wav` and `01.flac`
+    have the same path. The unique name is added to `taken_names`
+
+    Args:
+        name (str): posix path relative to the scan root
+        taken_names (set[str]): lower case names without suffix
+    """
+    path = PurePosixPath(name)
+    stem = path.with_suffix("")
+    counter = 1
+    while stem.as_posix().lower() in taken_names:
+        counter += 1
+        stem = path.with_name(f"{path.stem} ({counter})")
+
+    taken_names.add(stem.as_posix().lower())
+    return f"{stem.as_posix()}{path.suffix}"
+
+
+def read_references(temp_directory: Union[str, os.PathLike]) -> list[Path]:
+    """
+    Read paths of the files imported by reference into the temp directory
+    """
+    references = read_json(Path(temp_directory) / Global.REFERENCES_FILE_NAME, default=[], raise_exception=False)
+    return [Path(i) for i in references]
+
+
+def write_references(temp_directory: Union[str, os.PathLike], files: list[Path]) -> None:
+    """
+    Add paths of the files imported by reference, so they can be restored with the temp directory
+    """
+    references = {i.as_posix(): None for i in read_references(temp_directory)}
+    references.update({i.as_posix(): None for i in files})
+    write_json(Path(temp_directory) / Global.REFERENCES_FILE_NAME, list(references))
+
+
+def remove_references(temp_directory: Union[str, os.PathLike], files: list[Path] = None) -> None:
+    """
+    Remove paths of the files imported by reference. All paths are removed if `files` is `None`
+    """
+    references = []
+    if files is not None:
+        removed_files = {i.as_posix() for i in files}
+        references = [i.as_posix() for i in read_references(temp_directory) if i.as_posix() not in removed_files]
+
+    write_json(Path(temp_directory) / Global.REFERENCES_FILE_NAME, references)
+
+
+def get_moved_paths(paths: list[Path], file_path: Path, new_file_path: Path) -> dict[Path, Path]:
+    """
+    Get new paths of the opened files after the file or directory was moved: <path>: <new path>
+
+    Args:
+        paths (list[Path]): paths of the opened files
+        file_path (Path): moved file or directory
+        new_file_path (Path): destination path
+    """
+    return {i: new_file_path / i.relative_to(file_path) for i in paths if i.is_relative_to(file_path)}
+
+
+def get_device_concurrency(
+    path: Union[str, os.PathLike],
+    concurrency: Union[int, dict[str, int]] = None,
+    default: int = 4
+) -> int:
+    """
+    Get number of files to copy at once to the device of the path
+
+    Args:
+        path (str|os.PathLike): destination path
+        concurrency (int|dict|None): number of files for all devices
+            or <mount point>: <number of files>, e.g. {"/mnt/nas": 8, "/media/usb": 2}
+        default (int): number of files for devices without settings
+    """
+    if isinstance(concurrency, int):
+        return concurrency
+
+    if not concurrency:
+        return default
+
+    # The longest mount point that contains the path wins
+    path = Path(path).absolute()
+    mount_points = sorted(concurrency, key=lambda i: len(Path(i).parts), reverse=True)
+    for mount_point in mount_points:
+        if path.is_relative_to(Path(mount_point).absolute()):
+            return concurrency[mount_point]
+
+    return default
+
+
+def get_working_copy(media_file: MediaFile, temp_directory: Union[str, os.PathLike]) -> MediaFile:
+    """
+    Create a private copy of the referenced file right before the file is written.
+    Returns a new `MediaFile` model with `path` switched to the copy, the original file is never touched.
+    Copied files are returned as is. Copying may take a while, see `WorkingCopyWorker`
+
+    Args:
+        media_file (MediaFile): `MediaFile` model
+        temp_directory (str|os.PathLike): temp directory of the opened files
+    """
+    if not media_file.is_reference:
+        return media_file
+
+    # Files from different folders may have the same name, so every copy has its own directory
+    working_directory = Path(temp_directory) / Global.WORKING_COPIES_DIR_NAME / media_file.uuid
+    working_directory.mkdir(parents=True, exist_ok=True)
+    working_copy_path = working_directory / media_file.path.name
+    # Working copy is modified in place, so it can't share the data with the original file via hardlink
+    clone_method = clone_file(media_file.path, working_copy_path, allow_hardlink=False)
+    logger.debug(f"Created working copy of {media_file.path!s} ({clone_method})")
+
+    return dt.replace(media_file, path=working_copy_path, is_reference=False)
+
+
+def is_written_in_place(media_file: MediaFile, output_formats: list[str] = None) -> bool:
+    """
+    Check that an output of the referenced file would overwrite it, e.g. the output directory is the source folder.
+    Such files are converted from their working copies, see `get_working_copy`
+
+    Args:
+        media_file (MediaFile): `MediaFile` model
+        output_formats (list[str]|None): output file formats of the multi-target conversion
+    """
+    if not media_file.is_reference:
+        return False
+
+    output_paths = [media_file.output_path]
+    output_paths.extend(media_file.output_path.with_suffix(f".{i.lower().lstrip('.')}") for i in output_formats or [])
+    source_path = media_file.path.absolute()
+    return any(i.absolute() == source_path for i in output_paths)
@@ -0,0 +1,132 @@
+"""
+Append-only journal of converter jobs
+"""
+import os
+import json
+import uuid
+import time
+import threading
+from pathlib import Path
+from typing import Union
+
+from pieapp.api.utils.logger import logger
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ConverterTarget
+from pieapp.api.converter.models import ConverterJobStatus
+
+
+# Job statuses which are resumed after crash or restart
+UNFINISHED_STATUSES: tuple[str, ...] = (ConverterJobStatus.Queued, ConverterJobStatus.Running)
+
+
+class ConverterJournal:
+    """
+    Crash-safe on-disk journal of converter jobs
+
+    Every status change is appended as a JSON line and flushed to disk,
+    so the last line of every job tells us its state after a crash.
+    Status changes of many jobs are written at once by `extend`
+    """
+
+    def __init__(self, file_path: Union[str, os.PathLike]) -> None:
+        self._file_path = Path(file_path)
+        self._lock = threading.Lock()
+
+    @property
+    def file_path(self) -> Path:
+        return self._file_path
+
+    def append(self, job: ConverterJob) -> None:
+        self.extend([job])
+
+    def extend(self, jobs: list[ConverterJob]) -> None:
+        """
+        Append the current status of every job with one write and one sync to disk
+        """
+        lines = []
+        for job in jobs:
+            entry = {
+                "time": time.time(),
+                "name": job.name,
+                "path": str(job.media_file.path),
+                "output_path": str(job.media_file.output_path),
+                "fingerprint": job.fingerprint,
+                "arguments": job.arguments,
+                "targets": [
+                    {"output_path": str(i.output_path), "arguments": i.arguments, "fingerprint": i.fingerprint}
+                    for i in job.targets
+                ],
+                "status": job.status,
+            }
+            lines.append(f"{json.dumps(entry, ensure_ascii=False, default=str)}\n")
+
+        with self._lock:
+            self._file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._file_path, "a", encoding="utf-8") as output:
+                output.write("".join(lines))
+                output.flush()
+                os.fsync(output.fileno())
+
+    def read(self) -> list[dict]:
+        """
+        Read all journal entries. Broken lines (e.g. the last one after crash) are skipped
+        """
+        if not self._file_path.exists():
+            return []
+
+        entries = []
+        with self._lock, open(self._file_path, encoding="utf-8") as output:
+            for line in output:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.debug(f"Skipping broken journal line: {line!r}")
+
+        return entries
+
+    def get_unfinished_jobs(self) -> list[ConverterJob]:
+        """
+        Get jobs which were queued or running when the journal was written last time
+        """
+        # <output path>: <last entry>
+        last_entries: dict[str, dict] = {}
+        for entry in self.read():
+            last_entries[entry["output_path"]] = entry
+
+        jobs = []
+        for entry in last_entries.values():
+            if entry["status"] not in UNFINISHED_STATUSES:
+                continue
+
+            path = Path(entry["path"])
+            if not path.exists():
+                logger.debug(f"Source file {path!s} doesn't exist anymore")
+                continue
+
+            media_file = MediaFile(
+                uuid=str(uuid.uuid4()),
+                name=entry["name"],
+                path=path,
+                output_path=Path(entry["output_path"])
+            )
+            jobs.append(ConverterJob(
+                media_file=media_file,
+                arguments=entry["arguments"],
+                fingerprint=entry["fingerprint"],
+                targets=[
+                    ConverterTarget(
+                        output_path=Path(i["output_path"]),
+                        arguments=i["arguments"],
+                        fingerprint=i["fingerprint"]
+                    )
+                    for i in entry.get("targets", [])
+                ]
+            ))
+
+        return jobs
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._file_path.exists():
+                self._file_path.unlink()
@@ -1,3 +1,4 @@
+import copy
 import uuid
 from typing import Optional, Any
 
@@ -73,6 +74,22 @@ class Metadata:
     year_of_composition: datetime.date = dt.field(default=datetime.date(1970, 1, 1))
 
 
+@dt.dataclass(eq=False, frozen=True)
+class ProbeProfile:
+    # Fields shown in the files list: duration, codec, bit rate, sample rate and channels
+    Summary: str = "summary"
+    # All streams and format tags
+    Full: str = "full"
+
+
+@dt.dataclass(eq=False, frozen=True)
+class ImportMode:
+    # Original files are used in place, a private working copy is created before the file is modified
+    Reference: str = "reference"
+    # Files are copied into the temp directory
+    Copy: str = "copy"
+
+
 @dt.dataclass(eq=True, slots=True)
 class MediaFile:
     uuid: str
@@ -85,6 +102,137 @@ class MediaFile:
     is_origin: Optional[bool] = dt.field(default=False)
     # Snapshot is marked for deletion and will be deleted after application restart
     is_deleted: bool = dt.field(default=False)
+    # `path` points at the original file, which must not be modified
+    is_reference: bool = dt.field(default=False)
+    # Probe profile of `info` and `metadata`. `None` if file wasn't probed yet
+    probe_profile: Optional[str] = dt.field(default=None)
+
+
+@dt.dataclass(slots=True)
+class ConverterProgress:
+    """
+    A snapshot of ffmpeg `-progress` output for one file
+    """
+    name: str
+    # Encoded time in seconds
+    out_time: float = 0.0
+    # Realtime speed factor (`1.0` is realtime)
+    speed: Optional[float] = None
+    # Bytes written to the output file
+    total_size: int = 0
+    # Percent of the source duration. `None` if duration is unknown
+    percent: Optional[float] = None
+    # Last block of the stream (`progress=end`)
+    is_end: bool = False
+
+
+@dt.dataclass(eq=False, frozen=True)
+class ConverterJobStatus:
+    Queued: str = "queued"
+    Running: str = "running"
+    Succeeded: str = "succeeded"
+    Failed: str = "failed"
+    Skipped: str = "skipped"
+    Cancelled: str = "cancelled"
+
+
+@dt.dataclass(slots=True)
+class ConverterTarget:
+    """
+    One output of the multi-target job
+    """
+    output_path: Path
+    # Output arguments built by `QueryBuilder`. `None` if file format is not supported
+    arguments: Optional[dict[str, Any]] = None
+    # Hash of the output arguments
+    fingerprint: Optional[str] = None
+    status: str = dt.field(default=ConverterJobStatus.Queued)
+    error: Optional[str] = None
+
+
+@dt.dataclass(slots=True)
+class ConverterJob:
+    media_file: MediaFile
+    status: str = dt.field(default=ConverterJobStatus.Queued)
+    # Output arguments built by `QueryBuilder`. `None` if file format is not supported
+    arguments: Optional[dict[str, Any]] = None
+    # Hash of the output arguments
+    fingerprint: Optional[str] = None
+    # Error message if job has failed or reason why it was skipped
+    error: Optional[str] = None
+    # Wall time of the ffmpeg process in seconds
+    wall_time: float = 0.0
+    # Outputs of the multi-target job. The source is decoded once for all of them
+    targets: list[ConverterTarget] = dt.field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.media_file.name
+
+    def get_outputs(self) -> list[tuple[Path, dict[str, Any], str]]:
+        """
+        Get list of supported outputs: (<output path>, <arguments>, <arguments fingerprint>)
+        """
+        if self.targets:
+            return [(i.output_path, i.arguments, i.fingerprint) for i in self.targets if i.arguments is not None]
+
+        if self.arguments is None:
+            return []
+
+        return [(self.media_file.output_path, self.arguments, self.fingerprint)]
+
+
+@dt.dataclass(slots=True)
+class ConverterResult:
+    """
+    Structured result of the conversion batch
+    """
+    jobs: list[ConverterJob] = dt.field(default_factory=list)
+    # Wall time of the whole batch in seconds
+    wall_time: float = 0.0
+
+    def get_jobs(self, status: str) -> list[ConverterJob]:
+        return [i for i in self.jobs if i.status == status]
+
+    @property
+    def succeeded(self) -> list[ConverterJob]:
+        return self.get_jobs(ConverterJobStatus.Succeeded)
+
+    @property
+    def failed(self) -> list[ConverterJob]:
+        return self.get_jobs(ConverterJobStatus.Failed)
+
+    @property
+    def skipped(self) -> list[ConverterJob]:
+        return self.get_jobs(ConverterJobStatus.Skipped)
+
+    @property
+    def cancelled(self) -> list[ConverterJob]:
+        return self.get_jobs(ConverterJobStatus.Cancelled)
+
+    def as_dict(self) -> dict:
+        return {
+            "wall_time": self.wall_time,
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "skipped": len(self.skipped),
+            "cancelled": len(self.cancelled),
+            "jobs": [
+                {
+                    "name": i.name,
+                    "path": str(i.media_file.path),
+                    "output_path": str(i.media_file.output_path),
+                    "status": i.status,
+                    "error": i.error,
+                    "wall_time": i.wall_time,
+                    "targets": [
+                        {"output_path": str(t.output_path), "status": t.status, "error": t.error}
+                        for t in i.targets
+                    ],
+                }
+                for i in self.jobs
+            ]
+        }
 
 
 @dt.dataclass(eq=True, slots=True)
@@ -110,3 +258,27 @@ def update_media_file(
     media_file.is_origin = is_origin
     media_file.uuid = str(uuid.uuid4())
     return media_file
+
+
+def replace_media_file(
+    media_file: MediaFile,
+    field_path: str,
+    value: Any,
+    is_origin: bool = False
+) -> MediaFile:
+    """
+    Get a new version of the file with the changed field, e.g. `metadata.title`.
+    Only the models on the field path are copied, other models are shared with the given version
+    """
+    new_media_file = copy.copy(media_file)
+    *path, target = field_path.split(".")
+    base = new_media_file
+    for attrname in path:
+        child = copy.copy(getattr(base, attrname))
+        setattr(base, attrname, child)
+        base = child
+
+    setattr(base, target, value)
+    new_media_file.is_origin = is_origin
+    new_media_file.uuid = str(uuid.uuid4())
+    return new_media_file
@@ -27,7 +27,7 @@ class FileSystemEventHandler(QObject, events.FileSystemEventHandler):
 
     def on_moved(self, event) -> None:
         file_path = Path(event.src_path)
-        destination_path = event.dest_path
+        destination_path = Path(event.dest_path)
         is_directory = event.is_directory
         logger.debug("Moved {0}: {1} to {2}".format(
             self.format_is_directory(is_directory), file_path, destination_path)
@@ -65,6 +65,8 @@ class FileSystemWatcher(QObject):
     def __init__(self, parent: QObject = None) -> None:
         QObject.__init__(self, parent)
         self._event_handler = FileSystemEventHandler(self)
+        # Watched folders
+        self._folders: set[str] = set()
 
     @property
     def events(self) -> FileSystemEventHandler:
@@ -77,13 +79,22 @@ class FileSystemWatcher(QObject):
         self._event_handler.sig_file_modified.connect(target.on_file_modified)
 
     def start(self, folder: str) -> None:
-        self.observer = Observer()
-        self.observer.schedule(self._event_handler, folder)
+        """
+        Start watching the folder. Several folders are watched by one observer
+        """
+        if folder in self._folders:
+            return
+
         try:
-            self.observer.start()
+            if self.observer is None:
+                self.observer = Observer()
+                self.observer.start()
+            self.observer.schedule(self._event_handler, folder)
         except Exception as e:
             raise PieError(f'{translate("Cant start an observer in")} - {folder}', str(e))
 
+        self._folders.add(folder)
+
     def stop(self) -> None:
         if self.observer is not None:
             try:
@@ -91,5 +102,6 @@ class FileSystemWatcher(QObject):
                 self.observer.join()
                 del self.observer
                 self.observer = None
+                self._folders.clear()
             except RuntimeError as e:
                 raise PieError(translate(f"An error has been occurred while stopping observer"), str(e))
@@ -1,39 +1,802 @@
+import os
+import json
+import uuid
+import struct
+import asyncio
+import dataclasses as dt
+from typing import BinaryIO
+
+import ffmpeg
+
+from pieapp.api.utils.logger import logger
 from pieapp.api.converter.models import *
+from pieapp.api.converter.processes import run_process
 
 
-class ProbeBuilder:
+class UnsupportedFileError(Exception):
+    """
+    Raised when the native parser can't read the file. The file is probed with ffprobe instead
+    """
 
-    def probe_metadata(self) -> Metadata:
-        raise NotImplementedError
 
-    def probe_file_info(self) -> FileInfo:
-        raise NotImplementedError
+class ProbeError(Exception):
+    """
+    Raised when the file can't be probed, e.g. it has no audio stream
+    """
+
+
+# Channels layout names as ffprobe reports them
+_CHANNELS_LAYOUTS: dict[int, str] = {
+    1: ChannelsLayout.Mono,
+    2: ChannelsLayout.Stereo,
+    4: "quad",
+    6: "5.1",
+    8: "7.1",
+}
+
+# ID3v2 text frames: <frame id>: <ffprobe tag name>
+_ID3_FRAMES: dict[str, str] = {
+    "TIT2": "title",
+    "TPE1": "artist",
+    "TPE2": "album_artist",
+    "TALB": "album",
+    "TCON": "genre",
+    "TRCK": "track",
+    "TPUB": "publisher",
+    "TDRC": "date",
+    "TYER": "date",
+    # ID3v2.2 frames
+    "TT2": "title",
+    "TP1": "artist",
+    "TP2": "album_artist",
+    "TAL": "album",
+    "TCO": "genre",
+    "TRK": "track",
+    "TYE": "date",
+}
+
+# ID3v2 attached picture frames
+_ID3_PICTURE_FRAMES: tuple[str, ...] = ("APIC", "PIC")
+
+# RIFF INFO chunks: <chunk id>: <ffprobe tag name>
+_RIFF_INFO_CHUNKS: dict[bytes, str] = {
+    b"INAM": "title",
+    b"IART": "artist",
+    b"IPRD": "album",
+    b"IGNR": "genre",
+    b"ITRK": "track",
+    b"IPRT": "track",
+    b"ICRD": "date",
+    b"ICMT": "comment",
+}
+
+# Vorbis comments which ffprobe renames
+_VORBIS_COMMENTS: dict[str, str] = {
+    "albumartist": "album_artist",
+    "tracknumber": "track",
+}
+
+# Vorbis comment with base64 encoded FLAC picture block
+_VORBIS_PICTURE_COMMENT: str = "metadata_block_picture"
+
+# MPEG audio bitrates in kbit/s: <(version, layer)>: <bitrates by index>
+_MPEG_BITRATES: dict[tuple[int, int], tuple[int, ...]] = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# MPEG audio sample rates: <version>: <sample rates by index>. Version 2.5 is stored as `3`
+_MPEG_SAMPLE_RATES: dict[int, tuple[int, ...]] = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    3: (11025, 12000, 8000),
+}
+
+# PCM codecs: <(format tag, bits per sample)>: <ffprobe codec name>
+_WAVE_CODECS: dict[tuple[int, int], str] = {
+    (1, 8): "pcm_u8",
+    (1, 16): "pcm_s16le",
+    (1, 24): "pcm_s24le",
+    (1, 32): "pcm_s32le",
+    (3, 32): "pcm_f32le",
+    (3, 64): "pcm_f64le",
+    (6, 8): "pcm_alaw",
+    (7, 8): "pcm_mulaw",
+}
+
+
+def _get_metadata(tags: dict[str, Any], has_picture: bool = False) -> Metadata:
+    """
+    Build `Metadata` model from ffprobe format tags
+
+    Args:
+        tags (dict): format tags
+        has_picture (bool): file has an attached picture. Its `AlbumCover` is filled on demand
+    """
+    return Metadata(
+        title=tags.get("title"),
+        genre=tags.get("genre"),
+        subgenre=tags.get("subgenre"),
+        track_number=tags.get("track_number"),
+        featured_artist=tags.get("album"),
+        primary_artist=tags.get("album_artist"),
+        album_cover=AlbumCover() if has_picture else None,
+    )
+
+
+def _parse_vorbis_comments(data: bytes) -> dict[str, str]:
+    """
+    Parse Vorbis comment block without framing bit. Used by FLAC and Ogg
+    """
+    tags = {}
+    vendor_length = struct.unpack_from("<I", data, 0)[0]
+    offset = 4 + vendor_length
+    comments_count = struct.unpack_from("<I", data, offset)[0]
+    offset += 4
+    for _ in range(comments_count):
+        length = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        key, _, value = data[offset:offset + length].decode("utf-8", errors="replace").partition("=")
+        offset += length
+        key = key.lower()
+        tags.setdefault(_VORBIS_COMMENTS.get(key, key), value)
+
+    return tags
+
+
+def _get_syncsafe_int(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data: bytes) -> str:
+    encoding, data = data[0], data[1:]
+    if encoding == 1:
+        text = data.decode("utf-16", errors="replace")
+    elif encoding == 2:
+        text = data.decode("utf-16-be", errors="replace")
+    elif encoding == 3:
+        text = data.decode("utf-8", errors="replace")
+    else:
+        text = data.decode("latin-1")
 
+    # Multiple values are separated by the null character
+    return text.split("\x00")[0].strip()
 
-class VorbisProbe(ProbeBuilder):
+
+class ProbeBuilder:
+    """
+    Native in-process header parser
+
+    Reads the file header once and fills `FileInfo` and `Metadata` models
+    without running ffprobe. Raises `UnsupportedFileError` if the file can't be read
+    """
 
     def __init__(self, filepath: Path) -> None:
         self._filepath = filepath
+        # Audio stream fields: codec_name, sample_rate, channels, bits_per_sample, duration, bit_rate, has_picture
+        self._stream: dict[str, Any] = None
+        # Format tags named as ffprobe names them
+        self._tags: dict[str, str] = None
+
+    def _read(self, file: BinaryIO) -> tuple[dict[str, Any], dict[str, str]]:
+        raise NotImplementedError
+
+    def _read_once(self) -> None:
+        if self._stream is not None:
+            return
+
+        try:
+            with open(self._filepath, "rb") as file:
+                self._stream, self._tags = self._read(file)
+        except (struct.error, IndexError, ValueError) as e:
+            raise UnsupportedFileError(f"Can't parse {self._filepath!s}: {e!s}")
+
+    @property
+    def file_size(self) -> int:
+        return os.path.getsize(self._filepath)
 
     def probe_metadata(self) -> Metadata:
-        pass
+        self._read_once()
+        return _get_metadata(self._tags, self._stream.get("has_picture", False))
 
     def probe_file_info(self) -> FileInfo:
-        pass
+        self._read_once()
+        stream = self._stream
+        channels = stream["channels"]
+        return FileInfo(
+            filename=self._filepath.name,
+            file_format=self._filepath.suffix.replace(".", ""),
+            bit_rate=int(stream["bit_rate"]),
+            bit_depth=stream.get("bits_per_sample"),
+            sample_rate=int(stream["sample_rate"]),
+            duration=float(stream["duration"]),
+            channels=channels,
+            channels_layout=_CHANNELS_LAYOUTS.get(channels),
+            codec=Codec(name=stream["codec_name"], type="audio", long_name=None),
+        )
+
+
+class WaveProbe(ProbeBuilder):
+    """
+    RIFF/WAVE parser: `fmt ` and `data` chunks, `LIST/INFO` tags
+    """
+
+    def _read(self, file: BinaryIO) -> tuple[dict[str, Any], dict[str, str]]:
+        header = file.read(12)
+        if header[:4] not in (b"RIFF", b"RF64") or header[8:12] != b"WAVE":
+            raise UnsupportedFileError("Not a RIFF/WAVE file")
+
+        fmt = None
+        data_size = None
+        data_size_64 = None
+        tags = {}
+        while chunk_header := file.read(8):
+            if len(chunk_header) < 8:
+                break
+
+            chunk_id, chunk_size = chunk_header[:4], struct.unpack("<I", chunk_header[4:])[0]
+            chunk_start = file.tell()
+            if chunk_id == b"fmt ":
+                fmt = file.read(chunk_size)
+            elif chunk_id == b"ds64":
+                data_size_64 = struct.unpack("<QQ", file.read(16))[1]
+            elif chunk_id == b"data":
+                data_size = data_size_64 if chunk_size == 0xFFFFFFFF and data_size_64 else chunk_size
+                # Truncated files are common, trust the file size
+                data_size = min(data_size, self.file_size - chunk_start)
+                chunk_size = data_size
+            elif chunk_id == b"LIST":
+                data = file.read(chunk_size)
+                if data[:4] == b"INFO":
+                    offset = 4
+                    while offset + 8 <= len(data):
+                        sub_id, sub_size = data[offset:offset + 4], struct.unpack_from("<I", data, offset + 4)[0]
+                        value = data[offset + 8:offset + 8 + sub_size].split(b"\x00")[0]
+                        if sub_id in _RIFF_INFO_CHUNKS:
+                            tags.setdefault(_RIFF_INFO_CHUNKS[sub_id], value.decode("utf-8", errors="replace"))
+                        offset += 8 + sub_size + (sub_size & 1)
+
+            file.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+        if fmt is None or data_size is None:
+            raise UnsupportedFileError("No fmt or data chunk")
+
+        format_tag, channels, sample_rate, byte_rate, _, bits_per_sample = struct.unpack("<HHIIHH", fmt[:16])
+        # WAVE_FORMAT_EXTENSIBLE keeps the real format tag in the sub format GUID
+        if format_tag == 0xFFFE and len(fmt) >= 26:
+            format_tag = struct.unpack("<H", fmt[24:26])[0]
+
+        codec_name = _WAVE_CODECS.get((format_tag, bits_per_sample))
+        if codec_name is None or not byte_rate:
+            raise UnsupportedFileError(f"Unsupported WAVE format {format_tag}")
+
+        stream = {
+            "codec_name": codec_name,
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "bits_per_sample": bits_per_sample,
+            "duration": data_size / byte_rate,
+            "bit_rate": byte_rate * 8,
+        }
+        return stream, tags
+
+
+class FlacProbe(ProbeBuilder):
+    """
+    FLAC parser: STREAMINFO and VORBIS_COMMENT metadata blocks
+    """
+
+    def _read(self, file: BinaryIO) -> tuple[dict[str, Any], dict[str, str]]:
+        _skip_id3v2(file)
+        if file.read(4) != b"fLaC":
+            raise UnsupportedFileError("Not a FLAC file")
+
+        stream = None
+        tags = {}
+        has_picture = False
+        is_last = False
+        while not is_last:
+            block_header = file.read(4)
+            if len(block_header) < 4:
+                break
+
+            is_last = bool(block_header[0] & 0x80)
+            block_type = block_header[0] & 0x7F
+            block_size = int.from_bytes(block_header[1:4], "big")
+            if block_type == 0:
+                data = file.read(block_size)
+                # 20 bits sample rate, 3 bits channels, 5 bits bits per sample, 36 bits total samples
+                bits = int.from_bytes(data[10:18], "big")
+                sample_rate = bits >> 44
+                total_samples = bits & 0xFFFFFFFFF
+                if not sample_rate or not total_samples:
+                    raise UnsupportedFileError("Unknown stream length")
+
+                stream = {
+                    "codec_name": "flac",
+                    "sample_rate": sample_rate,
+                    "channels": ((bits >> 41) & 0x07) + 1,
+                    "bits_per_sample": ((bits >> 36) & 0x1F) + 1,
+                    "duration": total_samples / sample_rate,
+                }
+            elif block_type == 4:
+                tags = _parse_vorbis_comments(file.read(block_size))
+            elif block_type == 6:
+                has_picture = True
+                file.seek(block_size, os.SEEK_CUR)
+            else:
+                file.seek(block_size, os.SEEK_CUR)
+
+        if stream is None:
+            raise UnsupportedFileError("No STREAMINFO block")
+
+        stream["bit_rate"] = self.file_size * 8 / stream["duration"]
+        stream["has_picture"] = has_picture or _VORBIS_PICTURE_COMMENT in tags
+        return stream, tags
+
+
+def _skip_id3v2(file: BinaryIO) -> bytes:
+    """
+    Skip ID3v2 tag at the current position. Returns the tag with its header or empty bytes
+    """
+    start = file.tell()
+    header = file.read(10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        file.seek(start)
+        return b""
+
+    size = _get_syncsafe_int(header[6:10])
+    # Footer is present
+    if header[5] & 0x10:
+        size += 10
+
+    return header + file.read(size)
+
+
+def _parse_id3v2(tag: bytes) -> tuple[dict[str, str], bool]:
+    """
+    Parse ID3v2 text frames. Returns (<tags>, <tag has a picture frame>).
+    Raises `UnsupportedFileError` for unsynchronised tags and unknown versions, they are read by ffprobe
+    """
+    tags = {}
+    has_picture = False
+    major_version, flags = tag[3], tag[5]
+    if flags & 0x80:
+        raise UnsupportedFileError("Unsynchronised ID3v2 tag")
+    if major_version not in (2, 3, 4):
+        raise UnsupportedFileError(f"Unsupported ID3v2.{major_version} tag")
+
+    offset = 10
+    if flags & 0x40 and major_version in (3, 4):
+        extended_size = tag[10:14]
+        offset += _get_syncsafe_int(extended_size) if major_version == 4 else 4 + struct.unpack(">I", extended_size)[0]
+
+    id_size, header_size = (3, 6) if major_version == 2 else (4, 10)
+    while offset + header_size <= len(tag):
+        frame_id = tag[offset:offset + id_size]
+        if not frame_id.strip(b"\x00"):
+            # Padding
+            break
+
+        if major_version == 2:
+            frame_size = int.from_bytes(tag[offset + 3:offset + 6], "big")
+        elif major_version == 4:
+            frame_size = _get_syncsafe_int(tag[offset + 4:offset + 8])
+        else:
+            frame_size = struct.unpack(">I", tag[offset + 4:offset + 8])[0]
+
+        frame_data = tag[offset + header_size:offset + header_size + frame_size]
+        frame_id = frame_id.decode("latin-1")
+        tag_name = _ID3_FRAMES.get(frame_id)
+        if tag_name and frame_data:
+            tags.setdefault(tag_name, _decode_id3_text(frame_data))
+        elif frame_id in _ID3_PICTURE_FRAMES:
+            has_picture = True
+
+        offset += header_size + frame_size
+
+    return tags, has_picture
+
+
+def _parse_mpeg_header(header: bytes) -> Optional[dict[str, int]]:
+    """
+    Parse MPEG audio frame header. Returns `None` if it's not a valid header
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return
+
+    version = {3: 1, 2: 2, 0: 3}[version_bits]
+    layer = 4 - layer_bits
+    bit_rate = _MPEG_BITRATES[(min(version, 2), layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_size = (12 * bit_rate // sample_rate + padding) * 4
+    elif layer == 2 or version == 1:
+        samples_per_frame = 1152
+        frame_size = 144 * bit_rate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        frame_size = 72 * bit_rate // sample_rate + padding
+
+    return {
+        "version": version,
+        "layer": layer,
+        "bit_rate": bit_rate,
+        "sample_rate": sample_rate,
+        "channels": 1 if header[3] >> 6 == 3 else 2,
+        "samples_per_frame": samples_per_frame,
+        "frame_size": frame_size,
+    }
+
+
+class Mp3Probe(ProbeBuilder):
+    """
+    MPEG audio parser: ID3v2 tags, first frame header and Xing/Info or VBRI header
+    """
+
+    # Maximum number of bytes to search for the first frame after ID3v2 tag
+    max_sync_offset: int = 64 * 1024
+
+    def _read(self, file: BinaryIO) -> tuple[dict[str, Any], dict[str, str]]:
+        id3_tag = _skip_id3v2(file)
+        tags, has_picture = _parse_id3v2(id3_tag) if id3_tag else ({}, False)
+
+        data_start = file.tell()
+        data = file.read(self.max_sync_offset)
+        frame = None
+        offset = data.find(b"\xFF")
+        while offset != -1 and offset + 4 <= len(data):
+            frame = _parse_mpeg_header(data[offset:offset + 4])
+            # Check the next frame to avoid false sync
+            if frame:
+                next_offset = offset + frame["frame_size"]
+                if next_offset + 4 > len(data) or _parse_mpeg_header(data[next_offset:next_offset + 4]):
+                    break
+
+            frame = None
+            offset = data.find(b"\xFF", offset + 1)
+
+        if frame is None:
+            raise UnsupportedFileError("No MPEG audio frame found")
+
+        audio_start = data_start + offset
+        audio_size = self.file_size - audio_start
+        file.seek(-128, os.SEEK_END)
+        if file.read(3) == b"TAG":
+            # ffprobe reads ID3v1 tag if there are no ID3v2 tags
+            if not tags:
+                raise UnsupportedFileError("ID3v1 tag")
+            audio_size -= 128
+
+        # Xing/Info header is placed after side information of the first frame
+        if frame["version"] == 1:
+            xing_offset = offset + 4 + (17 if frame["channels"] == 1 else 32)
+        else:
+            xing_offset = offset + 4 + (9 if frame["channels"] == 1 else 17)
+
+        frames_count = None
+        if data[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+            xing_flags = struct.unpack_from(">I", data, xing_offset + 4)[0]
+            field_offset = xing_offset + 8
+            if xing_flags & 0x01:
+                frames_count = struct.unpack_from(">I", data, field_offset)[0]
+                field_offset += 4
+            if xing_flags & 0x02:
+                audio_size = struct.unpack_from(">I", data, field_offset)[0]
+        elif data[offset + 36:offset + 40] == b"VBRI":
+            audio_size = struct.unpack_from(">I", data, offset + 46)[0]
+            frames_count = struct.unpack_from(">I", data, offset + 50)[0]
+
+        if frames_count:
+            duration = frames_count * frame["samples_per_frame"] / frame["sample_rate"]
+            bit_rate = audio_size * 8 / duration
+        else:
+            bit_rate = frame["bit_rate"]
+            duration = audio_size * 8 / bit_rate
+
+        stream = {
+            "codec_name": f"mp{frame['layer']}",
+            "sample_rate": frame["sample_rate"],
+            "channels": frame["channels"],
+            "duration": duration,
+            "bit_rate": bit_rate,
+            "has_picture": has_picture,
+        }
+        return stream, tags
+
+
+class OggProbe(ProbeBuilder):
+    """
+    Ogg Vorbis and Ogg Opus parser: identification and comment headers, last page granule position
+    """
+
+    # Number of bytes at the end of file to search for the last page
+    max_tail_size: int = 128 * 1024
+
+    @staticmethod
+    def _read_page(file: BinaryIO) -> Optional[tuple[int, int, list[int], bytes]]:
+        """
+        Read one page. Returns (<granule position>, <serial number>, <lacing values>, <body>)
+        """
+        header = file.read(27)
+        if len(header) < 27:
+            return
+
+        if header[:4] != b"OggS":
+            raise UnsupportedFileError("Broken Ogg page")
+
+        granule, serial = struct.unpack_from("<qI", header, 6)
+        lacing_values = list(file.read(header[26]))
+        body = file.read(sum(lacing_values))
+        return granule, serial, lacing_values, body
+
+    def _read_header_packets(self, file: BinaryIO) -> tuple[int, list[bytes]]:
+        """
+        Read the first two packets of the first logical stream
+        """
+        stream_serial = None
+        packets = []
+        packet = b""
+        while len(packets) < 2:
+            page = self._read_page(file)
+            if page is None:
+                raise UnsupportedFileError("No header packets")
+
+            _, serial, lacing_values, body = page
+            if stream_serial is None:
+                stream_serial = serial
+            elif serial != stream_serial:
+                continue
+
+            offset = 0
+            for lacing_value in lacing_values:
+                packet += body[offset:offset + lacing_value]
+                offset += lacing_value
+                if lacing_value < 255:
+                    packets.append(packet)
+                    packet = b""
+
+        return stream_serial, packets[:2]
+
+    def _read_last_granule(self, file: BinaryIO, stream_serial: int) -> int:
+        file_size = self.file_size
+        file.seek(max(0, file_size - self.max_tail_size))
+        tail = file.read()
+        offset = tail.rfind(b"OggS")
+        while offset != -1:
+            if offset + 27 <= len(tail):
+                granule, serial = struct.unpack_from("<qI", tail, offset + 6)
+                if serial == stream_serial and granule >= 0:
+                    return granule
+
+            offset = tail.rfind(b"OggS", 0, offset)
+
+        raise UnsupportedFileError("No last page found")
+
+    def _read(self, file: BinaryIO) -> tuple[dict[str, Any], dict[str, str]]:
+        stream_serial, (identification, comment) = self._read_header_packets(file)
+        if identification.startswith(b"\x01vorbis"):
+            channels, sample_rate, _, nominal_bit_rate = struct.unpack_from("<BIiI", identification, 11)
+            tags = _parse_vorbis_comments(comment[7:]) if comment.startswith(b"\x03vorbis") else {}
+            duration = self._read_last_granule(file, stream_serial) / sample_rate
+            codec_name = "vorbis"
+        elif identification.startswith(b"OpusHead"):
+            channels, pre_skip = struct.unpack_from("<BH", identification, 9)
+            # Opus is always decoded at 48 kHz
+            sample_rate = 48000
+            nominal_bit_rate = 0
+            tags = _parse_vorbis_comments(comment[8:]) if comment.startswith(b"OpusTags") else {}
+            duration = (self._read_last_granule(file, stream_serial) - pre_skip) / sample_rate
+            codec_name = "opus"
+        else:
+            raise UnsupportedFileError("Unsupported Ogg codec")
+
+        if duration <= 0:
+            raise UnsupportedFileError("Unknown stream length")
+
+        stream = {
+            "codec_name": codec_name,
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "duration": duration,
+            "bit_rate": nominal_bit_rate or self.file_size * 8 / duration,
+            "has_picture": _VORBIS_PICTURE_COMMENT in tags,
+        }
+        return stream, tags
 
 
 _PROBE_FILE_FORMAT_MAP = {
-    "mp3": ProbeBuilder,
-    "mp4": ProbeBuilder,
-    "wav": ProbeBuilder,
+    "mp3": Mp3Probe,
+    "wav": WaveProbe,
+    "wave": WaveProbe,
+    "flac": FlacProbe,
+    "ogg": OggProbe,
+    "oga": OggProbe,
+    "opus": OggProbe,
 }
 
 
-def get_probe_builder(filepath: Path) -> ProbeBuilder:
-    file_format = filepath.suffix
-    if file_format not in _PROBE_FILE_FORMAT_MAP:
-        raise KeyError("Unsupported file format")
+def get_probe_builder(filepath: Path) -> Optional[ProbeBuilder]:
+    """
+    Get native parser by the file format. Returns `None` if there's no parser for the file format
+    """
+    probe_builder = _PROBE_FILE_FORMAT_MAP.get(filepath.suffix.replace(".", "").lower())
+    if probe_builder is None:
+        return
+
+    return probe_builder(filepath)
+
+
+def probe_native(file_path: Path) -> Optional[tuple[FileInfo, Metadata]]:
+    """
+    Probe file with native parser. Returns `None` if the file should be probed with ffprobe
+    """
+    probe_builder = get_probe_builder(file_path)
+    if probe_builder is None:
+        return
+
+    try:
+        return probe_builder.probe_file_info(), probe_builder.probe_metadata()
+    except (OSError, UnsupportedFileError) as e:
+        logger.debug(f"Falling back to ffprobe: {e!s}")
+
+
+# ffprobe arguments by probe profile
+_PROBE_PROFILE_ARGUMENTS: dict[str, list[str]] = {
+    ProbeProfile.Summary: [
+        "-show_entries",
+        "stream=codec_name,codec_type,sample_rate,channels,channel_layout,bit_rate,bits_per_sample"
+        ":stream_disposition=attached_pic"
+        ":format=filename,duration,bit_rate",
+    ],
+    ProbeProfile.Full: ["-show_format", "-show_streams"],
+}
+
+
+async def probe_file(file_path: Path, cmd: Path, profile: str = ProbeProfile.Full) -> dict[str, Any]:
+    """
+    Asyncio version of `ffmpeg.probe`. Must be awaited on the process loop
+
+    Args:
+        file_path (Path): media file path
+        cmd (Path): ffprobe binary path
+        profile (str): `ProbeProfile` value. Summary profile reads only the stream fields and
+            attached picture dispositions without tags
+    """
+    args = [cmd.as_posix(), *_PROBE_PROFILE_ARGUMENTS[profile], "-of", "json", file_path.as_posix()]
+    result = await run_process(args)
+    if result.returncode != 0:
+        raise ffmpeg.Error("ffprobe", result.stdout, result.stderr)
+
+    return json.loads(result.stdout.decode("utf-8"))
+
+
+def _get_probe_models(file_path: Path, probe_result: dict[str, Any]) -> tuple[FileInfo, Metadata]:
+    streams = probe_result.get("streams") or []
+    file_format = probe_result.get("format") or {}
+    # Attached pictures are reported as video streams and may precede the audio stream
+    has_picture = any(i.get("disposition", {}).get("attached_pic") for i in streams)
+    stream = next((i for i in streams if i.get("codec_type") == "audio"), None)
+    if stream is None:
+        raise ProbeError("No audio stream found")
+
+    metadata = _get_metadata(file_format.get("tags") or {}, has_picture)
+    codec = Codec(
+        name=stream.get("codec_name"),
+        type=stream.get("codec_type"),
+        long_name=stream.get("codec_long_name")
+    )
+    # Some codecs, e.g. FLAC, have no stream bit rate
+    bit_rate = stream.get("bit_rate") or file_format.get("bit_rate") or 0
+    info = FileInfo(
+        filename=os.path.basename(file_format.get("filename") or file_path.name),
+        file_format=file_path.suffix.replace(".", ""),
+        bit_rate=int(bit_rate),
+        bit_depth=stream.get("bits_per_sample") or None,
+        sample_rate=int(stream.get("sample_rate") or 0),
+        duration=float(file_format.get("duration") or 0),
+        channels=stream.get("channels"),
+        channels_layout=stream.get("channel_layout"),
+        codec=codec,
+    )
+    return info, metadata
+
+
+def parse_probe_result(
+    media_file: MediaFile,
+    probe_result: dict[str, Any],
+    profile: str = ProbeProfile.Full
+) -> MediaFile:
+    """
+    Fill `MediaFile` model with ffprobe result
+
+    Args:
+        media_file (MediaFile): `MediaFile` model
+        probe_result (dict): ffprobe json output
+        profile (str): `ProbeProfile` value the result was probed with
+    """
+    media_file.uuid = str(uuid.uuid4())
+    media_file.info, media_file.metadata = _get_probe_models(media_file.path, probe_result)
+    media_file.probe_profile = profile
+    return media_file
+
+
+async def probe_media_file(media_file: MediaFile, cmd: Path, profile: str = ProbeProfile.Full) -> MediaFile:
+    """
+    Fill `MediaFile` model with native parsers and fall back to ffprobe. Must be awaited on the process loop
+
+    Args:
+        media_file (MediaFile): `MediaFile` model
+        cmd (Path): ffprobe binary path
+        profile (str): `ProbeProfile` value of the ffprobe fallback. Native parsers always read the full detail
+    """
+    probe_result = await asyncio.to_thread(probe_native, media_file.path)
+    if probe_result is not None:
+        media_file.uuid = str(uuid.uuid4())
+        media_file.info, media_file.metadata = probe_result
+        media_file.probe_profile = ProbeProfile.Full
+        return media_file
+
+    return parse_probe_result(media_file, await probe_file(media_file.path, cmd, profile), profile)
+
+
+def _merge_probe_model(model: Any, probed: Any) -> Any:
+    """
+    Return a copy of `model` with the fields which were never probed taken from `probed`.
+    Fields which are set already, e.g. edited tags, are kept
+    """
+    if model is None:
+        return probed
+
+    if probed is None or not dt.is_dataclass(model):
+        return model
+
+    changes = {}
+    for field in dt.fields(model):
+        value = getattr(model, field.name)
+        probed_value = getattr(probed, field.name)
+        if dt.is_dataclass(value):
+            changes[field.name] = _merge_probe_model(value, probed_value)
+        elif value is None or value == field.default or (
+            field.default_factory is not dt.MISSING and value == field.default_factory()
+        ):
+            changes[field.name] = probed_value
+
+    return dt.replace(model, **changes)
+
+
+async def probe_media_file_details(media_file: MediaFile, cmd: Path) -> MediaFile:
+    """
+    Read all tags and streams of the file probed with the summary profile. Must be awaited on the process loop.
+    The given model may be shared by snapshots, so a new `MediaFile` model is returned
+
+    Args:
+        media_file (MediaFile): probed `MediaFile` model
+        cmd (Path): ffprobe binary path
+    """
+    if media_file.probe_profile == ProbeProfile.Full:
+        return media_file
 
-    probe = _PROBE_FILE_FORMAT_MAP.get(file_format)()
-    probe = probe(filepath)
-    return probe
+    probe_result = await probe_file(media_file.path, cmd, ProbeProfile.Full)
+    info, metadata = _get_probe_models(media_file.path, probe_result)
+    return dt.replace(
+        media_file,
+        uuid=str(uuid.uuid4()),
+        info=_merge_probe_model(media_file.info, info),
+        metadata=_merge_probe_model(media_file.metadata, metadata),
+        probe_profile=ProbeProfile.Full
+    )
@@ -0,0 +1,126 @@
+"""
+Asyncio subprocess backend for ffmpeg and ffprobe
+"""
+import asyncio
+import threading
+import dataclasses as dt
+from typing import Coroutine
+from concurrent.futures import Future
+
+
+@dt.dataclass(slots=True)
+class ProcessResult:
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+
+
+class ProcessLoop:
+    """
+    Asyncio event loop running in a dedicated daemon thread
+
+    Children processes are started and read by the loop, so any number of them
+    costs no threads. Coroutines are submitted from any thread
+    """
+
+    def __init__(self, name: str = "process-loop") -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def is_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """
+        Schedule coroutine on the loop and return `concurrent.futures.Future` of its result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Coroutine):
+        """
+        Run coroutine on the loop and block the calling thread until it is done.
+        Must not be called from the loop thread
+        """
+        if self.is_loop_thread():
+            raise RuntimeError("ProcessLoop.run can't be called from the loop thread")
+
+        return self.submit(coroutine).result()
+
+    def call_soon(self, callback: callable, *args) -> None:
+        """
+        Thread-safe call of the callback in the loop thread
+        """
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_process_loop: ProcessLoop = None
+_process_loop_lock = threading.Lock()
+
+
+def get_process_loop() -> ProcessLoop:
+    """
+    Get shared process loop. It is started on first call
+    """
+    global _process_loop
+
+    with _process_loop_lock:
+        if _process_loop is None:
+            _process_loop = ProcessLoop()
+
+    return _process_loop
+
+
+async def run_process(args: list[str], on_line: callable = None, on_start: callable = None) -> ProcessResult:
+    """
+    Run process and read its output without blocking the loop
+
+    Process is killed if the calling task is cancelled
+
+    Args:
+        args (list[str]): command line arguments
+        on_line (callable|None): called with every decoded stdout line instead of collecting stdout
+        on_start (callable|None): called with started `asyncio.subprocess.Process`
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    if on_start:
+        on_start(process)
+
+    # Read stderr concurrently, so a full pipe never blocks the process
+    stderr_task = asyncio.ensure_future(process.stderr.read())
+    try:
+        if on_line is None:
+            stdout = await process.stdout.read()
+        else:
+            stdout = b""
+            async for line in process.stdout:
+                on_line(line.decode("utf-8", errors="replace"))
+
+        stderr = await stderr_task
+        returncode = await process.wait()
+    except BaseException:
+        stderr_task.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    return ProcessResult(returncode=returncode, stdout=stdout, stderr=stderr)
@@ -0,0 +1,114 @@
+"""
+ffmpeg `-progress` stream parser
+"""
+import time
+from typing import Iterable, Iterator, Optional
+
+from pieapp.api.converter.models import ConverterProgress
+
+
+# Arguments to make ffmpeg write machine-readable progress into stdout
+PROGRESS_ARGUMENTS: tuple[str, ...] = ("-progress", "pipe:1", "-nostats", "-loglevel", "error")
+
+
+def parse_out_time(block: dict[str, str]) -> float:
+    """
+    Get encoded time in seconds from the progress block
+    """
+    # `out_time_ms` is in microseconds too
+    for key in ("out_time_us", "out_time_ms"):
+        value = block.get(key, "N/A")
+        if value.lstrip("-").isdigit():
+            return max(int(value), 0) / 1_000_000
+
+    hours, _, rest = block.get("out_time", "").partition(":")
+    minutes, _, seconds = rest.partition(":")
+    try:
+        return max(int(hours) * 3600 + int(minutes) * 60 + float(seconds), 0.0)
+    except ValueError:
+        return 0.0
+
+
+def parse_speed(block: dict[str, str]) -> Optional[float]:
+    try:
+        return float(block.get("speed", "").strip().rstrip("x"))
+    except ValueError:
+        return None
+
+
+def parse_total_size(block: dict[str, str]) -> int:
+    value = block.get("total_size", "")
+    return int(value) if value.isdigit() else 0
+
+
+class ProgressReader:
+    """
+    Incremental ffmpeg `-progress` parser. Feed it output lines one by one
+
+    Args:
+        name (str): media file name
+        duration (float|None): source duration in seconds to calculate percents
+        interval (float): minimal interval between two returned blocks in seconds. The last block is always returned
+    """
+
+    def __init__(self, name: str, duration: float = None, interval: float = 0.25) -> None:
+        self._name = name
+        self._duration = duration
+        self._interval = interval
+        self._block: dict[str, str] = {}
+        self._last_time = 0.0
+
+    def feed(self, line: str) -> Optional[ConverterProgress]:
+        """
+        Parse one line. Returns `ConverterProgress` when a progress block is complete and not rate-limited
+        """
+        key, _, value = line.strip().partition("=")
+        if not key:
+            return
+
+        self._block[key] = value.strip()
+        if key != "progress":
+            return
+
+        block, self._block = self._block, {}
+        is_end = value.strip() == "end"
+        now = time.monotonic()
+        if not is_end and now - self._last_time < self._interval:
+            return
+
+        self._last_time = now
+        out_time = parse_out_time(block)
+        percent = None
+        if self._duration:
+            percent = 100.0 if is_end else min(out_time * 100 / self._duration, 100.0)
+
+        return ConverterProgress(
+            name=self._name,
+            out_time=out_time,
+            speed=parse_speed(block),
+            total_size=parse_total_size(block),
+            percent=percent,
+            is_end=is_end
+        )
+
+
+def read_progress(
+    name: str,
+    lines: Iterable[str],
+    duration: float = None,
+    interval: float = 0.25
+) -> Iterator[ConverterProgress]:
+    """
+    Read ffmpeg `-progress` output line by line and yield `ConverterProgress` models
+
+    Args:
+        name (str): media file name
+        lines (Iterable[str]): progress output lines
+        duration (float|None): source duration in seconds to calculate percents
+        interval (float): minimal interval between two yielded blocks in seconds. The last block is always yielded
+    """
+    reader = ProgressReader(name, duration, interval)
+    for line in lines:
+        progress = reader.feed(line)
+        if progress is not None:
+            yield progress
@@ -0,0 +1,71 @@
+"""
+Segment-parallel encoding helpers
+"""
+import math
+import os
+from pathlib import Path
+
+
+# Segments are cut at multiples of this number of samples.
+# It is a common multiple of MP3 (1152), AAC (1024) and FLAC (4096) frame sizes,
+# so every segment except the last one is made of whole encoder frames
+SEGMENT_ALIGNMENT_SAMPLES: int = 36864
+
+# Don't split files into segments shorter than this number of seconds
+MIN_SEGMENT_DURATION: float = 60.0
+
+# Output file formats which are encoded in segments. Their frames are lossless and independent,
+# so the concatenated output is sample-exact. Lossy encoders add priming and padding samples
+# at every segment boundary, these outputs are encoded from a single decode
+SEGMENT_FILE_FORMATS: tuple[str, ...] = ("wav", "flac")
+
+# Allowed difference between the source and the concatenated output duration in samples.
+# ffmpeg reports the output time of the last packet, and packets of the segmented formats
+# are at most one FLAC frame long
+SEGMENT_DURATION_TOLERANCE_SAMPLES: int = 4096
+
+
+def get_segments(
+    duration: float,
+    sample_rate: int,
+    segments_count: int,
+    min_segment_duration: float = MIN_SEGMENT_DURATION
+) -> list[tuple[float, float]]:
+    """
+    Split source duration into aligned time segments
+
+    Returns list of (<start in seconds>, <duration in seconds>). The last segment has no duration
+    and is read until the end of the source, so no samples are lost to rounding
+
+    Args:
+        duration (float): source duration in seconds
+        sample_rate (int): source sample rate
+        segments_count (int): maximum number of segments
+        min_segment_duration (float): minimal segment duration in seconds
+    """
+    total_samples = int(duration * sample_rate)
+    total_frames = total_samples // SEGMENT_ALIGNMENT_SAMPLES
+    segments_count = min(segments_count, math.floor(duration / min_segment_duration), total_frames)
+    if segments_count < 2:
+        return [(0.0, None)]
+
+    frames_per_segment = total_frames // segments_count
+    segment_samples = frames_per_segment * SEGMENT_ALIGNMENT_SAMPLES
+
+    segments = []
+    for index in range(segments_count):
+        start = index * segment_samples / sample_rate
+        length = segment_samples / sample_rate if index < segments_count - 1 else None
+        segments.append((start, length))
+
+    return segments
+
+
+def write_concat_list(file_path: os.PathLike, files: list[Path]) -> None:
+    """
+    Write file list for the ffmpeg concat demuxer
+    """
+    with open(file_path, "w", encoding="utf-8") as output:
+        for file in files:
+            escaped_path = file.as_posix().replace("'", r"'\''")
+            output.write(f"file '{escaped_path}'\n")
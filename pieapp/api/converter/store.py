@@ -0,0 +1,237 @@
+"""
+Content-addressed store of imported files
+"""
+import os
+import uuid
+import threading
+from pathlib import Path
+from typing import Union
+
+from pieapp.api.utils.files import clone_file
+from pieapp.api.utils.files import COPY_BUFFER_SIZE
+from pieapp.api.utils.files import read_json
+from pieapp.api.utils.files import write_json
+from pieapp.api.utils.logger import logger
+from pieapp.api.converter.utils import get_content_hash
+
+
+# Store index file name
+STORE_INDEX_FILE_NAME: str = "index.json"
+
+
+class ContentStore:
+    """
+    Imported files are stored as <object id>/<file name>. Source files are identified by their
+    device, inode, size and modification time, so unchanged files are stored once
+    no matter how many times they were opened, without reading their content.
+    Files with the same content from different sources are linked to one file by `deduplicate`
+
+    Every stored file has a reference count of `MediaFile` snapshots which use it.
+    Files without references are removed by `collect`
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike]) -> None:
+        self._directory = Path(directory)
+        self._index_path = self._directory / STORE_INDEX_FILE_NAME
+        self._lock = threading.Lock()
+
+        index = read_json(self._index_path, default={}, raise_exception=False)
+        # <stored file path relative to the store>: <number of references>
+        self._references: dict[str, int] = index.get("references", {})
+        # Stored files of the source files: <device>:<inode>:<size>:<mtime_ns>: <stored file path relative to the store>
+        self._sources: dict[str, str] = index.get("sources", {})
+        # Content hashes of the stored files: <stored file path relative to the store>: [<size>, <mtime_ns>, <hash>]
+        self._hashes: dict[str, list] = index.get("hashes", {})
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def _get_key(self, file_path: Path) -> str:
+        return file_path.relative_to(self._directory).as_posix()
+
+    @staticmethod
+    def _get_source_key(stat: os.stat_result) -> str:
+        return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def add(self, file_path: Path, buffer_size: int = COPY_BUFFER_SIZE, on_progress: callable = None) -> Path:
+        """
+        Add file to the store, add reference to it and return path of the stored file.
+        Unchanged source file is cloned only once, see `clone_file`. Its content isn't read,
+        so reflinked and hardlinked files are imported without I/O
+
+        Args:
+            file_path (Path): source file path
+            buffer_size (int): read and write buffer size in bytes
+            on_progress (callable|None): called with the number of bytes copied since the last call
+        """
+        stat = file_path.stat()
+        source_key = self._get_source_key(stat)
+        # Reference is added with the lookup, so `collect` can't remove the file before it is used
+        with self._lock:
+            key = self._sources.get(source_key)
+            if key is not None and (self._directory / key).exists():
+                self._references[key] = self._references.get(key, 0) + 1
+                if on_progress:
+                    on_progress(stat.st_size)
+                return self._directory / key
+
+        # Clone into a temporary file, so concurrent imports of the same file never see a partial file
+        self._directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self._directory / f".{uuid.uuid4().hex}.tmp"
+        try:
+            clone_method = clone_file(file_path, temp_path, buffer_size=buffer_size, on_progress=on_progress)
+            logger.debug(f"Stored {file_path!s} ({clone_method})")
+            with self._lock:
+                key = self._sources.get(source_key)
+                if key is None or not (self._directory / key).exists():
+                    stored_path = self._directory / uuid.uuid4().hex / file_path.name
+                    stored_path.parent.mkdir()
+                    os.replace(temp_path, stored_path)
+                    key = self._get_key(stored_path)
+                    self._sources[source_key] = key
+
+                self._references[key] = self._references.get(key, 0) + 1
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+        return self._directory / key
+
+    def _get_content_hash(self, key: str) -> str:
+        """
+        Get content hash of the stored file. Hash of the unchanged file is read from the index
+        """
+        file_path = self._directory / key
+        stat = file_path.stat()
+        with self._lock:
+            cached = self._hashes.get(key)
+
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        content_hash = get_content_hash(file_path)
+        with self._lock:
+            self._hashes[key] = [stat.st_size, stat.st_mtime_ns, content_hash]
+
+        return content_hash
+
+    def deduplicate(self) -> int:
+        """
+        Link stored files with the same content to one file. Only files of the same size are hashed.
+        Paths of the stored files don't change, so it can run after the files were opened.
+        Returns number of linked files
+        """
+        with self._lock:
+            keys = [k for k in self._references if (self._directory / k).exists()]
+
+        # <size>: <stored files>
+        sizes: dict[int, list[str]] = {}
+        for key in keys:
+            sizes.setdefault((self._directory / key).stat().st_size, []).append(key)
+
+        linked_count = 0
+        for size_keys in sizes.values():
+            if len(size_keys) < 2:
+                continue
+
+            # <content hash>: <stored file>
+            contents: dict[str, Path] = {}
+            for key in size_keys:
+                file_path = self._directory / key
+                content_hash = self._get_content_hash(key)
+                original_path = contents.setdefault(content_hash, file_path)
+                if original_path == file_path or original_path.samefile(file_path):
+                    continue
+
+                temp_path = self._directory / f".{uuid.uuid4().hex}.tmp"
+                try:
+                    clone_file(original_path, temp_path)
+                    # File may be removed by `collect` meanwhile
+                    with self._lock:
+                        if self._references.get(key, 0) > 0:
+                            os.replace(temp_path, file_path)
+                            linked_count += 1
+                except OSError as e:
+                    logger.debug(f"Can't link {file_path!s}: {e!s}")
+                finally:
+                    temp_path.unlink(missing_ok=True)
+
+        return linked_count
+
+    def contains(self, file_path: Path) -> bool:
+        return file_path.is_relative_to(self._directory)
+
+    def acquire(self, file_path: Path) -> None:
+        """
+        Add reference to the stored file
+        """
+        key = self._get_key(file_path)
+        with self._lock:
+            self._references[key] = self._references.get(key, 0) + 1
+
+    def release(self, file_path: Path) -> None:
+        """
+        Remove reference to the stored file. File is removed by `collect` when it has no references
+        """
+        key = self._get_key(file_path)
+        with self._lock:
+            self._references[key] = max(0, self._references.get(key, 0) - 1)
+
+    def release_all(self) -> None:
+        with self._lock:
+            self._references.clear()
+
+    def get_referenced_files(self) -> list[Path]:
+        """
+        Get stored files which have references, e.g. to restore them after restart
+        """
+        with self._lock:
+            files = [self._directory / k for k, v in self._references.items() if v > 0]
+
+        return [i for i in files if i.exists()]
+
+    def collect(self) -> int:
+        """
+        Remove stored files without references and their index entries. Returns number of removed files
+        """
+        removed_count = 0
+        if not self._directory.exists():
+            return removed_count
+
+        with self._lock:
+            stored_keys = set()
+            for object_directory in self._directory.iterdir():
+                # Index and temporary files of the running imports
+                if not object_directory.is_dir():
+                    continue
+
+                for file in object_directory.iterdir():
+                    key = self._get_key(file)
+                    if self._references.get(key, 0) > 0:
+                        stored_keys.add(key)
+                        continue
+
+                    try:
+                        file.unlink()
+                        removed_count += 1
+                    except OSError as e:
+                        stored_keys.add(key)
+                        logger.debug(f"Can't remove {file!s}: {e!s}")
+
+                if not any(object_directory.iterdir()):
+                    object_directory.rmdir()
+
+            self._references = {k: v for k, v in self._references.items() if k in stored_keys}
+            self._sources = {k: v for k, v in self._sources.items() if v in stored_keys}
+            self._hashes = {k: v for k, v in self._hashes.items() if k in stored_keys}
+
+        self.save()
+        return removed_count
+
+    def save(self) -> None:
+        with self._lock:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            write_json(
+                self._index_path,
+                {"references": self._references, "sources": self._sources, "hashes": self._hashes}
+            )
@@ -1,14 +1,36 @@
-import ffmpeg
-from pathlib import Path
+import os
+import json
+import hashlib
+from typing import Any, Union
 
 
-def get_cover_album(cmd: Path, filepath: Path, temp_folder: Path) -> Path:
-    cover_image_path = temp_folder / f"{filepath.stem!s}.jpg"
-    (
-        ffmpeg
-        .input(filepath.as_posix())
-        .output(cover_image_path.as_posix(), acodec="copy")
-        .run_async(cmd=cmd.as_posix(), overwrite_output=True, pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
-    )
+def get_arguments_fingerprint(arguments: dict[str, Any]) -> str:
+    """
+    Get a stable hash of the ffmpeg output arguments
+    """
+    data = json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
 
-    return cover_image_path
+
+def get_content_hash(file_path: Union[str, os.PathLike], block_size: int = 1024 * 1024) -> str:
+    """
+    Get sha1 hash of the file content
+    """
+    content_hash = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            content_hash.update(block)
+
+    return content_hash.hexdigest()
+
+
+def get_file_fingerprint(file_path: Union[str, os.PathLike], use_content_hash: bool = False) -> dict[str, Any]:
+    """
+    Get file fingerprint: size, modification time and optional content hash
+    """
+    stat = os.stat(file_path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if use_content_hash:
+        fingerprint["hash"] = get_content_hash(file_path)
+
+    return fingerprint
@@ -1,13 +1,17 @@
 import os
 import uuid
-import shutil
+import time
+import asyncio
+import threading
 import tarfile
 import zipfile
 from pathlib import Path
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from urllib import request
 
 import ffmpeg
-from dotty_dict import Dotty
 
 from PySide6.QtCore import Slot
 from PySide6.QtCore import Signal
@@ -15,18 +19,31 @@ from PySide6.QtCore import QObject
 from PySide6.QtCore import QRunnable
 
 from pieapp.api.globals import Global
+from pieapp.api.utils.files import COPY_BUFFER_SIZE
 from pieapp.api.utils.logger import logger
 from pieapp.api.exceptions import NotificationError
 
-from pieapp.api.converter.models import Codec
-from pieapp.api.converter.models import FileInfo
-from pieapp.api.converter.models import AlbumCover
-from pieapp.api.converter.models import Metadata
 from pieapp.api.converter.models import MediaFile
-from pieapp.api.converter.builders import get_query_builder
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ConverterJobStatus
+from pieapp.api.converter.models import ConverterResult
+from pieapp.api.converter.models import ConverterProgress
+from pieapp.api.converter.models import ProbeProfile
+from pieapp.api.converter.engine import ConverterEngine
+from pieapp.api.converter.engine import get_max_processes
+from pieapp.api.converter.probe import probe_media_file
+from pieapp.api.converter.probe import probe_media_file_details
+from pieapp.api.converter.probe import ProbeError
+from pieapp.api.converter.processes import get_process_loop
+from pieapp.api.converter.covers import CoverCache
+from pieapp.api.converter.cache import ConverterCache
+from pieapp.api.converter.cache import ProbeCache
+from pieapp.api.converter.journal import ConverterJournal
+from pieapp.api.converter.imports import scan_audio_files
+from pieapp.api.converter.imports import get_working_copy
+from pieapp.api.converter.store import ContentStore
 
 from pieapp.api.registries.locales.helpers import translate
-from pieapp.api.converter.utils import get_cover_album
 
 
 ARCHIVE_URL_NAME: dict[str, str] = {
@@ -42,20 +59,57 @@ ARCHIVE_TYPE_NAME: dict[str, str] = {
 
 class CopyFilesSignals(QObject):
     started = Signal()
-    completed = Signal()
+    # <bytes done>, <bytes total>, <files per second>
+    progress = Signal(object, object, float)
+    # <source path>: <path of the imported file in the destination directory>
+    completed = Signal(dict)
+    failed = Signal(Exception)
+
+
+class ScanFilesSignals(QObject):
+    started = Signal()
+    # Batch of found audio files
+    found_batch = Signal(list)
+    # Number of found audio files
+    completed = Signal(int)
+    failed = Signal(Exception)
+
+
+class WorkingCopySignals(QObject):
+    started = Signal()
+    # `MediaFile` models of the working copies
+    completed = Signal(list)
     failed = Signal(Exception)
 
 
 class ConverterSignals(QObject):
     started = Signal()
+    # Batch of probed `MediaFile` models, emitted as soon as the batch is ready
+    completed_batch = Signal(list)
+    # All probed `MediaFile` models
     completed = Signal(list)
     failed = Signal(Exception)
 
 
+class MediaFileDetailsSignals(QObject):
+    started = Signal()
+    # <probed `MediaFile` model>, <`AlbumCover` model or `None`>
+    completed = Signal(MediaFile, object)
+    failed = Signal(Exception)
+
+
 class ConverterProcessSignals(QObject):
     started = Signal()
     completed_element = Signal(str)
-    completed = Signal()
+    # <media file name>, <percent of the source duration>
+    progress_element = Signal(str, float)
+    # <media file name>, <realtime speed factor>
+    speed_element = Signal(str, float)
+    # <media file name>, <bytes written>
+    bytes_written = Signal(str, object)
+    # <media file name>, <error message>
+    failed_element = Signal(str, str)
+    completed = Signal(ConverterResult)
     failed = Signal(Exception)
 
 
@@ -133,37 +187,172 @@ class DownloadWorker(QObject):
 
 class CopyFilesWorker(QRunnable):
 
-    def __init__(self, selected_files: list[Path], destination: Path) -> None:
+    def __init__(
+        self,
+        selected_files: list[Path],
+        store: ContentStore,
+        max_copies: int = 4,
+        buffer_size: int = COPY_BUFFER_SIZE,
+        progress_interval: float = 0.25
+    ) -> None:
         super(CopyFilesWorker, self).__init__()
 
         self._signals = CopyFilesSignals()
         self._selected_files = selected_files
-        self._destination = destination
+        self._store = store
+        # Number of files copied at once
+        self._max_copies = max(1, max_copies)
+        # Read and write buffer size in bytes
+        self._buffer_size = buffer_size
+        # Minimal interval in seconds between `progress` signals
+        self._progress_interval = progress_interval
+
+        self._lock = threading.Lock()
+        self._bytes_done = 0
+        self._bytes_total = 0
+        self._files_done = 0
+        self._started_at = 0.0
+        self._progress_emitted_at = 0.0
 
     @property
     def signals(self) -> CopyFilesSignals:
         return self._signals
 
-    def _wait_files_to_copy(self) -> None:
-        files_ready = False
-        while not files_ready:
-            if all([i.exists() for i in self._selected_files]):
-                files_ready = True
+    def _emit_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._progress_emitted_at < self._progress_interval:
+            return
+
+        self._progress_emitted_at = now
+        elapsed = max(now - self._started_at, 1e-6)
+        self._signals.progress.emit(self._bytes_done, self._bytes_total, self._files_done / elapsed)
 
-        # QTimer.single_shot(500, lambda: self._wait_files_to_copy(self._files))
-        self._signals.completed.emit()
+    def _add_bytes_done(self, size: int) -> None:
+        with self._lock:
+            self._bytes_done += size
+            self._emit_progress()
+
+    def _import_file(self, file: Path) -> Path:
+        destination = self._store.add(file, buffer_size=self._buffer_size, on_progress=self._add_bytes_done)
+        with self._lock:
+            self._files_done += 1
+
+        return destination
 
     @Slot()
     def run(self) -> None:
+        """
+        Import files into the content store without duplicating their data if possible.
+        Every imported file gets a reference. See `ContentStore.add` and `clone_file`
+
+        Up to `max_copies` files are copied at once, see `get_device_concurrency`
+        """
         self._signals.started.emit()
-        for index, file in enumerate(self._selected_files):
+        self._started_at = time.monotonic()
+        self._bytes_total = sum(i.stat().st_size for i in self._selected_files if i.is_file())
+        imported_files = {}
+        with ThreadPoolExecutor(max_workers=self._max_copies) as executor:
+            futures = {i: executor.submit(self._import_file, i) for i in self._selected_files}
+            for file, future in futures.items():
+                try:
+                    imported_files[file] = future.result()
+                except Exception as e:
+                    self._signals.failed.emit(e)
+
+        self._store.save()
+        with self._lock:
+            self._emit_progress(force=True)
+
+        self._signals.completed.emit(imported_files)
+        # Imported files are already opened, identical files are linked afterwards
+        try:
+            self._store.deduplicate()
+            self._store.save()
+        except Exception as e:
+            logger.exception(e)
+
+
+class ScanFilesWorker(QRunnable):
+
+    def __init__(
+        self,
+        paths: list[Path],
+        recursive: bool = True,
+        batch_size: int = 1000,
+        batch_interval: float = 0.5
+    ) -> None:
+        super(ScanFilesWorker, self).__init__()
+
+        self._signals = ScanFilesSignals()
+        # Files and directories to scan
+        self._paths = paths
+        self._recursive = recursive
+        # Maximum number of files in one `found_batch` signal
+        self._batch_size = batch_size
+        # Maximum interval in seconds between the first found file and its batch signal
+        self._batch_interval = batch_interval
+
+    @property
+    def signals(self) -> ScanFilesSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Scan directories and emit found audio files in batches
+        """
+        self._signals.started.emit()
+        files_count = 0
+        batch: list[Path] = []
+        batch_started_at = 0.0
+        try:
+            for file in scan_audio_files(self._paths, self._recursive):
+                if not batch:
+                    batch_started_at = time.monotonic()
+
+                batch.append(file)
+                if len(batch) >= self._batch_size or time.monotonic() - batch_started_at >= self._batch_interval:
+                    self._signals.found_batch.emit(batch)
+                    files_count += len(batch)
+                    batch = []
+        except Exception as e:
+            self._signals.failed.emit(e)
+
+        if batch:
+            self._signals.found_batch.emit(batch)
+            files_count += len(batch)
+
+        self._signals.completed.emit(files_count)
+
+
+class WorkingCopyWorker(QRunnable):
+
+    def __init__(self, media_files: list[MediaFile], temp_directory: Path) -> None:
+        super(WorkingCopyWorker, self).__init__()
+
+        self._signals = WorkingCopySignals()
+        self._media_files = media_files
+        self._temp_directory = temp_directory
+
+    @property
+    def signals(self) -> WorkingCopySignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Create working copies of the referenced files before they are written. See `get_working_copy`
+        """
+        self._signals.started.emit()
+        working_copies = []
+        for media_file in self._media_files:
             try:
-                shutil.copy2(str(file), str(self._destination))
-                self._selected_files[index] = self._destination / file.name
+                working_copies.append(get_working_copy(media_file, self._temp_directory))
             except Exception as e:
+                logger.exception(e)
                 self._signals.failed.emit(e)
 
-        self._wait_files_to_copy()
+        self._signals.completed.emit(working_copies)
 
 
 class ProbeWorker(QRunnable):
@@ -171,108 +360,331 @@ class ProbeWorker(QRunnable):
     def __init__(
         self,
         media_files: list[MediaFile],
-        temp_folder: Path,
-        ffmpeg_command: Path,
         ffprobe_command: Path,
+        max_processes: int = None,
+        batch_size: int = 50,
+        batch_interval: float = 0.2,
+        cache: ProbeCache = None,
+        profile: str = ProbeProfile.Summary
     ) -> None:
         super(ProbeWorker, self).__init__()
 
-        self._media_files = media_files
-        self._temp_folder = temp_folder
-        self._ffmpeg_command = ffmpeg_command
+        # Queue of files to probe, see `add`
+        self._media_files: deque[MediaFile] = deque(media_files)
         self._ffprobe_command = ffprobe_command
+        # Number of ffprobe processes to run at once
+        self._max_processes = get_max_processes(max_processes)
+        # Number of files taken from the queue at once. Cached files don't wait for ffprobe processes
+        self._max_tasks = self._max_processes * 2
+        # Maximum number of files in one `completed_batch` signal
+        self._batch_size = batch_size
+        # Maximum interval in seconds between the first probed file and its batch signal
+        self._batch_interval = batch_interval
+        # Optional cache of parsed probe results
+        self._cache = cache
+        # `ProbeProfile` value. Files list needs the summary only, full detail is read on demand
+        self._profile = profile
         self._signals = ConverterSignals()
 
+        self._lock = threading.Lock()
+        self._is_running = False
+        # Set when the queue is drained, see `wait`
+        self._done_event = threading.Event()
+        self._done_event.set()
+
     @property
     def signals(self) -> ConverterSignals:
         return self._signals
 
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block the calling thread until the queue is drained. Returns `False` on timeout
+        """
+        return self._done_event.wait(timeout)
+
+    def add(self, media_files: list[MediaFile]) -> bool:
+        """
+        Add files to the queue of the running worker.
+        Returns `True` if the worker isn't running and must be started
+
+        Args:
+            media_files (list[MediaFile]): `MediaFile` models to probe
+        """
+        with self._lock:
+            self._media_files.extend(media_files)
+            if self._is_running or not self._media_files:
+                return False
+
+            self._is_running = True
+            return True
+
+    async def _probe_files(self, probe_results: list[MediaFile]) -> None:
+        """
+        Run up to `max_processes` ffprobe processes at once on the process loop
+        and emit probed files in batches as soon as they are ready.
+        Files are taken from the queue as the running ones are done, so the files added later share the same limit.
+        A file which can't be probed is reported by `failed` and doesn't stop the rest
+        """
+        semaphore = asyncio.Semaphore(self._max_processes)
+
+        async def probe(media_file: MediaFile) -> MediaFile:
+            if self._cache is not None:
+                cached = await asyncio.to_thread(self._cache.get, media_file.path, self._profile)
+                if cached is not None:
+                    media_file.uuid = str(uuid.uuid4())
+                    media_file.info, media_file.metadata, media_file.probe_profile = cached
+                    return media_file
+
+            async with semaphore:
+                media_file = await probe_media_file(media_file, self._ffprobe_command, self._profile)
+
+            if self._cache is not None:
+                await asyncio.to_thread(
+                    self._cache.put,
+                    media_file.path,
+                    media_file.info,
+                    media_file.metadata,
+                    media_file.probe_profile
+                )
+
+            return media_file
+
+        batch: list[MediaFile] = []
+        batch_started_at = 0.0
+        # <task>: <media file>
+        tasks: dict[asyncio.Future, MediaFile] = {}
+        while True:
+            with self._lock:
+                while self._media_files and len(tasks) < self._max_tasks:
+                    media_file = self._media_files.popleft()
+                    tasks[asyncio.ensure_future(probe(media_file))] = media_file
+
+            if not tasks:
+                break
+
+            # Don't keep probed files waiting for slow ones longer than `batch_interval`
+            timeout = None
+            if batch:
+                timeout = max(0.0, self._batch_interval - (time.monotonic() - batch_started_at))
+
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                media_file = tasks.pop(task)
+                try:
+                    media_file = task.result()
+                except Exception as e:
+                    self._emit_failed(media_file, e)
+                    continue
+
+                if not batch:
+                    batch_started_at = time.monotonic()
+                batch.append(media_file)
+
+            if batch and (
+                not tasks
+                or len(batch) >= self._batch_size
+                or time.monotonic() - batch_started_at >= self._batch_interval
+            ):
+                self._signals.completed_batch.emit(batch)
+                probe_results.extend(batch)
+                batch = []
+
+        if self._cache is not None:
+            await asyncio.to_thread(self._cache.save)
+
+    def _emit_failed(self, media_file: MediaFile, exception: Exception) -> None:
+        if isinstance(exception, ffmpeg.Error) and exception.stderr:
+            logger.debug(exception.stderr)
+            # The last line of ffprobe output is the reason
+            error = exception.stderr.decode("utf-8", errors="replace").strip().splitlines()[-1]
+        else:
+            error = str(exception) or exception.__class__.__name__
+
+        self._signals.failed.emit(ProbeError(f"{media_file.name}: {error}"))
+
     @Slot()
     def run(self) -> None:
         """
-        Run ffprobe and get file information
+        Start probing the queue on the process loop and return, so no pool thread waits for ffprobe.
+        Signals are emitted from the process loop thread.
+        `completed` is emitted with the probed files even if probe has failed
         """
+        with self._lock:
+            self._is_running = True
+            self._done_event.clear()
+
+        self._signals.started.emit()
+        self._submit_probe_files()
+
+    def _submit_probe_files(self) -> None:
+        probe_results: list[MediaFile] = []
+        future = get_process_loop().submit(self._probe_files(probe_results))
+        future.add_done_callback(lambda i: self._probe_files_done(i, probe_results))
+
+    def _probe_files_done(self, future: Future, probe_results: list[MediaFile]) -> None:
+        is_failed = False
         try:
-            self._signals.started.emit()
-            probe_results: list[MediaFile] = []
-            for media_file in self._media_files:
-                probe_result = Dotty(ffmpeg.probe(media_file.path.as_posix(), self._ffprobe_command.as_posix()))
-                album_cover_path = get_cover_album(self._ffmpeg_command, media_file.path, self._temp_folder)
-                album_cover = AlbumCover(
-                    image_path=album_cover_path,
-                    image_file_format=album_cover_path.stem,
-                )
+            future.result()
+        except Exception as e:
+            logger.exception(e)
+            self._signals.failed.emit(e)
+            is_failed = True
 
-                if probe_result:
-                    probe_result["stream"] = probe_result["streams"][0]
-                    probe_result.pop("streams")
-                    metadata = Metadata(
-                        title=probe_result.get("format.tags.title"),
-                        genre=probe_result.get("format.tags.genre"),
-                        subgenre=probe_result.get("format.tags.subgenre"),
-                        track_number=probe_result.get("format.tags.track_number"),
-                        featured_artist=probe_result.get("format.tags.album"),
-                        primary_artist=probe_result.get("format.tags.album_artist"),
-                        album_cover=album_cover
-                    )
-                    codec = Codec(
-                        name=probe_result.get("stream.codec_name"),
-                        type=probe_result.get("stream.codec_type"),
-                        long_name=probe_result.get("format.codec_long_name")
-                    )
-                    info = FileInfo(
-                        filename=os.path.basename(probe_result.get("format.filename")),
-                        file_format=media_file.path.suffix.replace(".", ""),
-                        bit_rate=int(probe_result.get("stream.bit_rate")),
-                        bit_depth=probe_result.get("stream.bit_per_sample"),
-                        sample_rate=int(probe_result.get("stream.sample_rate")),
-                        duration=probe_result.get("stream.duration_ts"),
-                        channels=probe_result.get("stream.channels"),
-                        channels_layout=probe_result.get("stream.channel_layout"),
-                        codec=codec,
-                    )
-                    media_file.uuid = str(uuid.uuid4())
-                    media_file.info = info
-                    media_file.metadata = metadata
-                    probe_results.append(media_file)
+        self._signals.completed.emit(probe_results)
+        # Files added after the queue was drained are probed by the same run.
+        # After a failure the rest of the queue waits for the next `add`
+        with self._lock:
+            if is_failed or not self._media_files:
+                self._is_running = False
+                self._done_event.set()
+                return
+
+        self._submit_probe_files()
+
+
+class MediaFileDetailsWorker(QRunnable):
 
-            self._signals.completed.emit(probe_results)
+    def __init__(self, media_file: MediaFile, ffprobe_command: Path, cover_cache: CoverCache) -> None:
+        super(MediaFileDetailsWorker, self).__init__()
 
-        except ffmpeg.Error as e:
-            logger.debug(e.stderr)
+        self._media_file = media_file
+        self._ffprobe_command = ffprobe_command
+        self._cover_cache = cover_cache
+        self._signals = MediaFileDetailsSignals()
+
+    @property
+    def signals(self) -> MediaFileDetailsSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Read tags and extract the album cover of the file probed with the summary profile.
+        `completed` is emitted even if probe has failed, with the summary model then
+        """
+        self._signals.started.emit()
+        media_file = self._media_file
+        try:
+            media_file = get_process_loop().run(probe_media_file_details(media_file, self._ffprobe_command))
+        except Exception as e:
+            if isinstance(e, ffmpeg.Error):
+                logger.debug(e.stderr)
+            self._signals.failed.emit(e)
+
+        album_cover = None
+        try:
+            album_cover = self._cover_cache.get_album_cover(media_file)
+        except Exception as e:
+            logger.exception(e)
             self._signals.failed.emit(e)
-            raise e
+
+        self._signals.completed.emit(media_file, album_cover)
 
 
 class ConverterWorker(QRunnable):
 
-    def __init__(self, media_files: list[MediaFile], ffmpeg_command: Path) -> None:
+    def __init__(
+        self,
+        media_files: list[MediaFile],
+        ffmpeg_command: Path,
+        chunk_size: int = 10,
+        max_processes: int = None,
+        journal: ConverterJournal = None,
+        cache: ConverterCache = None,
+        jobs: list[ConverterJob] = None,
+        output_formats: list[str] = None,
+        segment_threshold: float = None
+    ) -> None:
         super(ConverterWorker, self).__init__()
-        # Chunk of MediaFile models
+        # List of MediaFile models
         self._media_files = media_files
-        # Binary path
-        self._ffmpeg_command = ffmpeg_command
+        # Output file formats of multi-target jobs
+        self._output_formats = output_formats
+        # List of already created jobs, e.g. restored from the journal
+        self._jobs = jobs
+        # Parallel ffmpeg runner
+        self._engine = ConverterEngine(ffmpeg_command, chunk_size, max_processes, journal, cache, segment_threshold)
         # Structure of signals
         self._signals = ConverterProcessSignals()
+        # Set when the batch is done, see `wait`
+        self._done_event = threading.Event()
 
     @property
     def signals(self) -> ConverterProcessSignals:
         return self._signals
 
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block the calling thread until the batch is done. Returns `False` on timeout
+        """
+        return self._done_event.wait(timeout)
+
+    # Queue control methods
+
+    def pause(self) -> None:
+        self._engine.pause()
+
+    def resume(self) -> None:
+        self._engine.resume()
+
+    def cancel(self, media_file_name: str = None) -> None:
+        """
+        Cancel one file by its name or the whole batch
+        """
+        self._engine.cancel(media_file_name)
+
+    @property
+    def is_paused(self) -> bool:
+        return self._engine.is_paused
+
+    def _on_completed_element(self, job: ConverterJob) -> None:
+        if job.status == ConverterJobStatus.Succeeded:
+            self._signals.completed_element.emit(job.name)
+        elif job.status == ConverterJobStatus.Failed:
+            self._signals.failed_element.emit(job.name, job.error or "")
+
+    def _on_progress(self, progress: ConverterProgress) -> None:
+        if progress.percent is not None:
+            self._signals.progress_element.emit(progress.name, progress.percent)
+        if progress.speed is not None:
+            self._signals.speed_element.emit(progress.name, progress.speed)
+        self._signals.bytes_written.emit(progress.name, progress.total_size)
+
     @Slot()
     def run(self) -> None:
+        """
+        Start the batch on the process loop and return, so no pool thread waits for ffmpeg.
+        Signals are emitted from the process loop thread
+        """
+        self._done_event.clear()
         self._signals.started.emit()
-        for media_file in self._media_files:
-            audio_stream = ffmpeg.input(media_file.path.as_posix()).audio
-            query_builder = get_query_builder(media_file)
-            if not query_builder:
-                continue
-            try:
-                converter_query = query_builder.build()
-                # output_file = (media_file.output_path.parent / f"{media_file.path.stem}.mp3").as_posix()
-                audio_stream = audio_stream.output(media_file.output_path.as_posix(), **converter_query)
-                ffmpeg.run(audio_stream, cmd=self._ffmpeg_command.as_posix(), overwrite_output=True)
-            except Exception as e:
-                raise NotificationError(
-                    title=translate("Converter error"),
-                    description=f"{translate('An error has been occurred while processing file')} - {media_file.name}")
+        try:
+            jobs = self._jobs
+            if jobs is None:
+                jobs = self._engine.create_jobs(self._media_files, self._output_formats)
+            future = get_process_loop().submit(
+                self._engine.run_jobs_async(jobs, self._on_completed_element, self._on_progress)
+            )
+        except Exception as e:
+            self._emit_failed(e)
+            return
+
+        future.add_done_callback(self._run_done)
+
+    def _run_done(self, future: Future) -> None:
+        try:
+            result = future.result()
+        except Exception as e:
+            self._emit_failed(e)
+            return
+
+        self._signals.completed.emit(result)
+        self._done_event.set()
+
+    def _emit_failed(self, exception: Exception) -> None:
+        logger.exception(exception)
+        self._signals.failed.emit(NotificationError(
+            title=translate("Converter error"),
+            description=translate("An error has been occurred while processing files")
+        ))
+        self._done_event.set()
@@ -5,6 +5,7 @@ Built-in app menus
 
 class MainMenuItem:
     OpenFiles = "openFiles"
+    OpenFolder = "openFolder"
     Preferences = "preferences"
     Exit = "exit"
 
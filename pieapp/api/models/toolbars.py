@@ -7,6 +7,8 @@ class ToolBarItem:
     OpenFiles = "open-files"
     Clear = "clear"
     Convert = "convert"
+    PauseConvert = "pause-convert"
+    CancelConvert = "cancel-convert"
     Preferences = "preferences"
     Spacer = "spacer"
     Exit = "exit"
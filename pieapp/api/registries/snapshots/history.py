@@ -0,0 +1,109 @@
+"""
+Snapshot history with structural sharing
+"""
+import dataclasses as dt
+from typing import Any, Iterator, Union
+
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import replace_media_file
+from pieapp.api.registries.snapshots.spill import SnapshotList
+from pieapp.api.registries.snapshots.spill import SnapshotMemoryBudget
+
+
+@dt.dataclass(frozen=True, slots=True)
+class MediaFileChange:
+    """
+    Changed field of the file version
+    """
+    field_path: str
+    value: Any
+    uuid: str
+    is_origin: bool = False
+
+    def apply(self, media_file: MediaFile) -> MediaFile:
+        new_media_file = replace_media_file(media_file, self.field_path, self.value, self.is_origin)
+        new_media_file.uuid = self.uuid
+        return new_media_file
+
+
+class MediaFileHistory:
+    """
+    Versions of one file
+
+    Full `MediaFile` models are stored for the added versions and every `checkpoint_interval` changes,
+    other versions store only the changed field. Versions are reconstructed on demand
+    and share unchanged models with the previous version, see `replace_media_file`.
+    With `budget` old versions can be evicted to disk
+    """
+
+    def __init__(self, checkpoint_interval: int = 32, budget: SnapshotMemoryBudget = None) -> None:
+        self._entries: Union[list[Union[MediaFile, MediaFileChange]], SnapshotList] = (
+            SnapshotList(budget) if budget is not None else []
+        )
+        self._checkpoint_interval = checkpoint_interval
+        # Number of changes after the last full version
+        self._changes_count = 0
+        self._uuids: set[str] = set()
+        # The last reconstructed version: (<index>, <MediaFile model>)
+        self._cached: tuple[int, MediaFile] = None
+
+    def append(self, media_file: MediaFile) -> MediaFile:
+        self._entries.append(media_file)
+        self._uuids.add(media_file.uuid)
+        self._changes_count = 0
+        self._cached = (len(self._entries) - 1, media_file)
+        return media_file
+
+    def append_change(self, field_path: str, value: Any, is_origin: bool = False) -> MediaFile:
+        """
+        Add a new version with the changed field of the last version
+        """
+        media_file = replace_media_file(self[-1], field_path, value, is_origin)
+        if self._changes_count >= self._checkpoint_interval:
+            return self.append(media_file)
+
+        self._entries.append(MediaFileChange(field_path, value, media_file.uuid, is_origin))
+        self._uuids.add(media_file.uuid)
+        self._changes_count += 1
+        self._cached = (len(self._entries) - 1, media_file)
+        return media_file
+
+    def __getitem__(self, index: int) -> MediaFile:
+        if index < 0:
+            index += len(self._entries)
+        if not 0 <= index < len(self._entries):
+            raise IndexError("History index out of range")
+
+        if self._cached is not None and self._cached[0] == index:
+            return self._cached[1]
+
+        start = index
+        while isinstance(self._entries[start], MediaFileChange):
+            start -= 1
+        media_file = self._entries[start]
+
+        # Continue from the cached version if it is closer, e.g. on redo
+        if self._cached is not None and start < self._cached[0] < index:
+            start, media_file = self._cached
+
+        for change in self._entries[start + 1:index + 1]:
+            media_file = change.apply(media_file)
+
+        self._cached = (index, media_file)
+        return media_file
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[MediaFile]:
+        for index in range(len(self._entries)):
+            yield self[index]
+
+    def __contains__(self, media_file: MediaFile) -> bool:
+        return media_file.uuid in self._uuids
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._changes_count = 0
+        self._uuids = set()
+        self._cached = None
@@ -0,0 +1,126 @@
+"""
+Append-only journal of snapshot operations
+"""
+import os
+import json
+import datetime
+import threading
+import dataclasses as dt
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from pieapp.api.utils.logger import logger
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import Codec
+from pieapp.api.converter.models import FileInfo
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import Metadata
+
+
+def _dump_model(model: Any) -> Any:
+    # `dataclasses.asdict` deep-copies every value, which is too slow for thousands of files
+    if dt.is_dataclass(model):
+        return {i.name: _dump_model(getattr(model, i.name)) for i in dt.fields(model)}
+    if isinstance(model, (list, tuple)):
+        return [_dump_model(i) for i in model]
+    if isinstance(model, Path):
+        return model.as_posix()
+    if isinstance(model, datetime.date):
+        return model.isoformat()
+    return model
+
+
+def dump_media_file(media_file: MediaFile) -> dict[str, Any]:
+    return _dump_model(media_file)
+
+
+def load_media_file(fields: dict[str, Any]) -> MediaFile:
+    fields = dict(fields)
+    fields["path"] = Path(fields["path"])
+    fields["output_path"] = Path(fields["output_path"])
+
+    info: Optional[dict] = fields.get("info")
+    if info is not None:
+        fields["info"] = FileInfo(**{**info, "codec": Codec(**info["codec"]) if info.get("codec") else None})
+
+    metadata: Optional[dict] = fields.get("metadata")
+    if metadata is not None:
+        metadata = dict(metadata)
+        album_cover = metadata.get("album_cover")
+        if album_cover is not None:
+            metadata["album_cover"] = AlbumCover(**{
+                k: Path(v) if k.endswith("_path") and v else v
+                for k, v in album_cover.items()
+            })
+        if metadata.get("year_of_composition"):
+            metadata["year_of_composition"] = datetime.date.fromisoformat(metadata["year_of_composition"])
+        fields["metadata"] = Metadata(**metadata)
+
+    return MediaFile(**fields)
+
+
+class SnapshotJournal:
+    """
+    On-disk journal of `SnapshotRegistry` operations
+
+    Every operation is appended as a JSON line and flushed, so the registry with its undo history
+    is rebuilt by replaying the journal after restart or crash. See `SnapshotRegistry.replay_journal`
+    """
+
+    def __init__(self, file_path: Union[str, os.PathLike]) -> None:
+        self._file_path = Path(file_path)
+        self._lock = threading.Lock()
+
+    @property
+    def file_path(self) -> Path:
+        return self._file_path
+
+    def append(self, operation: str, **fields: Any) -> None:
+        self.extend([{"op": operation, **fields}])
+
+    def extend(self, entries: list[dict]) -> None:
+        """
+        Append several entries with one write
+        """
+        lines = "".join(f"{json.dumps(i, ensure_ascii=False, default=str)}\n" for i in entries)
+        with self._lock:
+            self._file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._file_path, "a", encoding="utf-8") as output:
+                output.write(lines)
+                output.flush()
+
+    def read(self) -> list[dict]:
+        """
+        Read all journal entries. Broken lines (e.g. the last one after crash) are skipped
+        """
+        if not self._file_path.exists():
+            return []
+
+        entries = []
+        with self._lock, open(self._file_path, encoding="utf-8") as output:
+            for line in output:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.debug(f"Skipping broken journal line: {line!r}")
+
+        return entries
+
+    def rewrite(self, entries: list[dict]) -> None:
+        """
+        Replace all journal entries at once, e.g. to compact the journal
+        """
+        temp_path = self._file_path.with_name(f".{self._file_path.name}.tmp")
+        with self._lock:
+            self._file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as output:
+                for entry in entries:
+                    output.write(f"{json.dumps(entry, ensure_ascii=False, default=str)}\n")
+                output.flush()
+                os.fsync(output.fileno())
+            os.replace(temp_path, self._file_path)
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._file_path.exists():
+                self._file_path.unlink()
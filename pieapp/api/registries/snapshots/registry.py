@@ -1,4 +1,6 @@
-from typing import Union, Any
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union, Any
 
 from PySide6.QtCore import QObject, Signal
 
@@ -9,6 +11,69 @@ from pieapp.api.registries.sysregs import SysRegistry
 
 from pieapp.api.models.indexes import Index
 from pieapp.api.converter.models import MediaFile
+from pieapp.api.registries.snapshots.history import MediaFileHistory
+from pieapp.api.registries.snapshots.journal import SnapshotJournal
+from pieapp.api.registries.snapshots.journal import dump_media_file
+from pieapp.api.registries.snapshots.journal import load_media_file
+from pieapp.api.registries.snapshots.spill import SnapshotList
+from pieapp.api.registries.snapshots.spill import SnapshotMemoryBudget
+from pieapp.api.registries.snapshots.spill import SnapshotSpillStore
+
+
+class RowIndex:
+    """
+    Row numbers of the names in insertion order
+
+    Every name gets a stable sequence number. Row of the name is the number of alive names before it,
+    which is counted by the Fenwick tree, so add, remove and lookup don't shift the following names
+    """
+
+    def __init__(self) -> None:
+        # <name>: <sequence number starting from 1>
+        self._sequences: dict[str, int] = {}
+        # Fenwick tree of alive flags, the first element is unused
+        self._tree: list[int] = [0]
+
+    def _prefix_sum(self, sequence: int) -> int:
+        total = 0
+        while sequence > 0:
+            total += self._tree[sequence]
+            sequence -= sequence & -sequence
+        return total
+
+    def _rebuild(self) -> None:
+        """
+        Drop removed sequence numbers
+        """
+        names = sorted(self._sequences, key=self._sequences.get)
+        self._sequences = {}
+        self._tree = [0]
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str) -> None:
+        sequence = len(self._tree)
+        # Node covers the alive flags in range (sequence - lowbit, sequence]
+        lowest_sequence = sequence - (sequence & -sequence)
+        self._tree.append(1 + self._prefix_sum(sequence - 1) - self._prefix_sum(lowest_sequence))
+        self._sequences[name] = sequence
+
+    def remove(self, name: str) -> None:
+        sequence = self._sequences.pop(name)
+        while sequence < len(self._tree):
+            self._tree[sequence] -= 1
+            sequence += sequence & -sequence
+
+        # Keep the tree proportional to the number of alive names
+        if len(self._sequences) < (len(self._tree) - 1) // 2:
+            self._rebuild()
+
+    def index(self, name: str) -> int:
+        return self._prefix_sum(self._sequences[name]) - 1
+
+    def clear(self) -> None:
+        self._sequences = {}
+        self._tree = [0]
 
 
 class SnapshotRegistryClass(QObject, BaseRegistry):
@@ -26,6 +91,9 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
     # Emit on snapshot modified
     sig_snapshot_modified = Signal(MediaFile)
 
+    # Emit once on `batch` end with names of the modified snapshots
+    sig_snapshots_modified = Signal(list)
+
     # Emit on inner snapshots registry restored
     sig_snapshot_restored = Signal()
 
@@ -44,31 +112,295 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
     sig_global_snapshot_restored = Signal()
 
     def init(self) -> None:
-        # List of MediaFile models
-        self._inner_snapshots: list = []
+        # Size of the snapshots in memory, see `set_history_limit`
+        self._budget = SnapshotMemoryBudget()
 
-        # List of snapshot names
-        self._inner_snapshots_keys: list[str] = []
+        # Journal of operations to restore the registry after restart, see `set_journal`
+        self._journal: Optional[SnapshotJournal] = None
+
+        # Versions of the files in insertion order: <media file name>: <list of MediaFile models>
+        self._inner_snapshots: dict[str, SnapshotList] = {}
+
+        # Row numbers of the files in the list
+        self._inner_snapshots_rows = RowIndex()
 
         # <media file name>: <index of the version>
         self._inner_snapshot_indexes: dict[str, int] = {}
 
         # List of global snapshots
-        self._global_snapshots: list[MediaFile] = []
+        self._global_snapshots = SnapshotList(self._budget)
+
+        # Index of the last applied global snapshot, -1 if all of them are undone
+        self._global_snapshots_index: int = -1
+
+        # Undo group of every global snapshot. Snapshots of one `batch` are undone and redone at once
+        self._global_snapshot_groups: list[int] = []
+
+        # The last undo group
+        self._global_snapshot_group: int = 0
+
+        # Version of the file added with every global snapshot, see `update`.
+        # `None` if the global snapshot isn't a version of the file
+        self._global_snapshot_versions: list[Optional[int]] = []
 
-        # Current global snapshot index
-        self._global_snapshots_index: int = 0
+        # Nesting depth of `batch`, names of the snapshots modified inside it and its journal entries
+        self._batch_depth: int = 0
+        self._batch_names: dict[str, None] = {}
+        self._batch_journal_entries: list[dict] = []
 
-        # Dictionary of local snapshots: <scope name>: <list of MediaFile models>
-        self._local_snapshots: dict[str, list[MediaFile]] = {}
+        # Dictionary of local snapshots: <scope name>: <history of MediaFile models>
+        self._local_snapshots: dict[str, MediaFileHistory] = {}
 
         # Dictionary of current local snapshot index: <scope name>: <current index>
         self._local_snapshots_index: dict[str, int] = {}
 
+    def set_history_limit(self, max_resident_size: int, spill_file_path: Union[str, os.PathLike]) -> None:
+        """
+        Keep snapshots of all histories with estimated size up to `max_resident_size` bytes in memory.
+        The oldest snapshots are moved to `spill_file_path` and loaded back on access
+        """
+        if self._budget.store is not None:
+            self._budget.store.close()
+
+        self._budget.configure(max_resident_size, SnapshotSpillStore(spill_file_path))
+
+    # Journal methods
+
+    def set_journal(self, journal: SnapshotJournal) -> None:
+        """
+        Write all operations into the journal. Local snapshots aren't written, they live while the file is edited
+        """
+        self._journal = journal
+
+    def _write_journal(self, operation: str, **fields: Any) -> None:
+        if self._journal is None:
+            return
+
+        # Batch is written at once on its end, so it's never replayed partially
+        if self._batch_depth > 0:
+            self._batch_journal_entries.append({"op": operation, **fields})
+        else:
+            self._journal.append(operation, **fields)
+
+    def replay_journal(self) -> int:
+        """
+        Rebuild files, their versions and global snapshots from the journal without signals.
+        The journal is compacted after replay
+
+        Returns number of restored files
+        """
+        journal = self._journal
+        if journal is None:
+            return 0
+
+        self._journal = None
+        self.blockSignals(True)
+        entries = self._drop_unfinished_batch(journal.read())
+        try:
+            for entry in entries:
+                try:
+                    self._replay_journal_entry(entry)
+                except (KeyError, IndexError, TypeError, ValueError, PieError) as e:
+                    logger.debug(f"Skipping journal entry {entry.get('op')}: {e!s}")
+        finally:
+            # Batch isn't finished if the application crashed inside it
+            self._batch_depth = 0
+            self._batch_names = {}
+            self._batch_journal_entries = []
+            self.blockSignals(False)
+            self._journal = journal
+
+        # Journal is already compact if it has only versions of the files and global snapshots
+        if len(entries) > self.count() + 1:
+            self.compact_journal()
+        self.sig_snapshots_loaded.emit()
+        return self.count()
+
+    @staticmethod
+    def _drop_unfinished_batch(entries: list[dict]) -> list[dict]:
+        """
+        Batch is written at once, but the write may be cut off by a crash.
+        Batch without `end_batch` is dropped, so it's never replayed partially
+        """
+        batch_start = None
+        for index, entry in enumerate(entries):
+            if entry.get("op") == "begin_batch":
+                batch_start = index
+            elif entry.get("op") == "end_batch":
+                batch_start = None
+
+        return entries if batch_start is None else entries[:batch_start]
+
+    def _replay_journal_entry(self, entry: dict) -> None:
+        operation = entry["op"]
+        if operation == "add":
+            self.add(load_media_file(entry["media_file"]))
+        elif operation == "update":
+            self.update(entry["name"], load_media_file(entry["media_file"]), entry["version"])
+        elif operation == "remove":
+            self.remove(entry["name"], entry["version"])
+        elif operation == "sync_global_to_inner":
+            self.sync_global_to_inner()
+        elif operation == "add_global_snapshot":
+            self.add_global_snapshot(load_media_file(entry["media_file"]))
+        elif operation == "append_global_snapshot":
+            self._append_global_snapshot(load_media_file(entry["media_file"]))
+        elif operation == "global_snapshot_index":
+            previous_index = self._global_snapshots_index
+            self._global_snapshots_index = entry["index"]
+            self._restore_inner_versions(previous_index, entry["index"])
+        elif operation == "remove_global_snapshot":
+            self.remove_global_snapshot(entry["index"])
+        elif operation == "restore_global_snapshots":
+            self.restore_global_snapshots()
+        elif operation == "begin_batch":
+            self._begin_batch()
+        elif operation == "end_batch":
+            self._end_batch()
+        elif operation == "versions":
+            name = entry["name"]
+            self._inner_snapshots[name] = SnapshotList(
+                self._budget,
+                [load_media_file(i) for i in entry["versions"]]
+            )
+            self._inner_snapshot_indexes[name] = entry["index"]
+            self._inner_snapshots_rows.add(name)
+        elif operation == "global_snapshots":
+            self._global_snapshots = SnapshotList(
+                self._budget,
+                [load_media_file(i) for i in entry["snapshots"]]
+            )
+            self._global_snapshots_index = entry["index"]
+            # Every snapshot is a separate group in journals written before batches
+            self._global_snapshot_groups = entry.get("groups") or list(range(1, len(self._global_snapshots) + 1))
+            self._global_snapshot_group = max(self._global_snapshot_groups, default=0)
+            self._global_snapshot_versions = entry.get("versions") or [None] * len(self._global_snapshots)
+
+    def compact_journal(self) -> None:
+        """
+        Replace the journal with the current state: versions of every file and global snapshots
+        """
+        if self._journal is None:
+            return
+
+        entries = [
+            {
+                "op": "versions",
+                "name": name,
+                "versions": [dump_media_file(i) for i in snapshots],
+                "index": self._inner_snapshot_indexes.get(name, 0)
+            }
+            for name, snapshots in self._inner_snapshots.items()
+        ]
+        if self._global_snapshots:
+            entries.append({
+                "op": "global_snapshots",
+                "snapshots": [dump_media_file(i) for i in self._global_snapshots],
+                "index": self._global_snapshots_index,
+                "groups": self._global_snapshot_groups,
+                "versions": self._global_snapshot_versions
+            })
+        self._journal.rewrite(entries)
+
+    # Batch methods
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Apply many updates as one undo step with one signal, e.g. to change a tag of many files:
+
+            with SnapshotRegistry.batch():
+                for media_file in media_files:
+                    SnapshotRegistry.update(
+                        media_file.name,
+                        replace_media_file(media_file, "metadata.genre", genre)
+                    )
+
+        New versions added inside the batch become one group of global snapshots,
+        which `update_global_snapshot_index` undoes and redoes at once.
+        `sig_snapshot_modified` isn't emitted inside the batch,
+        `sig_snapshots_modified` is emitted once with names of all modified snapshots instead
+        """
+        self._begin_batch()
+        try:
+            yield
+        finally:
+            self._end_batch()
+
+    def _begin_batch(self) -> None:
+        self._batch_depth += 1
+        if self._batch_depth == 1:
+            self._write_journal("begin_batch")
+            self._global_snapshot_group += 1
+
+    def _end_batch(self) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth > 0:
+            return
+
+        if self._journal is not None:
+            self._journal.extend([*self._batch_journal_entries, {"op": "end_batch"}])
+        self._batch_journal_entries = []
+
+        names = list(self._batch_names)
+        self._batch_names = {}
+        if names:
+            self.sig_snapshots_modified.emit(names)
+
+    def _emit_snapshot_modified(self, media_file: MediaFile) -> None:
+        if self._batch_depth > 0:
+            self._batch_names[media_file.name] = None
+        else:
+            self.sig_snapshot_modified.emit(media_file)
+
     # Global snapshots methods
 
+    def _add_global_snapshot_group(self, version: int = None) -> None:
+        """
+        Every global snapshot outside of `batch` is a separate undo group
+
+        Args:
+            version (int|None): version of the file added with the global snapshot
+        """
+        if self._batch_depth == 0:
+            self._global_snapshot_group += 1
+
+        self._global_snapshot_groups.append(self._global_snapshot_group)
+        self._global_snapshot_versions.append(version)
+
+    def _drop_redo_snapshots(self) -> None:
+        """
+        Drop the undone global snapshots and versions of their files before a new change,
+        so they can't be redone and undo of the new change never restores them
+        """
+        index = self._global_snapshots_index + 1
+        if index >= len(self._global_snapshots):
+            return
+
+        for name in self.get_global_snapshot_names(index - 1, len(self._global_snapshots) - 1):
+            snapshots = self._inner_snapshots.get(name)
+            if snapshots is not None:
+                del snapshots[self._inner_snapshot_indexes[name] + 1:]
+
+        del self._global_snapshots[index:]
+        del self._global_snapshot_groups[index:]
+        del self._global_snapshot_versions[index:]
+
+    def _get_global_snapshot_group_bounds(self, index: int) -> tuple[int, int]:
+        groups = self._global_snapshot_groups
+        start = end = index
+        while start > 0 and groups[start - 1] == groups[index]:
+            start -= 1
+        while end < len(groups) - 1 and groups[end + 1] == groups[index]:
+            end += 1
+
+        return start, end
+
     def add_global_snapshot(self, media_file: MediaFile) -> MediaFile:
+        self._write_journal("add_global_snapshot", media_file=dump_media_file(media_file))
+        self._drop_redo_snapshots()
         self._global_snapshots.append(media_file)
+        self._add_global_snapshot_group()
         self._global_snapshots_index = len(self._global_snapshots) - 1
         logger.debug(f"File {media_file.name} added")
         self.sig_global_snapshot_created.emit(media_file)
@@ -83,34 +415,85 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
     def get_global_snapshot_index(self) -> int:
         return self._global_snapshots_index
 
+    def get_global_snapshot_names(self, first_index: int, last_index: int) -> list[str]:
+        """
+        Get names of the files of the global snapshots after `first_index` up to `last_index`,
+        e.g. of the snapshots undone or redone by `update_global_snapshot_index`
+        """
+        start, end = sorted((first_index, last_index))
+        end = min(end, len(self._global_snapshots) - 1)
+        return list(dict.fromkeys(self._global_snapshots[i].name for i in range(start + 1, end + 1)))
+
+    def _restore_inner_versions(self, previous_index: int, index: int) -> None:
+        """
+        Make the versions of the files current as they were at the global snapshot `index`
+        """
+        if index < previous_index:
+            # The version before the first undone one
+            indexes = range(min(previous_index, len(self._global_snapshots) - 1), index, -1)
+            shift = -1
+        else:
+            # The last redone version
+            indexes = range(previous_index + 1, index + 1)
+            shift = 0
+
+        for global_index in indexes:
+            version = self._global_snapshot_versions[global_index]
+            name = self._global_snapshots[global_index].name
+            if version is None or name not in self._inner_snapshots:
+                continue
+
+            self._inner_snapshot_indexes[name] = max(0, min(version + shift, len(self._inner_snapshots[name]) - 1))
+
     def update_global_snapshot_index(self, shift: int) -> tuple[MediaFile, bool]:
         """
-        Update global_snapshot_index by shifting it
+        Update global_snapshot_index by shifting it. Snapshots of one `batch` are shifted at once,
+        the index points to the last snapshot of the group. Files of the undone or redone snapshots
+        get their versions back, see `get_global_snapshot_names`.
+        Index -1 means that all snapshots are undone, the files have the versions they had before them
+
+        Returns `None` and `True` if there are no global snapshots
         """
         snapshots = self._global_snapshots
-        global_index = self._global_snapshots_index + shift
-        if global_index < 0:
-            global_index = 0
-        elif global_index > len(snapshots) - 1:
-            global_index = len(snapshots) - 1
+        if not snapshots:
+            return None, True
+
+        previous_index = global_index = max(-1, min(self._global_snapshots_index, len(snapshots) - 1))
+        for _ in range(abs(shift)):
+            if shift < 0 and global_index >= 0:
+                global_index = self._get_global_snapshot_group_bounds(global_index)[0] - 1
+            elif shift > 0 and global_index < len(snapshots) - 1:
+                global_index = self._get_global_snapshot_group_bounds(global_index + 1)[1]
 
         is_array_end = False
-        if global_index <= 0:
+        if global_index < 0:
             is_array_end = True
         elif global_index >= len(snapshots) - 1:
             is_array_end = True
 
         self._global_snapshots_index = global_index
+        self._restore_inner_versions(previous_index, global_index)
+        self._write_journal("global_snapshot_index", index=global_index)
+
+        if global_index < 0:
+            # The version of the file of the first undone snapshot
+            return self.get(snapshots[0].name) or snapshots[0], is_array_end
 
         return snapshots[global_index], is_array_end
 
     def remove_global_snapshot(self, index: int):
+        self._write_journal("remove_global_snapshot", index=index)
         del self._global_snapshots[index]
+        del self._global_snapshot_groups[index]
+        del self._global_snapshot_versions[index]
         self.sig_global_snapshot_deleted.emit(index)
 
     def restore_global_snapshots(self) -> None:
-        self._global_snapshots = []
-        self._global_snapshots_index = 0
+        self._write_journal("restore_global_snapshots")
+        self._global_snapshots.clear()
+        self._global_snapshot_groups = []
+        self._global_snapshot_versions = []
+        self._global_snapshots_index = -1
         self.sig_global_snapshot_restored.emit()
 
     # Local snapshot
@@ -126,7 +509,7 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
 
     def add_local_snapshot(self, name: str, media_file: MediaFile) -> MediaFile:
         if name not in self._local_snapshots:
-            self._local_snapshots[name] = []
+            self._local_snapshots[name] = MediaFileHistory(budget=self._budget)
 
         self._local_snapshots[name].append(media_file)
         self._local_snapshots_index[name] = len(self._local_snapshots[name]) - 1
@@ -134,6 +517,17 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
         logger.debug(f"Local snapshot {media_file.name} added")
         return media_file
 
+    def add_local_change(self, name: str, field_path: str, value: Any) -> MediaFile:
+        """
+        Add local snapshot with the changed field of the last local snapshot.
+        Only the changed field is stored, other fields are shared with the previous snapshot
+        """
+        media_file = self._local_snapshots[name].append_change(field_path, value)
+        self._local_snapshots_index[name] = len(self._local_snapshots[name]) - 1
+
+        logger.debug(f"Local snapshot {media_file.name}:{field_path} added")
+        return media_file
+
     def update_local_snapshot_index(self, name: str, shift: int) -> tuple[MediaFile, bool]:
         snapshots = self._local_snapshots[name]
         local_index = self._local_snapshots_index[name] + shift
@@ -161,10 +555,15 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
 
     def restore_local_snapshots(self, name: str = None) -> None:
         if name is None:
+            for snapshots in self._local_snapshots.values():
+                snapshots.clear()
             self._local_snapshots = {}
             self._local_snapshots_index = {}
         else:
-            self._local_snapshots[name] = []
+            if name in self._local_snapshots:
+                self._local_snapshots[name].clear()
+            else:
+                self._local_snapshots[name] = MediaFileHistory(budget=self._budget)
             self._local_snapshots_index[name] = 0
 
     # Sync methods
@@ -176,26 +575,40 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
     def sync_local_to_global(self, media_file_name: str) -> None:
         local_index = self._local_snapshots_index[media_file_name]
         local_snapshot = self._local_snapshots[media_file_name][local_index]
-        self._global_snapshots.append(local_snapshot)
-        if self._global_snapshots_index > 0:
-            self._global_snapshots_index += 1
+        self._write_journal("append_global_snapshot", media_file=dump_media_file(local_snapshot))
+        self._append_global_snapshot(local_snapshot)
 
         self.sig_global_snapshot_modified.emit(local_snapshot)
         logger.debug("Local synced with global")
 
+    def _append_global_snapshot(self, media_file: MediaFile) -> None:
+        self._drop_redo_snapshots()
+        self._global_snapshots.append(media_file)
+        self._add_global_snapshot_group()
+        self._global_snapshots_index = len(self._global_snapshots) - 1
+
     def sync_global_to_inner(self) -> None:
-        if not self._global_snapshots:
+        """
+        Add the current global snapshot as a new version of its file, so undo restores the previous version.
+        Nothing is added if the snapshot is already a version of the file
+        """
+        global_index = self._global_snapshots_index
+        if not 0 <= global_index < len(self._global_snapshots):
             logger.debug(f"{len(self._global_snapshots)=}")
             return
 
-        global_index = self._global_snapshots_index
         global_snapshot = self._global_snapshots[global_index]
+        snapshots = self._inner_snapshots.get(global_snapshot.name)
+        if snapshots is None or self._global_snapshot_versions[global_index] is not None:
+            return
 
-        inner_index = self._inner_snapshots_keys.index(global_snapshot.name)
-        self._inner_snapshots[inner_index].append(global_snapshot)
-        self._inner_snapshot_indexes[global_snapshot.name] = len(self._inner_snapshots[inner_index]) - 1
+        self._write_journal("sync_global_to_inner")
+        del snapshots[self._inner_snapshot_indexes[global_snapshot.name] + 1:]
+        snapshots.append(global_snapshot)
+        self._inner_snapshot_indexes[global_snapshot.name] = len(snapshots) - 1
+        self._global_snapshot_versions[global_index] = len(snapshots) - 1
 
-        self.sig_snapshot_modified.emit(global_snapshot)
+        self._emit_snapshot_modified(global_snapshot)
         logger.debug("Global synced with inner")
 
     # Snapshot versions
@@ -204,10 +617,11 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
         """
         Add new record into registry
         """
-        if media_file.name not in self._inner_snapshots_keys:
-            self._inner_snapshots.append([media_file])
+        if media_file.name not in self._inner_snapshots:
+            self._write_journal("add", media_file=dump_media_file(media_file))
+            self._inner_snapshots[media_file.name] = SnapshotList(self._budget, [media_file])
             self._inner_snapshot_indexes[media_file.name] = 0
-            self._inner_snapshots_keys.append(media_file.name)
+            self._inner_snapshots_rows.add(media_file.name)
         else:
             raise PieError(f"File {media_file.name} is already exists")
 
@@ -216,13 +630,11 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
 
     def get(self, name: str, version: int = None) -> Union[list[MediaFile], MediaFile]:
         logger.debug(f"Snapshot {name}:{version}")
-        logger.debug(self._inner_snapshots_keys)
-        if name not in self._inner_snapshots_keys:
+        snapshots = self._inner_snapshots.get(name)
+        if snapshots is None:
             return
             # raise PieException(f"File with \"{name}\" was not found")
 
-        index = self._inner_snapshots_keys.index(name)
-        snapshots = self._inner_snapshots[index]
         if version:
             return snapshots[version]
         else:
@@ -230,54 +642,83 @@ class SnapshotRegistryClass(QObject, BaseRegistry):
             return snapshots[cur_index]
 
     def update(self, name: str, new_media_file: MediaFile, version: int = None) -> None:
-        logger.debug(f"Snapshot {name} was updated to {new_media_file}:{version}")
-        if name not in self._inner_snapshots_keys:
+        """
+        Replace the version or add a new current version of the file.
+        New version is also added to global snapshots, so it can be undone.
+        New versions of one `batch` are undone at once
+        """
+        logger.debug(f"Snapshot {name} was updated:{version}")
+        snapshots = self._inner_snapshots.get(name)
+        if snapshots is None:
             return
             # raise PieException(f"File with \"{name}\" was not found")
 
-        index = self._inner_snapshots_keys.index(name)
-        snapshots = self._inner_snapshots[index]
+        if isinstance(new_media_file, MediaFile):
+            self._write_journal("update", name=name, version=version, media_file=dump_media_file(new_media_file))
+
         if version:
             snapshots[version] = new_media_file
         else:
+            # New change after undo replaces the undone ones
+            self._drop_redo_snapshots()
             snapshots.append(new_media_file)
+            self._inner_snapshot_indexes[name] = len(snapshots) - 1
+            self._global_snapshots.append(new_media_file)
+            self._add_global_snapshot_group(len(snapshots) - 1)
+            self._global_snapshots_index = len(self._global_snapshots) - 1
 
-        self.sig_snapshot_modified.emit(new_media_file)
+        self._emit_snapshot_modified(new_media_file)
 
     def remove(self, name: str, version: int = None) -> None:
         logger.debug(f"Snapshot {name}:{version} was removed")
-        if name not in self._inner_snapshots_keys:
+        snapshots = self._inner_snapshots.get(name)
+        if snapshots is None:
             return
             # raise PieException(f"File with \"{name}\" was not found")
 
-        index = self._inner_snapshots_keys.index(name)
-        snapshots = self._inner_snapshots[index]
+        self._write_journal("remove", name=name, version=version)
         if version:
-            del snapshots[name][version:Index.End]
+            del snapshots[version:Index.End]
         else:
-            del self._inner_snapshots[index]
-            del self._inner_snapshots_keys[index]
+            self._inner_snapshots.pop(name).clear()
+            self._inner_snapshot_indexes.pop(name, None)
+            self._inner_snapshots_rows.remove(name)
 
-    def contains(self, name: MediaFile) -> bool:
-        return name in self._inner_snapshots_keys
+    def contains(self, name: str) -> bool:
+        return name in self._inner_snapshots
 
     def values(self, as_path: bool = False) -> list[Any]:
-        return [i[-1].path if as_path else i[-1] for i in self._inner_snapshots]
+        """
+        Get the current versions of all files, see `get`
+        """
+        media_files = [i[self._inner_snapshot_indexes[n]] for n, i in self._inner_snapshots.items()]
+        return [i.path for i in media_files] if as_path else media_files
 
     def count(self) -> int:
         return len(self._inner_snapshots)
 
     def index(self, name: str) -> int:
-        return list(self._inner_snapshots_keys).index(name)
+        """
+        Get row of the file in insertion order
+        """
+        if name not in self._inner_snapshots:
+            raise ValueError(f"{name} is not in registry")
+
+        return self._inner_snapshots_rows.index(name)
 
     def restore(self) -> None:
-        self._inner_snapshots = []
-        self._inner_snapshots_keys = []
+        self._inner_snapshots = {}
+        self._inner_snapshots_rows.clear()
         self._inner_snapshot_indexes = {}
-        self._global_snapshots = []
-        self._global_snapshots_index = 0
+        self._global_snapshots = SnapshotList(self._budget)
+        self._global_snapshots_index = -1
+        self._global_snapshot_groups = []
+        self._global_snapshot_versions = []
         self._local_snapshots = {}
         self._local_snapshots_index = {}
+        self._budget.clear()
+        if self._journal is not None:
+            self._journal.clear()
         self.sig_snapshot_restored.emit()
         self.sig_global_snapshot_restored.emit()
         logger.debug("Snapshots restored")
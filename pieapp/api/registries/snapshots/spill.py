@@ -0,0 +1,296 @@
+"""
+Memory-budgeted snapshot lists
+
+The oldest snapshots beyond the budget are moved into an on-disk store
+and loaded back on access, so undo history is unlimited while resident memory is bounded
+"""
+import os
+import sys
+import pickle
+import sqlite3
+import dataclasses as dt
+from pathlib import Path
+from collections import deque
+from typing import Any, Iterable, Iterator, Optional, Union
+
+
+class SnapshotSpillStore:
+    """
+    SQLite store of the evicted snapshots. Snapshots are pickled, the store lives for one session
+    """
+
+    def __init__(self, file_path: Union[str, os.PathLike]) -> None:
+        self._file_path = Path(file_path)
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self._file_path, check_same_thread=False)
+        self._connection.executescript("""
+            DROP TABLE IF EXISTS snapshots;
+            CREATE TABLE snapshots (
+                id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL
+            );
+        """)
+
+    def put(self, snapshot: Any) -> int:
+        cursor = self._connection.execute(
+            "INSERT INTO snapshots (data) VALUES (?)",
+            (pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL),)
+        )
+        return cursor.lastrowid
+
+    def get(self, key: int) -> Any:
+        row = self._connection.execute("SELECT data FROM snapshots WHERE id = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+
+        return pickle.loads(row[0])
+
+    def remove(self, keys: Iterable[int]) -> None:
+        self._connection.executemany("DELETE FROM snapshots WHERE id = ?", [(i,) for i in keys])
+
+    def count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def clear(self) -> None:
+        self._connection.execute("DELETE FROM snapshots")
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def get_snapshot_size(value: Any, previous: Any = None) -> int:
+    """
+    Estimate memory size of the snapshot in bytes.
+    Objects shared with the previous snapshot aren't counted, see `replace_media_file`
+    """
+    if value is None or value is previous:
+        return 0
+
+    size = sys.getsizeof(value)
+    if dt.is_dataclass(value) and not isinstance(value, type):
+        if type(previous) is not type(value):
+            previous = None
+        for field in dt.fields(value):
+            size += get_snapshot_size(getattr(value, field.name), getattr(previous, field.name, None))
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(get_snapshot_size(i) for i in value)
+    elif isinstance(value, dict):
+        size += sum(get_snapshot_size(k) + get_snapshot_size(v) for k, v in value.items())
+
+    return size
+
+
+def _get_shared(value: Any, neighbour: Any) -> Any:
+    if neighbour is None or value is neighbour or type(value) is not type(neighbour):
+        return value
+
+    if value == neighbour:
+        return neighbour
+
+    share_unchanged(value, neighbour)
+    return value
+
+
+def share_unchanged(value: Any, neighbour: Any) -> None:
+    """
+    Replace fields of the snapshot loaded from the store with the equal fields of the neighbour snapshot,
+    so they are shared again as they were before eviction. Frozen models are shared as a whole only
+    """
+    if (
+        not dt.is_dataclass(value)
+        or isinstance(value, type)
+        or type(value) is not type(neighbour)
+        or type(value).__dataclass_params__.frozen
+    ):
+        return
+
+    for field in dt.fields(value):
+        field_value = getattr(value, field.name)
+        shared_value = _get_shared(field_value, getattr(neighbour, field.name))
+        if shared_value is not field_value:
+            setattr(value, field.name, shared_value)
+
+
+class _Slot:
+    __slots__ = ("owner", "value", "key", "size", "is_tracked")
+
+    def __init__(self, owner: "SnapshotList", value: Any) -> None:
+        self.owner = owner
+        self.value = value
+        # Key in `SnapshotSpillStore` of the evicted value
+        self.key: Optional[int] = None
+        # Estimated size of the resident value in bytes, see `get_snapshot_size`
+        self.size = 0
+        # Slot is in the eviction queue of `SnapshotMemoryBudget`
+        self.is_tracked = False
+
+
+class SnapshotMemoryBudget:
+    """
+    Estimated size in bytes of the snapshots kept in memory by all `SnapshotList` instances.
+    The last snapshot of every list is always kept in memory and isn't counted.
+    Without `store` nothing is evicted
+    """
+
+    def __init__(self, max_resident_size: int = 64 * 1024 * 1024, store: SnapshotSpillStore = None) -> None:
+        self._max_resident_size = max_resident_size
+        self._store = store
+        # Tracked slots from the oldest to the newest
+        self._slots: deque[_Slot] = deque()
+        self._resident_size = 0
+        # Number of removed slots left in the queue. The queue is compacted when they are the majority
+        self._dropped_count = 0
+
+    @property
+    def store(self) -> Optional[SnapshotSpillStore]:
+        return self._store
+
+    @property
+    def resident_size(self) -> int:
+        return self._resident_size
+
+    def configure(self, max_resident_size: int, store: SnapshotSpillStore = None) -> None:
+        self._max_resident_size = max_resident_size
+        self._store = store
+        self._evict()
+
+    def track(self, slot: _Slot, previous_value: Any = None) -> None:
+        """
+        Add the resident slot to the eviction queue
+
+        Args:
+            slot (_Slot): slot of the snapshot
+            previous_value (Any): previous snapshot of the list. Objects shared with it aren't counted
+        """
+        if self._store is None or slot.is_tracked or slot.value is None:
+            return
+
+        slot.is_tracked = True
+        slot.size = get_snapshot_size(slot.value, previous_value)
+        self._slots.append(slot)
+        self._resident_size += slot.size
+        if self._resident_size > self._max_resident_size:
+            self._evict()
+
+    def _untrack(self, slot: _Slot) -> None:
+        slot.is_tracked = False
+        self._resident_size -= slot.size
+        slot.size = 0
+
+    def drop(self, slot: _Slot) -> None:
+        """
+        Forget the removed slot. Evicted value is removed from the store
+        """
+        if slot.is_tracked:
+            self._untrack(slot)
+            self._dropped_count += 1
+            if self._dropped_count > len(self._slots) // 2:
+                self._slots = deque(i for i in self._slots if i.is_tracked)
+                self._dropped_count = 0
+
+        slot.value = None
+        if slot.key is not None and self._store is not None:
+            self._store.remove([slot.key])
+            slot.key = None
+
+    def _evict(self) -> None:
+        if self._store is None:
+            return
+
+        while self._slots and self._resident_size > self._max_resident_size:
+            slot = self._slots.popleft()
+            if not slot.is_tracked:
+                self._dropped_count -= 1
+                continue
+
+            self._untrack(slot)
+            if not slot.owner.is_last(slot):
+                slot.key = self._store.put(slot.value)
+                slot.value = None
+
+    def clear(self) -> None:
+        for slot in self._slots:
+            slot.is_tracked = False
+            slot.size = 0
+        self._slots.clear()
+        self._resident_size = 0
+        self._dropped_count = 0
+        if self._store is not None:
+            self._store.clear()
+
+
+class SnapshotList:
+    """
+    List of snapshots which are evicted to `SnapshotSpillStore` by `SnapshotMemoryBudget`
+    and loaded back on access
+    """
+
+    def __init__(self, budget: SnapshotMemoryBudget, values: Iterable[Any] = ()) -> None:
+        self._budget = budget
+        self._slots: list[_Slot] = []
+        for value in values:
+            self.append(value)
+
+    def is_last(self, slot: _Slot) -> bool:
+        return bool(self._slots) and self._slots[-1] is slot
+
+    def _get_resident_value(self, index: int) -> Any:
+        if 0 <= index < len(self._slots):
+            return self._slots[index].value
+
+    def _load(self, index: int) -> Any:
+        slot = self._slots[index]
+        if slot.value is None and slot.key is not None:
+            value = self._budget.store.get(slot.key)
+            self._budget.store.remove([slot.key])
+            slot.key = None
+            # Unpickled models are copies, share them with the neighbours again
+            previous_value = self._get_resident_value(index - 1)
+            share_unchanged(value, previous_value)
+            share_unchanged(value, self._get_resident_value(index + 1))
+            slot.value = value
+            if not self.is_last(slot):
+                # The loaded value can be evicted again at once, return it anyway
+                self._budget.track(slot, previous_value)
+            return value
+
+        return slot.value
+
+    def append(self, value: Any) -> None:
+        self._slots.append(_Slot(self, value))
+        # The previous snapshot can be evicted from now on
+        if len(self._slots) > 1:
+            self._budget.track(self._slots[-2], self._get_resident_value(len(self._slots) - 3))
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self._load(i) for i in range(len(self._slots))[index]]
+
+        return self._load(range(len(self._slots))[index])
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        index = range(len(self._slots))[index]
+        self._budget.drop(self._slots[index])
+        slot = _Slot(self, value)
+        self._slots[index] = slot
+        if not self.is_last(slot):
+            self._budget.track(slot, self._get_resident_value(index - 1))
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        slots = self._slots[index] if isinstance(index, slice) else [self._slots[index]]
+        for slot in slots:
+            self._budget.drop(slot)
+        del self._slots[index]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self._slots)):
+            yield self._load(index)
+
+    def __bool__(self) -> bool:
+        return bool(self._slots)
+
+    def clear(self) -> None:
+        del self[:]
@@ -1,5 +1,6 @@
 import os
 import json
+import errno
 import shutil
 import uuid
 
@@ -100,6 +101,127 @@ def delete_files(files: list[os.PathLike]) -> None:
 
 # Files and directories methods
 
+# Linux `FICLONE` ioctl request: share the source extents with the destination file
+FICLONE: int = 0x40049409
+
+# Buffer size of the file copy. Large buffers keep network and USB drives busy
+COPY_BUFFER_SIZE: int = 8 * 1024 * 1024
+
+
+class FileCloneMethod:
+    Reflink: str = "reflink"
+    Hardlink: str = "hardlink"
+    Copy: str = "copy"
+
+
+def _reflink_file(source: Path, destination: Path) -> bool:
+    """
+    Clone file with the copy-on-write reflink. Supported by Btrfs, XFS and other CoW filesystems on Linux
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    try:
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+    except OSError:
+        destination.unlink(missing_ok=True)
+        return False
+
+    shutil.copystat(source, destination)
+    return True
+
+
+def _hardlink_file(source: Path, destination: Path) -> bool:
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        # Different devices, filesystems without links, links limit, etc.
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+            raise e
+        return False
+    except NotImplementedError:
+        return False
+
+    return True
+
+
+def copy_file(
+    source: Union[str, os.PathLike],
+    destination: Union[str, os.PathLike],
+    buffer_size: int = COPY_BUFFER_SIZE,
+    on_progress: callable = None
+) -> None:
+    """
+    Copy file data and metadata with large buffers
+
+    Args:
+        source (str|os.PathLike): source file path
+        destination (str|os.PathLike): destination file path
+        buffer_size (int): read and write buffer size in bytes
+        on_progress (callable|None): called with the number of bytes copied since the last call
+    """
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(source, "rb", buffering=0) as source_file, open(destination, "wb", buffering=0) as destination_file:
+        while size := source_file.readinto(buffer):
+            written = 0
+            while written < size:
+                written += destination_file.write(view[written:size])
+            if on_progress:
+                on_progress(size)
+
+    shutil.copystat(source, destination)
+
+
+def clone_file(
+    source: Union[str, os.PathLike],
+    destination: Union[str, os.PathLike],
+    allow_hardlink: bool = True,
+    buffer_size: int = COPY_BUFFER_SIZE,
+    on_progress: callable = None
+) -> str:
+    """
+    Clone file without duplicating its data if possible: reflink, then hardlink, then buffered copy.
+    Existing destination file is replaced
+
+    Hardlinked file shares the data with the source,
+    so it must be replaced (e.g. written to a new file and renamed), but never modified in place
+
+    Returns `FileCloneMethod` value
+
+    Args:
+        source (str|os.PathLike): source file path
+        destination (str|os.PathLike): destination file path
+        allow_hardlink (bool): allow hardlinks. Disable it if the destination file will be modified in place
+        buffer_size (int): buffer size of the copy fallback in bytes
+        on_progress (callable|None): called with the number of bytes copied since the last call.
+            Reflinked and hardlinked files are reported at once
+    """
+    source = Path(source)
+    destination = Path(destination)
+    if destination.exists():
+        if allow_hardlink and destination.samefile(source):
+            if on_progress:
+                on_progress(source.stat().st_size)
+            return FileCloneMethod.Hardlink
+        destination.unlink()
+
+    if _reflink_file(source, destination):
+        if on_progress:
+            on_progress(source.stat().st_size)
+        return FileCloneMethod.Reflink
+
+    if allow_hardlink and _hardlink_file(source, destination):
+        if on_progress:
+            on_progress(source.stat().st_size)
+        return FileCloneMethod.Hardlink
+
+    copy_file(source, destination, buffer_size, on_progress)
+    return FileCloneMethod.Copy
+
 
 def create_empty_file(file_path: os.PathLike):
     """
@@ -0,0 +1,262 @@
+"""
+Headless command line interface
+
+Runs the converter pipeline without `QApplication`, main window, themes and locales
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Any
+
+import ffmpeg
+
+from pieapp.api.globals import Global
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ConverterJobStatus
+from pieapp.api.converter.models import ConverterResult
+from pieapp.api.converter.models import ProbeProfile
+from pieapp.api.converter.engine import ConverterEngine
+from pieapp.api.converter.engine import get_max_processes
+from pieapp.api.converter.probe import probe_media_file
+from pieapp.api.converter.processes import get_process_loop
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pie-audio", description="pie-audio headless commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert audio files")
+    convert_parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="input files or glob patterns, e.g. \"music/**/*.wav\""
+    )
+    convert_parser.add_argument("-o", "--output-dir", type=Path, required=True, help="output directory")
+    convert_parser.add_argument(
+        "-f", "--format",
+        required=True,
+        help="output file format. Several comma-separated formats are written at once, e.g. \"mp3,ogg\""
+    )
+    convert_parser.add_argument(
+        "-j", "--concurrency",
+        type=int,
+        default=None,
+        help="number of ffmpeg processes to run at once. Defaults to the number of CPU cores"
+    )
+    convert_parser.add_argument("-r", "--report", type=Path, default=None, help="path to the JSON report")
+    convert_parser.add_argument("--ffmpeg", type=Path, default=Path("ffmpeg"), help="ffmpeg binary path")
+    convert_parser.add_argument("--ffprobe", type=Path, default=Path("ffprobe"), help="ffprobe binary path")
+    convert_parser.add_argument(
+        "--segment-threshold",
+        type=float,
+        default=None,
+        help="encode WAV and FLAC outputs of files longer than this number of seconds in parallel segments"
+    )
+    return parser
+
+
+def find_input_files(patterns: list[str]) -> list[Path]:
+    """
+    Expand input paths and glob patterns. Directories are scanned for audio files
+    """
+    files: dict[Path, None] = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+            path = Path(path)
+            if path.is_dir():
+                for file in sorted(path.rglob("*")):
+                    if file.is_file() and file.suffix.replace(".", "").lower() in Global.AUDIO_EXTENSIONS:
+                        files[file.resolve()] = None
+            elif path.is_file():
+                files[path.resolve()] = None
+
+    return list(files)
+
+
+def get_output_paths(
+    input_files: list[Path],
+    output_directory: Path,
+    file_format: str
+) -> tuple[dict[Path, Path], dict[Path, str]]:
+    """
+    Get output paths which keep the input paths relative to their common directory,
+    so files with the same name from different folders don't overwrite each other
+
+    Returns <input file>: <output path> and errors of the input files
+    which would overwrite the output of another input file, e.g. `01.wav` and `01.flac`
+    """
+    try:
+        root = Path(os.path.commonpath([i.parent for i in input_files]))
+        relative_paths = [i.relative_to(root) for i in input_files]
+    except ValueError:
+        # Files on different drives are kept relative to their drives
+        relative_paths = [Path(*i.parts[1:]) for i in input_files]
+
+    output_paths: dict[Path, Path] = {}
+    errors: dict[Path, str] = {}
+    # <output path>: <input file>
+    used_paths: dict[Path, Path] = {}
+    for input_file, relative_path in zip(input_files, relative_paths):
+        output_path = output_directory / relative_path.with_suffix(f".{file_format}")
+        if output_path in used_paths:
+            errors[input_file] = f"Output {output_path} is already used by {used_paths[output_path]}"
+            continue
+
+        used_paths[output_path] = input_file
+        output_paths[input_file] = output_path
+
+    return output_paths, errors
+
+
+async def probe_files(
+    media_files: list[MediaFile],
+    ffprobe_command: Path,
+    max_processes: int
+) -> tuple[list[MediaFile], dict[str, str]]:
+    """
+    Probe files on the process loop. Tags are not read, ffmpeg copies them to outputs as is
+
+    Returns probed `MediaFile` models and errors of files which can't be probed: <media file name>: <error>
+    """
+    semaphore = asyncio.Semaphore(max_processes)
+
+    async def probe(media_file: MediaFile) -> MediaFile:
+        async with semaphore:
+            return await probe_media_file(media_file, ffprobe_command, ProbeProfile.Summary)
+
+    results = await asyncio.gather(*[probe(i) for i in media_files], return_exceptions=True)
+
+    probed_files = []
+    errors = {}
+    for media_file, result in zip(media_files, results):
+        if isinstance(result, ffmpeg.Error):
+            errors[media_file.name] = result.stderr.decode("utf-8", errors="replace").strip() if result.stderr else str(result)
+        elif isinstance(result, Exception):
+            errors[media_file.name] = str(result)
+        else:
+            probed_files.append(result)
+
+    return probed_files, errors
+
+
+def print_job(job: ConverterJob) -> None:
+    message = f"[{job.status}] {job.media_file.path}"
+    if job.status == ConverterJobStatus.Skipped:
+        message = f"{message} -> {job.media_file.output_path}"
+    if job.status in (ConverterJobStatus.Failed, ConverterJobStatus.Skipped) and job.error:
+        message = f"{message}: {job.error.splitlines()[-1]}"
+
+    print(message, flush=True)
+
+    # Outputs of the multi-target job which weren't written
+    for target in job.targets:
+        if target.status == ConverterJobStatus.Skipped:
+            print(f"[{target.status}] {job.media_file.path} -> {target.output_path}: {target.error}", flush=True)
+
+
+def get_skipped_count(result: ConverterResult) -> int:
+    """
+    Get number of jobs and outputs of the multi-target jobs which weren't written, e.g. of unsupported file format
+    """
+    skipped_targets = [
+        t for j in result.jobs if j.status != ConverterJobStatus.Skipped
+        for t in j.targets if t.status == ConverterJobStatus.Skipped
+    ]
+    return len(result.skipped) + len(skipped_targets)
+
+
+def convert(arguments: argparse.Namespace) -> int:
+    """
+    `convert` command
+
+    Returns exit code: `0` if all outputs were written, `1` otherwise
+    """
+    started_at = time.perf_counter()
+    max_processes = get_max_processes(arguments.concurrency)
+    output_formats = [i.strip().lower().lstrip(".") for i in arguments.format.split(",") if i.strip()]
+
+    input_files = find_input_files(arguments.inputs)
+    if not input_files:
+        print("No input files found", file=sys.stderr)
+        return 1
+
+    output_directory: Path = arguments.output_dir
+    output_paths, path_errors = get_output_paths(input_files, output_directory, output_formats[0])
+    for input_file, error in path_errors.items():
+        print(f"[{ConverterJobStatus.Failed}] {input_file}: {error}", flush=True)
+
+    media_files = []
+    for input_file, output_path in output_paths.items():
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        media_files.append(MediaFile(
+            uuid=str(uuid.uuid4()),
+            name=output_path.relative_to(output_directory).with_suffix(input_file.suffix).as_posix(),
+            path=input_file,
+            output_path=output_path,
+            is_origin=True
+        ))
+
+    media_files, probe_errors = get_process_loop().run(
+        probe_files(media_files, arguments.ffprobe, max_processes)
+    )
+    for name, error in probe_errors.items():
+        print(f"[{ConverterJobStatus.Failed}] {name}: {error.splitlines()[-1] if error else ''}", flush=True)
+
+    engine = ConverterEngine(
+        ffmpeg_command=arguments.ffmpeg,
+        max_processes=max_processes,
+        segment_threshold=arguments.segment_threshold
+    )
+    try:
+        result = engine.run(
+            media_files,
+            on_completed_element=print_job,
+            output_formats=output_formats if len(output_formats) > 1 else None
+        )
+    except KeyboardInterrupt:
+        engine.cancel()
+        raise
+
+    wall_time = time.perf_counter() - started_at
+    skipped_count = get_skipped_count(result)
+    print(
+        f"Converted {len(result.succeeded)}, failed {len(result.failed) + len(probe_errors) + len(path_errors)}, "
+        f"skipped {skipped_count}, cancelled {len(result.cancelled)} in {wall_time:.2f}s",
+        flush=True
+    )
+
+    if arguments.report:
+        report: dict[str, Any] = result.as_dict()
+        report["wall_time"] = wall_time
+        report["probe_errors"] = probe_errors
+        report["path_errors"] = {str(k): v for k, v in path_errors.items()}
+        arguments.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(arguments.report, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=4)
+
+    # Skipped outputs are failures, nothing is written for them
+    if path_errors or probe_errors or result.failed or result.cancelled or skipped_count:
+        return 1
+
+    return 0
+
+
+def main(argv: list[str] = None) -> int:
+    """
+    Command line entrypoint
+    """
+    # Load globals from the application directory
+    Global.import_module("pieapp.app.globals")
+
+    arguments = get_parser().parse_args(argv)
+    if arguments.command == "convert":
+        return convert(arguments)
+
+    return 2
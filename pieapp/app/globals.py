@@ -51,6 +51,39 @@ MEDIA_FILES_DIR_NAME = "media"
 # Output folder name
 OUTPUT_DIR_NAME = "output"
 
+# Journals folder name
+JOURNALS_DIR_NAME = "journals"
+
+# Converter jobs journal file name
+CONVERTER_JOURNAL_FILE_NAME = "converter.jsonl"
+
+# Snapshot operations journal file name
+SNAPSHOTS_JOURNAL_FILE_NAME = "snapshots.jsonl"
+
+# Caches folder name
+CACHES_DIR_NAME = "caches"
+
+# Converted outputs cache file name
+CONVERTER_CACHE_FILE_NAME = "converter.json"
+
+# Probe results cache file name
+PROBE_CACHE_FILE_NAME = "probe.sqlite3"
+
+# Snapshots moved out of memory, see `SnapshotRegistry.set_history_limit`
+SNAPSHOTS_SPILL_FILE_NAME = "snapshots.sqlite3"
+
+# Album covers cache directory name
+COVERS_CACHE_DIR_NAME = "covers"
+
+# Paths of the files imported by reference. Stored in the temp directory to restore them
+REFERENCES_FILE_NAME = "references.json"
+
+# Private working copies of the referenced files. Stored in the temp directory
+WORKING_COPIES_DIR_NAME = "working"
+
+# Content-addressed store of the copied files. Stored in the temp folder and shared by all opened files
+CONTENT_STORE_DIR_NAME = "store"
+
 # Default plugin icon theme
 DEFAULT_PLUGIN_ICON_NAME = "app"
 
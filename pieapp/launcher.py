@@ -0,0 +1,20 @@
+import sys
+
+
+# Commands which run without GUI
+HEADLESS_COMMANDS: tuple[str, ...] = ("convert",)
+
+
+def launch() -> None:
+    """
+    `pie-audio` entrypoint
+
+    Runs headless command if one is given, otherwise starts the application
+    """
+    if len(sys.argv) > 1 and sys.argv[1] in HEADLESS_COMMANDS:
+        # Don't import Qt widgets for headless commands
+        from pieapp.app.cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from pieapp.app.start import start_application
+    start_application()
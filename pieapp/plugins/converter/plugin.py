@@ -1,8 +1,8 @@
 import os.path
 import uuid
 import dataclasses
-from typing import Union
-from pathlib import Path
+from typing import Optional, Union
+from pathlib import Path, PurePosixPath
 
 from PySide6.QtCore import Qt
 from PySide6.QtCore import Slot
@@ -35,6 +35,9 @@ from pieapp.api.registries.snapshots.registry import SnapshotRegistry
 from pieapp.api.models.scopes import Scope
 from pieapp.api.models.layouts import Layout
 from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ImportMode
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ConverterResult
 
 from pieapp.api.models.indexes import Index
 from pieapp.api.models.menus import MainMenu
@@ -53,7 +56,23 @@ from pieapp.widgets.waitingspinner import create_wait_spinner
 from pieapp.api.converter.workers import ProbeWorker
 from pieapp.api.converter.workers import ConverterWorker
 from pieapp.api.converter.workers import CopyFilesWorker
+from pieapp.api.converter.workers import ScanFilesWorker
+from pieapp.api.converter.workers import WorkingCopyWorker
+from pieapp.api.converter.cache import ConverterCache
+from pieapp.api.converter.cache import ProbeCache
+from pieapp.api.converter.journal import ConverterJournal
+from pieapp.api.converter.imports import read_references
+from pieapp.api.converter.imports import get_device_concurrency
+from pieapp.api.converter.imports import get_moved_paths
+from pieapp.api.converter.imports import get_relative_name
+from pieapp.api.converter.imports import get_scan_root
+from pieapp.api.converter.imports import get_unique_name
+from pieapp.api.converter.imports import is_written_in_place
+from pieapp.api.converter.imports import write_references
+from pieapp.api.converter.imports import remove_references
+from pieapp.api.converter.store import ContentStore
 from pieapp.api.converter.observers import FileSystemWatcher
+from pieapp.api.registries.snapshots.journal import SnapshotJournal
 
 from converter.models import ConverterThemeProperties
 from converter.confpage import ConverterConfigPage
@@ -87,6 +106,9 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
     # Emit on snapshot modified
     sig_snapshot_modified = Signal(MediaFile)
 
+    # Emit once on `SnapshotRegistry.batch` end with names of the modified snapshots
+    sig_snapshots_modified = Signal(list)
+
     # Emit on global snapshot restored
     sig_snapshot_restored = Signal()
 
@@ -102,6 +124,13 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         return translate("Converter")
 
     def on_before_main_window_show(self) -> None:
+        # Undo history is unlimited, the oldest snapshots beyond the limit are moved to disk
+        SnapshotRegistry.set_history_limit(
+            # Estimated size in bytes
+            self.get_app_config("workflow.snapshots_memory_size", Scope.User, 64 * 1024 * 1024),
+            Global.USER_ROOT / Global.CACHES_DIR_NAME / Global.SNAPSHOTS_SPILL_FILE_NAME
+        )
+        SnapshotRegistry.set_journal(self._snapshot_journal)
         self.connect_snapshot_signals()
         self.watcher = FileSystemWatcher(self)
         self.watcher.connect_signals(self)
@@ -152,32 +181,141 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
                 get_application().exit()
 
             elif message_box_reply == MessageBox.ButtonRole.YesRole:
-                selected_files = []
-                for file in Path(temp_directory).iterdir():
-                    if file.suffix.replace(".", "") in Global.AUDIO_EXTENSIONS:
-                        selected_files.append(file)
-                self._start_copy_files_worker(selected_files)
+                # Files are probed again only if the snapshot journal is empty
+                if not self._restore_snapshots():
+                    # Copied files are already in the content store. Working copies are not restored
+                    stored_files = self._content_store.get_referenced_files()
+                    self._content_store.release_all()
+                    # Every opened file holds one reference, like the imported ones
+                    for stored_file in stored_files:
+                        self._content_store.acquire(stored_file)
+                    self._add_media_files(stored_files)
+                    self._content_store.collect()
+
+                    referenced_files = [i for i in read_references(temp_directory) if i.exists()]
+                    if referenced_files:
+                        root = get_scan_root(referenced_files)
+                        self._add_media_files(
+                            referenced_files,
+                            is_reference=True,
+                            names=[get_relative_name(i, root) for i in referenced_files]
+                        )
 
             elif message_box_reply == MessageBox.ButtonRole.NoRole:
                 delete_directory(temp_directory)
                 delete_files(list(temp_directory.rglob("*.*")))
+                self._content_store.release_all()
+                self._content_store.collect()
+                self._snapshot_journal.clear()
+
+        else:
+            self._snapshot_journal.clear()
 
         self.save_app_config("workflow", Scope.User)
+        self._resume_converter_jobs()
+
+    def _restore_snapshots(self) -> bool:
+        """
+        Restore files with their versions and undo history from the snapshot journal without probing.
+        Files which don't exist anymore are removed
+
+        Returns `False` if the journal is empty
+        """
+        if SnapshotRegistry.replay_journal() == 0:
+            return False
+
+        for media_file in SnapshotRegistry.values():
+            if not media_file.path.exists():
+                SnapshotRegistry.remove(media_file.name)
+
+        media_files = SnapshotRegistry.values()
+        self._media_file_names = {i.path: i.name for i in media_files}
+        self._fill_content_list(media_files)
+        for folder in {i.path.parent for i in media_files if not self._content_store.contains(i.path)}:
+            self.watcher.start(str(folder))
+
+        if media_files:
+            self.get_tool_button(self.name, ToolBarItem.Convert).set_enabled(True)
+
+        return True
+
+    def _resume_converter_jobs(self) -> None:
+        """
+        Offer to resume converter jobs which weren't finished because of crash or restart
+        """
+        jobs = self._converter_journal.get_unfinished_jobs()
+        if not jobs:
+            self._converter_journal.clear()
+            return
+
+        message_box = MessageBox(
+            parent=self._parent,
+            window_title=translate("Resume conversion?"),
+            message_text=translate("%s files weren't converted last time. Resume conversion?", len(jobs)),
+            show_checkbox=False,
+            show_close_button=False
+        )
+        message_box.exec()
+        message_box_reply = message_box.button_role(message_box.clicked_button())
+        if message_box_reply == MessageBox.ButtonRole.YesRole:
+            self._start_converter_worker(jobs=jobs)
+        else:
+            self._converter_journal.clear()
 
     def on_main_window_close(self) -> None:
         self.save_app_config("workflow", Scope.User)
+        # Compact journal is replayed faster on the next start
+        SnapshotRegistry.compact_journal()
 
     def init(self) -> None:
         # Prepare workflow variables
         self._chunk_size = self.get_app_config("ffmpeg.chunk_size", Scope.User, 10)
+        # Number of ffmpeg processes to run at once. Defaults to the number of CPU cores
+        self._max_processes = self.get_app_config("ffmpeg.max_processes", Scope.User)
+        # Files longer than this number of seconds are encoded in parallel segments
+        self._segment_threshold = self.get_app_config("ffmpeg.segment_threshold", Scope.User, 1800)
         self._ffmpeg_command = Path(self.get_app_config("ffmpeg.ffmpeg", Scope.User, "ffmpeg"))
         self._ffprobe_command = Path(self.get_app_config("ffmpeg.ffprobe", Scope.User, "ffprobe"))
+        # Use opened files in place or copy them into the temp directory
+        self._import_mode = self.get_app_config("workflow.import_mode", Scope.User, ImportMode.Reference)
+        # Names of the opened files: <path>: <name>. File system events report paths only
+        self._media_file_names: dict[Path, str] = {}
+        # Probe queue shared by all opened files, see `_start_probe_worker`
+        self._probe_worker: Optional[ProbeWorker] = None
+        # On-disk journal of snapshots to restore files with their history after restart
+        self._snapshot_journal = SnapshotJournal(
+            Global.USER_ROOT / Global.JOURNALS_DIR_NAME / Global.SNAPSHOTS_JOURNAL_FILE_NAME
+        )
+        # Copied files are stored once by their content and shared by all opened files
+        self._content_store = ContentStore(
+            Global.USER_ROOT / Global.DEFAULT_TEMP_DIR_NAME / Global.CONTENT_STORE_DIR_NAME
+        )
 
         self._supported_formats = ""
         for audio_extension in Global.AUDIO_EXTENSIONS:
             self._supported_formats += f"*.{audio_extension};"
         self._supported_formats = f"{translate('Supported audio formats')} - ({self._supported_formats})"
 
+        # Running converter worker
+        self._converter_worker: Union[ConverterWorker, None] = None
+        # Files waiting for their working copies before the conversion, see `_start_working_copy_worker`
+        self._working_copy_media_files: Optional[list[MediaFile]] = None
+        # On-disk journal of converter jobs to resume them after crash or restart
+        self._converter_journal = ConverterJournal(
+            Global.USER_ROOT / Global.JOURNALS_DIR_NAME / Global.CONVERTER_JOURNAL_FILE_NAME
+        )
+        # Cache of converted outputs to skip files which are up to date
+        self._converter_cache = ConverterCache(
+            Global.USER_ROOT / Global.CACHES_DIR_NAME / Global.CONVERTER_CACHE_FILE_NAME,
+            use_content_hash=self.get_app_config("ffmpeg.use_content_hash", Scope.User, False)
+        )
+        # Cache of parsed probe results to skip ffprobe for known files
+        self._probe_cache = ProbeCache(
+            Global.USER_ROOT / Global.CACHES_DIR_NAME / Global.PROBE_CACHE_FILE_NAME,
+            use_content_hash=self.get_app_config("ffmpeg.use_content_hash", Scope.User, False),
+            max_entries=self.get_app_config("ffmpeg.probe_cache_size", Scope.User, 100_000)
+        )
+
         # Prepare widget
         self._converter_item_widgets: list[ConverterItem] = []
         self._quick_action_items: list[dict[str, QToolButton]] = []
@@ -188,6 +326,7 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
             change_callback=self._content_list_item_removed,
             remove_callback=self._content_list_item_removed
         )
+        self._content_list.drop_filter.sig_paths_dropped.connect(self.open_paths)
 
         # Setup search field
         self._search = ConverterSearch()
@@ -212,6 +351,11 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         self._text_label.set_text(translate("No files selected"))
         self._text_label.set_alignment(Qt.AlignmentFlag.AlignCenter)
 
+        # Files and directories can be dropped onto the placeholder too
+        for label in (self._pixmap_label, self._text_label):
+            label.set_accept_drops(True)
+            label.install_event_filter(self._content_list.drop_filter)
+
         # Setup placeholder
         self._set_placeholder()
 
@@ -222,6 +366,7 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         SnapshotRegistry.sig_snapshot_created.connect(self._on_snapshot_created)
         SnapshotRegistry.sig_snapshot_deleted.connect(self._on_snapshot_deleted)
         SnapshotRegistry.sig_snapshot_modified.connect(self._on_snapshot_modified)
+        SnapshotRegistry.sig_snapshots_modified.connect(self._on_snapshots_modified)
         SnapshotRegistry.sig_snapshot_restored.connect(self._on_snapshot_restored)
 
     # QuickAction public proxy methods
@@ -263,8 +408,10 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
             return
 
         self._clear_placeholder()
-        self._list_grid_layout.add_widget(self._search, 0, 0)
-        self._list_grid_layout.add_widget(self._content_list, 1, 0)
+        # List is filled by batches, so add it to the layout only once
+        if self._list_grid_layout.index_of(self._content_list) == -1:
+            self._list_grid_layout.add_widget(self._search, 0, 0)
+            self._list_grid_layout.add_widget(self._content_list, 1, 0)
 
         for index, media_file in enumerate(media_files):
             # TODO: Добавить встроенный элемент с краткой информацией по файлу
@@ -284,6 +431,14 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
                 callback=self._delete_tool_button_connect,
                 enabled=True
             )
+            widget.add_quick_action(
+                name="cancel",
+                text=translate("Cancel"),
+                icon=self.get_svg_icon(IconName.Close),
+                callback=self._cancel_tool_button_connect,
+                after="delete",
+                enabled=True
+            )
 
             widget_layout = QHBoxLayout()
             widget_layout.add_stretch()
@@ -331,8 +486,16 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         """
         Clear content list, remove it from the `list_grid_layout` and disable clear button
         """
-        delete_files(SnapshotRegistry.values(as_path=True))
+        # Referenced files are original files of the user, only copies in the temp directory are removed
+        delete_files([
+            i.path for i in SnapshotRegistry.values()
+            if not i.is_reference and not self._content_store.contains(i.path)
+        ])
+        remove_references(self.get_app_config("workflow.temp_directory", Scope.User))
+        self._content_store.release_all()
+        self._content_store.collect()
         SnapshotRegistry.restore()
+        self._media_file_names = {}
 
         self._converter_item_widgets = []
         self._content_list.clear()
@@ -342,7 +505,23 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
 
     def _delete_tool_button_connect(self, media_file_name: str) -> None:
         media_file: MediaFile = SnapshotRegistry.get(media_file_name)
-        delete_files([media_file.path])
+        if media_file.is_reference:
+            # Referenced original file is only removed from the list
+            remove_references(self.get_app_config("workflow.temp_directory", Scope.User), [media_file.path])
+        elif self._content_store.contains(media_file.path):
+            # Stored file can be shared, it is removed when it has no references
+            self._content_store.release(media_file.path)
+            self._content_store.collect()
+        else:
+            delete_files([media_file.path])
+
+        index = SnapshotRegistry.index(media_file.name)
+        SnapshotRegistry.remove(media_file.name)
+        self._content_list.take_item(index)
+
+    def _cancel_tool_button_connect(self, media_file_name: str) -> None:
+        if self._converter_worker is not None:
+            self._converter_worker.cancel(media_file_name)
 
     # ConverterSearch protected methods
 
@@ -381,29 +560,106 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         if not selected_files:
             return
 
+        self._get_temp_directory()
+        selected_files = list(map(Path, selected_files))
+        last_opened_directory = selected_files[0]
+        self.update_app_config("workflow.last_opened_directory", Scope.User, last_opened_directory, temp=True)
+        self._import_files(selected_files, get_scan_root(selected_files))
+
+    def open_folder(self) -> None:
+        last_opened_directory = self.get_app_config(
+            "workflow.last_opened_directory",
+            Scope.User,
+            os.path.expanduser("~")
+        )
+        selected_directory = QFileDialog.get_existing_directory(
+            caption=translate("Open folder"),
+            dir=str(last_opened_directory)
+        )
+        if not selected_directory:
+            return
+
+        self.update_app_config("workflow.last_opened_directory", Scope.User, selected_directory, temp=True)
+        self.open_paths([Path(selected_directory)])
+
+    @Slot(list)
+    def open_paths(self, paths: list[Path]) -> None:
+        """
+        Open files and directories, e.g. dropped onto the list. Directories are scanned recursively in background
+        """
+        self._get_temp_directory()
+        # Files are named relative to the scan root, so files with the same name from different folders don't clash
+        root = get_scan_root(paths)
+        self._start_scan_files_worker(paths, on_found=lambda files: self._import_files(files, root))
+
+    def _get_temp_directory(self) -> Path:
+        """
+        Get temp directory of the session. It is created by the first open and reused by the next ones
+        """
+        temp_directory = self.get_app_config("workflow.temp_directory", Scope.User)
+        if temp_directory is not None and Path(temp_directory).exists():
+            return Path(temp_directory)
+
         temp_directory = create_temp_directory(Global.USER_ROOT / Global.DEFAULT_TEMP_DIR_NAME)
         self.update_app_config(
             "workflow.temp_directory",
             Scope.User,
             str(temp_directory)
         )
+        return temp_directory
 
-        selected_files = list(map(Path, selected_files))
-        last_opened_directory = selected_files[0]
-        self.update_app_config("workflow.last_opened_directory", Scope.User, last_opened_directory, temp=True)
-        self._start_copy_files_worker(selected_files)
+    def _start_scan_files_worker(self, paths: list[Path], on_found: callable, recursive: bool = True) -> None:
+        """
+        Scan files and directories without blocking the GUI thread
+
+        Args:
+            paths (list[Path]): files and directories
+            on_found (callable): called with every batch of found audio files
+            recursive (bool): scan subdirectories
+        """
+        scan_files_worker = ScanFilesWorker(paths, recursive=recursive)
+        scan_files_worker.signals.found_batch.connect(on_found)
+        scan_files_worker.signals.completed.connect(self._scan_files_worker_finished)
+        scan_files_worker.signals.failed.connect(self._scan_files_worker_failed)
+
+        pool = QThreadPool.global_instance()
+        pool.start(scan_files_worker)
 
-    def _start_copy_files_worker(self, files: list[Path]) -> None:
+    def _import_files(self, files: list[Path], root: Optional[Path] = None) -> None:
+        """
+        Import files according to `workflow.import_mode`
+
+        Args:
+            files (list[Path]): found audio files
+            root (Path|None): scan root, see `get_scan_root`
+        """
         if len(files) == 0:
             status_bar = get_plugin(SysPlugin.StatusBar)
             if status_bar:
                 status_bar.show_message(translate("No files were found"), MessageStatus.Error)
             return
 
-        temp_directory = Path(self.get_app_config("workflow.temp_directory", Scope.User))
-        copy_files_worker = CopyFilesWorker(files, temp_directory)
+        if self._import_mode == ImportMode.Reference:
+            # Files are probed in place, so no import I/O is needed
+            write_references(self.get_app_config("workflow.temp_directory", Scope.User), files)
+            self._add_media_files(files, is_reference=True, names=[get_relative_name(i, root) for i in files])
+        else:
+            self._start_copy_files_worker(files, root)
+
+    def _start_copy_files_worker(self, files: list[Path], root: Optional[Path] = None) -> None:
+        copy_files_worker = CopyFilesWorker(
+            files,
+            self._content_store,
+            max_copies=get_device_concurrency(
+                self._content_store.directory,
+                self.get_app_config("workflow.import_concurrency", Scope.User)
+            )
+        )
+        copy_files_worker.signals.progress.connect(self._copy_files_worker_progress)
         copy_files_worker.signals.failed.connect(self._copy_files_worker_failed)
-        copy_files_worker.signals.completed.connect(lambda: self._copy_files_worker_finished(files))
+        copy_files_worker.signals.completed.connect(
+            lambda imported_files: self._copy_files_worker_finished(imported_files, root)
+        )
         copy_files_worker.signals.destroyed.connect(self.destroyed)
 
         pool = QThreadPool.global_instance()
@@ -418,16 +674,30 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         # self._start_converter_worker([file_path])
         pass
 
-    @Slot(Path, str, bool)
-    def on_file_moved(self, file_path: Path, new_media_file: str, is_directory: bool) -> None:
-        # TODO: Show message that files were moved and user need to do something about it
-        media_file = SnapshotRegistry.get(f"{file_path.parts[-2]}/{file_path.name}")
-        SnapshotRegistry.update(media_file.name, new_media_file)
+    @Slot(Path, Path, bool)
+    def on_file_moved(self, file_path: Path, new_file_path: Path, is_directory: bool) -> None:
+        """
+        Point the opened files to their new paths. Files of the moved directory are moved with it
+        """
+        temp_directory = self.get_app_config("workflow.temp_directory", Scope.User)
+        for path, new_path in get_moved_paths(list(self._media_file_names), file_path, new_file_path).items():
+            media_file_name = self._media_file_names.pop(path)
+            if not SnapshotRegistry.contains(media_file_name):
+                # File was closed
+                continue
+
+            self._media_file_names[new_path] = media_file_name
+            media_file = SnapshotRegistry.get(media_file_name)
+            if media_file.is_reference:
+                remove_references(temp_directory, [path])
+                write_references(temp_directory, [new_path])
+
+            SnapshotRegistry.update(media_file.name, dataclasses.replace(media_file, path=new_path))
 
     @Slot(Path, bool)
     def on_file_deleted(self, file_path: Path, is_directory: bool) -> None:
-        media_file_name = f"{file_path.parts[-2]}/{file_path.name}"
-        if not SnapshotRegistry.contains(media_file_name):
+        media_file_name = self._media_file_names.get(file_path)
+        if media_file_name is None or not SnapshotRegistry.contains(media_file_name):
             # Ignore `watchdog` emitting multiple events
             return
 
@@ -442,41 +712,99 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         if is_directory:
             return
 
-        media_file_name = f"{file_path.parts[-2]}/{file_path.name}"
-        if not SnapshotRegistry.contains(media_file_name):
+        media_file_name = self._media_file_names.get(file_path)
+        if media_file_name is None or not SnapshotRegistry.contains(media_file_name):
             # Ignore this event after we deleted file(-s)
             return
 
         media_file = SnapshotRegistry.get(media_file_name)
         SnapshotRegistry.update(media_file.name, media_file, Index.End)
 
+    # ScanFilesWorker handlers
+
+    @Slot(int)
+    def _scan_files_worker_finished(self, files_count: int) -> None:
+        if files_count == 0:
+            status_bar = get_plugin(SysPlugin.StatusBar)
+            if status_bar:
+                status_bar.show_message(translate("No files were found"), MessageStatus.Error)
+
+    @Slot(Exception)
+    def _scan_files_worker_failed(self, exception: Exception) -> None:
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(f'{translate("Failed to scan files")}: {exception!s}', MessageStatus.Error)
+
     # CopyFilesWorker handlers
 
-    def _copy_files_worker_finished(self, selected_files: list[Path]) -> None:
+    def _copy_files_worker_finished(self, imported_files: dict[Path, Path], root: Optional[Path] = None) -> None:
+        """
+        Start `ConverterProbeWorker` with selected files after `CopyFilesWorker` is finished.
+        Stored files are named after their source files
+        """
+        self._add_media_files(
+            list(imported_files.values()),
+            names=[get_relative_name(i, root) for i in imported_files]
+        )
+
+    def _add_media_files(
+        self,
+        selected_files: list[Path],
+        is_reference: bool = False,
+        names: list[str] = None
+    ) -> None:
         """
-        Start `ConverterProbeWorker` with selected files after `CopyFilesWorker` is finished
+        Add snapshots of the imported files and start `ProbeWorker`
+
+        Args:
+            selected_files (list[Path]): imported files
+            is_reference (bool): files are used in place
+            names (list[str]|None): names of the files relative to the scan root, see `get_relative_name`.
+                Output paths keep the same folders. Defaults to the file names
         """
         output_directory = self.get_app_config("workflow.output_directory", Scope.User)
         output_directory = Path(output_directory)
+        if names is None:
+            names = [i.name for i in selected_files]
+
+        # Names are unique, so are the output paths of the files with the same name from different folders
+        taken_names = {PurePosixPath(i.name).with_suffix("").as_posix().lower() for i in SnapshotRegistry.values()}
         selected_media_files = []
-        for selected_file in selected_files:
+        for selected_file, name in zip(selected_files, names):
+            # Skip files which are already opened
+            opened_name = self._media_file_names.get(selected_file)
+            if opened_name is not None and opened_name in SnapshotRegistry:
+                # Stored file got a reference when it was imported again
+                if self._content_store.contains(selected_file):
+                    self._content_store.release(selected_file)
+                continue
+
+            name = get_unique_name(name, taken_names)
             media_file = MediaFile(
                 uuid=str(uuid.uuid4()),
-                name=f"{selected_file.parts[-2]}/{selected_file.name}",
+                name=name,
                 path=Path(selected_file),
-                output_path=output_directory / selected_file.name,
-                is_origin=True
+                output_path=output_directory / name,
+                is_origin=True,
+                is_reference=is_reference
             )
+            SnapshotRegistry.add(media_file)
             selected_media_files.append(media_file)
+            self._media_file_names[media_file.path] = media_file.name
 
-        for index, media_file in enumerate(selected_media_files):
-            if media_file.name not in SnapshotRegistry:
-                SnapshotRegistry.add(media_file)
-            else:
-                del selected_media_files[index]
+        self._content_store.save()
 
         self._start_probe_worker(selected_media_files)
 
+    @Slot(object, object, float)
+    def _copy_files_worker_progress(self, bytes_done: int, bytes_total: int, files_per_second: float) -> None:
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(
+                f'{translate("Importing files")}: {bytes_done / 1024 ** 2:.1f} / {bytes_total / 1024 ** 2:.1f} MB, '
+                f'{files_per_second:.1f} {translate("files/s")}'
+            )
+
     @Slot(Exception)
     def _copy_files_worker_failed(self, exception: Exception):
         self._spinner.stop()
@@ -484,20 +812,29 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         if status_bar:
             status_bar.show_message(f'{translate("Failed to copy files")}: {exception!s}', MessageStatus.Error)
 
-    def _start_probe_worker(self, media_files) -> None:
-        probe_worker = ProbeWorker(
-            media_files=media_files,
-            temp_folder=Path(self.get_app_config("workflow.temp_directory", Scope.User)),
-            ffmpeg_command=self._ffmpeg_command,
-            ffprobe_command=self._ffprobe_command,
-        )
-        probe_worker.signals.started.connect(self._probe_worker_started)
-        probe_worker.signals.completed.connect(self._probe_worker_finished)
-        probe_worker.signals.failed.connect(self._probe_worker_failed)
-        probe_worker.signals.destroyed.connect(self.destroyed)
-
-        pool = QThreadPool.global_instance()
-        pool.start(probe_worker)
+    def _start_probe_worker(self, media_files: list[MediaFile]) -> None:
+        """
+        Add files to the probe queue. One worker probes all opened files,
+        so scan batches share the limit of ffprobe processes
+        """
+        if self._probe_worker is None:
+            self._probe_worker = ProbeWorker(
+                media_files=[],
+                ffprobe_command=self._ffprobe_command,
+                max_processes=self._max_processes,
+                cache=self._probe_cache
+            )
+            # Worker is started again when new files are added after its queue was drained
+            self._probe_worker.set_auto_delete(False)
+            self._probe_worker.signals.started.connect(self._probe_worker_started)
+            self._probe_worker.signals.completed_batch.connect(self._probe_worker_completed_batch)
+            self._probe_worker.signals.completed.connect(self._probe_worker_finished)
+            self._probe_worker.signals.failed.connect(self._probe_worker_failed)
+            self._probe_worker.signals.destroyed.connect(self.destroyed)
+
+        if self._probe_worker.add(media_files):
+            pool = QThreadPool.global_instance()
+            pool.start(self._probe_worker)
 
     # ProbeWorker handlers
 
@@ -506,9 +843,11 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         self._list_grid_layout.add_widget(self._spinner, 0, 0, alignment=Qt.AlignmentFlag.AlignHCenter)
         self._spinner.start()
 
-    @Slot(Path)
-    def _probe_worker_finished(self, models_list: list[MediaFile]) -> None:
-        self.watcher.start(self.get_app_config("workflow.temp_directory", Scope.User))
+    @Slot(list)
+    def _probe_worker_completed_batch(self, models_list: list[MediaFile]) -> None:
+        """
+        Append probed files to the list as soon as they are ready
+        """
         self._spinner.stop()
 
         if not self._list_grid_layout.find_child(self._spinner.__class__, self._spinner.object_name()):
@@ -516,6 +855,13 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
 
         self._fill_content_list(models_list)
 
+    @Slot(list)
+    def _probe_worker_finished(self, models_list: list[MediaFile]) -> None:
+        # Watch original locations of the referenced files. Files of the content store are private
+        for folder in {i.path.parent for i in models_list if not self._content_store.contains(i.path)}:
+            self.watcher.start(str(folder))
+        self._spinner.stop()
+
         status_bar = get_plugin(SysPlugin.StatusBar)
         if status_bar:
             status_bar.show_message(translate(f"Loaded %s files", len(models_list)), MessageStatus.Info)
@@ -529,32 +875,200 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
 
     def _open_submit_convert_dialog(self) -> None:
         # SubmitConvertDialog(SnapshotRegistry.values()[0].path, self._start_converter_process_worker)
-        SubmitConvertDialog(None, self._start_converter_worker)
+        SubmitConvertDialog(None, lambda: self._start_converter_worker())
 
     # ConverterWorker handlers
 
-    @Slot(Path)
-    def _start_converter_worker(self, output_folder: Path) -> None:
-        media_files = SnapshotRegistry.values()
-        converter_worker = ConverterWorker(media_files, self._ffmpeg_command)
+    @Slot()
+    def _start_converter_worker(self, jobs: list[ConverterJob] = None, media_files: list[MediaFile] = None) -> None:
+        """
+        Convert all files in the `SnapshotRegistry`, given (resumed) jobs or given files.
+        Referenced files which would be overwritten by their outputs are copied first
+        """
+        if self._converter_worker is not None or self._working_copy_media_files is not None:
+            return
+
+        if media_files is None:
+            media_files = SnapshotRegistry.values() if jobs is None else [i.media_file for i in jobs]
+            output_formats = self.get_app_config("workflow.output_formats", Scope.User)
+            if jobs is None and any(is_written_in_place(i, output_formats) for i in media_files):
+                self._start_working_copy_worker(media_files, output_formats)
+                return
+
+        converter_worker = ConverterWorker(
+            media_files=media_files,
+            ffmpeg_command=self._ffmpeg_command,
+            chunk_size=self._chunk_size,
+            max_processes=self._max_processes,
+            journal=self._converter_journal,
+            cache=self._converter_cache,
+            jobs=jobs,
+            output_formats=self.get_app_config("workflow.output_formats", Scope.User),
+            segment_threshold=self._segment_threshold
+        )
         converter_worker.signals.started.connect(self._converter_worker_started)
         converter_worker.signals.failed.connect(self._converter_worker_failed)
         converter_worker.signals.completed.connect(self._converter_worker_finished)
+        converter_worker.signals.completed_element.connect(self._converter_worker_completed_element)
+        converter_worker.signals.progress_element.connect(self._converter_worker_progress)
+        converter_worker.signals.speed_element.connect(self._converter_worker_speed)
+        converter_worker.signals.bytes_written.connect(self._converter_worker_bytes_written)
+        converter_worker.signals.failed_element.connect(self._converter_worker_failed_element)
+
+        # Batch progress state: <media file name>: <value>
+        self._converter_total_count = len(media_files)
+        self._converter_completed: set[str] = set()
+        self._converter_speeds: dict[str, float] = {}
+        self._converter_bytes: dict[str, int] = {}
+
+        # Keep the worker alive to pause or cancel it
+        converter_worker.set_auto_delete(False)
+        self._converter_worker = converter_worker
 
         pool = QThreadPool.global_instance()
         pool.start(converter_worker)
 
-    @Slot()
-    def _converter_worker_finished(self) -> None:
-        logger.debug("Finished")
+    def _start_working_copy_worker(self, media_files: list[MediaFile], output_formats: list[str] = None) -> None:
+        """
+        Copy referenced files which would be overwritten by their outputs and convert the copies,
+        so the source is read from the copy while the output replaces the original file
+        """
+        self._working_copy_media_files = media_files
+        working_copy_worker = WorkingCopyWorker(
+            [i for i in media_files if is_written_in_place(i, output_formats)],
+            self._get_temp_directory()
+        )
+        working_copy_worker.signals.completed.connect(self._working_copy_worker_finished)
+        working_copy_worker.signals.failed.connect(self._working_copy_worker_failed)
+
+        pool = QThreadPool.global_instance()
+        pool.start(working_copy_worker)
+
+    @Slot(list)
+    def _working_copy_worker_finished(self, working_copies: list[MediaFile]) -> None:
+        # Working copies keep the uuid of the referenced file
+        working_copies = {i.uuid: i for i in working_copies}
+        media_files = [working_copies.get(i.uuid, i) for i in self._working_copy_media_files]
+        self._working_copy_media_files = None
+        self._start_converter_worker(media_files=media_files)
+
+    @Slot(Exception)
+    def _working_copy_worker_failed(self, exception: Exception) -> None:
+        # Files without a copy are converted in place and fail, ffmpeg doesn't overwrite its input
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(f'{translate("Failed to copy files")}: {exception!s}', MessageStatus.Error)
+
+    def _pause_converter_worker(self) -> None:
+        """
+        Toggle converter queue pause
+        """
+        if self._converter_worker is None:
+            return
+
+        if self._converter_worker.is_paused:
+            self._converter_worker.resume()
+        else:
+            self._converter_worker.pause()
+
+    def _cancel_converter_worker(self) -> None:
+        if self._converter_worker is not None:
+            self._converter_worker.cancel()
+
+    def _set_converter_buttons_state(self, is_running: bool) -> None:
+        self.get_tool_button(self.name, ToolBarItem.Convert).set_enabled(not is_running)
+        self.get_tool_button(self.name, ToolBarItem.PauseConvert).set_enabled(is_running)
+        self.get_tool_button(self.name, ToolBarItem.CancelConvert).set_enabled(is_running)
+
+    def _get_converter_item(self, media_file_name: str) -> Union[ConverterItem, None]:
+        for item in self._converter_item_widgets:
+            if item.media_file.name == media_file_name:
+                return item
+
+    def _show_converter_progress(self) -> None:
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if not status_bar:
+            return
+
+        # Only running files have a realtime speed
+        speed = sum(v for k, v in self._converter_speeds.items() if k not in self._converter_completed)
+        megabytes = sum(self._converter_bytes.values()) / 1024 / 1024
+        status_bar.show_message(
+            f'{translate("Converting")} {len(self._converter_completed)}/{self._converter_total_count} '
+            f'· {speed:.1f}x · {megabytes:.1f} MB'
+        )
+
+    @Slot(ConverterResult)
+    def _converter_worker_finished(self, result: ConverterResult) -> None:
+        self._converter_worker = None
+        self._set_converter_buttons_state(False)
+
+        failed_jobs = {i.name for i in result.failed}
+        for item in self._converter_item_widgets:
+            if item.media_file.name not in failed_jobs:
+                item.clear_progress()
+
+        for job in result.failed:
+            logger.error(f"{job.name}: {job.error}")
+
+        for job in result.skipped:
+            logger.debug(f"{job.name} skipped: {job.error}")
+
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(
+                translate(
+                    "Converted %s, up to date or skipped %s, failed %s, cancelled %s files",
+                    len(result.succeeded),
+                    len(result.skipped),
+                    len(result.failed),
+                    len(result.cancelled)
+                ),
+                MessageStatus.Error if result.failed else MessageStatus.Info
+            )
 
     @Slot()
     def _converter_worker_started(self) -> None:
-        pass
+        self._set_converter_buttons_state(True)
+        self._show_converter_progress()
 
-    @Slot(Exception, int)
-    def _converter_worker_failed(self, exception: Exception, index: int) -> None:
-        pass
+    @Slot(str, str)
+    def _converter_worker_failed_element(self, media_file_name: str, error: str) -> None:
+        item = self._get_converter_item(media_file_name)
+        if item:
+            item.set_description(translate("Failed"))
+            item.set_tool_tip(error)
+
+    @Slot(str)
+    def _converter_worker_completed_element(self, media_file_name: str) -> None:
+        self._converter_completed.add(media_file_name)
+        item = self._get_converter_item(media_file_name)
+        if item:
+            item.set_progress(100.0)
+        self._show_converter_progress()
+
+    @Slot(str, float)
+    def _converter_worker_progress(self, media_file_name: str, percent: float) -> None:
+        item = self._get_converter_item(media_file_name)
+        if item:
+            item.set_progress(percent, self._converter_speeds.get(media_file_name))
+
+    @Slot(str, float)
+    def _converter_worker_speed(self, media_file_name: str, speed: float) -> None:
+        self._converter_speeds[media_file_name] = speed
+        self._show_converter_progress()
+
+    @Slot(str, object)
+    def _converter_worker_bytes_written(self, media_file_name: str, total_size: int) -> None:
+        self._converter_bytes[media_file_name] = total_size
+
+    @Slot(Exception)
+    def _converter_worker_failed(self, exception: Exception) -> None:
+        self._converter_worker = None
+        self._set_converter_buttons_state(False)
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(f'{translate("Failed to convert files")}: {exception!s}', MessageStatus.Error)
 
     # SnapshotRegistry protected proxy methods
 
@@ -570,6 +1084,24 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
         if len(SnapshotRegistry.values()) > 0:
             self.get_tool_button(self.name, ToolBarItem.Convert).set_enabled(True)
 
+    @Slot(list)
+    def _on_snapshots_modified(self, names: list[str]) -> None:
+        """
+        Refresh items of the snapshots modified in one batch with one repaint
+        """
+        modified_names = set(names)
+        self._content_list.set_updates_enabled(False)
+        try:
+            for widget in self._converter_item_widgets:
+                if widget.media_file.name in modified_names:
+                    widget.refresh()
+        finally:
+            self._content_list.set_updates_enabled(True)
+
+        self.sig_snapshots_modified.emit(names)
+        if SnapshotRegistry.count() > 0:
+            self.get_tool_button(self.name, ToolBarItem.Convert).set_enabled(True)
+
     @Slot(MediaFile)
     def _on_snapshot_deleted(self, snapshot: MediaFile) -> None:
         self.sig_snapshot_deleted.emit(snapshot)
@@ -598,10 +1130,32 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
     # Shortcut methods
 
     def _undo_button_connect(self) -> None:
-        SnapshotRegistry.update_global_snapshot_index(-1)
+        self._shift_global_snapshot_index(-1)
 
     def _redo_button_connect(self) -> None:
-        SnapshotRegistry.update_global_snapshot_index(+1)
+        self._shift_global_snapshot_index(+1)
+
+    def _shift_global_snapshot_index(self, shift: int) -> None:
+        """
+        Undo or redo changes and show the restored versions of the changed files
+        """
+        previous_index = SnapshotRegistry.get_global_snapshot_index()
+        media_file, _ = SnapshotRegistry.update_global_snapshot_index(shift)
+        names = []
+        if media_file is not None:
+            names = SnapshotRegistry.get_global_snapshot_names(
+                previous_index,
+                SnapshotRegistry.get_global_snapshot_index()
+            )
+
+        if names:
+            self._on_snapshots_modified(names)
+            return
+
+        status_bar = get_plugin(SysPlugin.StatusBar)
+        if status_bar:
+            message = translate("Nothing to undo") if shift < 0 else translate("Nothing to redo")
+            status_bar.show_message(message, MessageStatus.Info)
 
     # Plugin event methods
 
@@ -633,6 +1187,14 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
             title=translate("Open files"),
             description=translate("Open files to process them")
         )
+        self.add_shortcut(
+            name="open_folder",
+            shortcut="Ctrl+Shift+O",
+            triggered=self.open_folder,
+            target=self.parent(),
+            title=translate("Open folder"),
+            description=translate("Open all audio files of the folder and its subfolders")
+        )
         self.add_shortcut(
             name="toggle_search",
             shortcut="Ctrl+F",
@@ -692,6 +1254,15 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
             index=Index.Start,
             triggered=self.open_files
         )
+        self.add_menu_item(
+            scope=Scope.Shared,
+            menu=MainMenu.File,
+            name=MainMenuItem.OpenFolder,
+            text=translate("Open folder"),
+            icon=self.get_svg_icon(IconName.FolderOpen),
+            after=MainMenuItem.OpenFiles,
+            triggered=self.open_folder
+        )
 
     @on_plugin_available(plugin=SysPlugin.MainToolBar)
     def _on_toolbar_available(self) -> None:
@@ -715,7 +1286,27 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
             icon=self.get_svg_icon(IconName.Bolt)
         )
         convert_tool_button.set_enabled(False)
-        convert_tool_button.clicked.connect(self._start_converter_worker)
+        convert_tool_button.clicked.connect(lambda: self._start_converter_worker())
+
+        pause_tool_button = self.add_tool_button(
+            scope=self.name,
+            name=ToolBarItem.PauseConvert,
+            text=translate("Pause"),
+            tooltip=translate("Pause or resume converter"),
+            icon=self.get_svg_icon(IconName.PlayPause)
+        )
+        pause_tool_button.set_enabled(False)
+        pause_tool_button.clicked.connect(self._pause_converter_worker)
+
+        cancel_tool_button = self.add_tool_button(
+            scope=self.name,
+            name=ToolBarItem.CancelConvert,
+            text=translate("Stop"),
+            tooltip=translate("Stop converter"),
+            icon=self.get_svg_icon(IconName.Close)
+        )
+        cancel_tool_button.set_enabled(False)
+        cancel_tool_button.clicked.connect(self._cancel_converter_worker)
 
         clear_tool_button = self.add_tool_button(
             scope=self.name,
@@ -740,11 +1331,25 @@ class Converter(PiePlugin, CoreAccessorsMixin, WidgetsAccessorMixins):
             after=ToolBarItem.OpenFiles
         )
 
+        self.add_toolbar_item(
+            toolbar_name=SysPlugin.MainToolBar,
+            item_name=ToolBarItem.PauseConvert,
+            item_widget=self.get_tool_button(self.name, ToolBarItem.PauseConvert),
+            after=ToolBarItem.Convert
+        )
+
+        self.add_toolbar_item(
+            toolbar_name=SysPlugin.MainToolBar,
+            item_name=ToolBarItem.CancelConvert,
+            item_widget=self.get_tool_button(self.name, ToolBarItem.CancelConvert),
+            after=ToolBarItem.PauseConvert
+        )
+
         self.add_toolbar_item(
             toolbar_name=SysPlugin.MainToolBar,
             item_name=ToolBarItem.Clear,
             item_widget=self.get_tool_button(self.name, ToolBarItem.Clear),
-            after=ToolBarItem.Convert
+            after=ToolBarItem.CancelConvert
         )
 
 
@@ -77,7 +77,7 @@ class ConverterItem(QWidget):
         self.set_description(media_file.info.bit_rate_string)
         # self.set_icon()
 
-        sig_snapshot_modified.connect(lambda: self._on_snapshot_modified(media_file.name))
+        sig_snapshot_modified.connect(lambda snapshot: self._on_snapshot_modified(snapshot.name))
 
     @Slot(MediaFile)
     def _on_snapshot_modified(self, media_file_name: str) -> None:
@@ -93,6 +93,26 @@ class ConverterItem(QWidget):
         self.set_description(f"{media_file.info.bit_rate}kb/s")
         # self.set_icon()
 
+    def refresh(self) -> None:
+        """
+        Show the current snapshot of the file
+        """
+        self._on_snapshot_modified(self._media_file.name)
+
+    def set_progress(self, percent: float = None, speed: float = None) -> None:
+        """
+        Show conversion progress instead of the file description
+        """
+        description = []
+        if percent is not None:
+            description.append(f"{percent:.0f}%")
+        if speed is not None:
+            description.append(f"{speed:.1f}x")
+        self.set_description(" · ".join(description))
+
+    def clear_progress(self) -> None:
+        self.set_description(self._media_file.info.bit_rate_string)
+
     @property
     def media_file(self) -> MediaFile:
         return self._media_file
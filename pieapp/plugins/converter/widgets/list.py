@@ -1,11 +1,46 @@
 from __feature__ import snake_case
 
+from pathlib import Path
+
 from PySide6.QtGui import Qt
+from PySide6.QtCore import QEvent
+from PySide6.QtCore import QObject
+from PySide6.QtCore import Signal
 from PySide6.QtWidgets import QListWidget
 from PySide6.QtWidgets import QSizePolicy
 from PySide6.QtWidgets import QAbstractItemView
 
 
+class PathsDropFilter(QObject):
+    """
+    Event filter which accepts local files and directories dropped onto the watched widgets
+    """
+    sig_paths_dropped = Signal(list)
+
+    @staticmethod
+    def get_paths(event) -> list[Path]:
+        mime_data = event.mime_data()
+        if not mime_data.has_urls():
+            return []
+
+        return [Path(i.to_local_file()) for i in mime_data.urls() if i.is_local_file()]
+
+    def event_filter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() in (QEvent.Type.DragEnter, QEvent.Type.DragMove):
+            if self.get_paths(event):
+                event.accept_proposed_action()
+                return True
+
+        elif event.type() == QEvent.Type.Drop:
+            paths = self.get_paths(event)
+            if paths:
+                event.accept_proposed_action()
+                self.sig_paths_dropped.emit(paths)
+                return True
+
+        return False
+
+
 class ConverterListWidget(QListWidget):
 
     def __init__(
@@ -23,7 +58,17 @@ class ConverterListWidget(QListWidget):
         self.set_selection_behavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.set_selection_mode(QAbstractItemView.SelectionMode.SingleSelection)
 
+        # Drops are delivered to the viewport
+        self._drop_filter = PathsDropFilter(self)
+        self.set_accept_drops(True)
+        self.viewport().set_accept_drops(True)
+        self.viewport().install_event_filter(self._drop_filter)
+
         self.itemChanged.connect(change_callback)
         self.model().rowsRemoved.connect(remove_callback)
 
+    @property
+    def drop_filter(self) -> PathsDropFilter:
+        return self._drop_filter
+
     # def item_widget(self, item: PySide6.QtWidgets.QListWidgetItem) -> PySide6.QtWidgets.QWidget:
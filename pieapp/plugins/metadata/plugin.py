@@ -1,7 +1,9 @@
-import copy
+from pathlib import Path
+from typing import Optional
 
 from PySide6.QtGui import Qt
 from PySide6.QtCore import Slot
+from PySide6.QtCore import QThreadPool
 from PySide6.QtWidgets import QDialog
 from PySide6.QtWidgets import QGridLayout
 from PySide6.QtWidgets import QHeaderView
@@ -22,11 +24,16 @@ from pieapp.widgets.delegates import ReadOnlyDelegate
 from pieapp.widgets.tables import MediaTableItemValue
 
 from pieapp.api.models.indexes import Index
-from pieapp.api.converter.models import MediaFile, update_media_file
+from pieapp.api.models.scopes import Scope
+from pieapp.api.converter.covers import CoverCache
+from pieapp.api.converter.workers import MediaFileDetailsWorker
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import MediaFile
 from pieapp.api.models.plugins import SysPlugin
 from pieapp.api.models.themes import ThemeProperties, IconName
 
 from pieapp.api.registries.locales.helpers import translate
+from pieapp.api.registries.configs.mixins import ConfigAccessorMixin
 from pieapp.api.registries.themes.mixins import ThemeAccessorMixin
 from pieapp.api.registries.toolbars.mixins import ToolBarAccessorMixin
 from pieapp.api.registries.toolbuttons.mixins import ToolButtonAccessorMixin
@@ -37,6 +44,7 @@ from metadata.widgets.quickaction import MetadataEditorQuickAction
 
 class MetadataEditor(
     PiePlugin,
+    ConfigAccessorMixin,
     ThemeAccessorMixin,
     ToolBarAccessorMixin,
     ToolButtonAccessorMixin,
@@ -66,6 +74,18 @@ class MetadataEditor(
 
         self._converter.sig_table_item_added.connect(self._on_table_item_added)
 
+        # Files list is probed with the summary profile, tags are read when the editor is opened
+        self._ffprobe_command = Path(self.get_app_config("ffmpeg.ffprobe", Scope.User, "ffprobe"))
+
+        # Album covers are extracted when the editor is opened
+        self._cover_cache = CoverCache(
+            Global.USER_ROOT / Global.CACHES_DIR_NAME / Global.COVERS_CACHE_DIR_NAME,
+            ffmpeg_command=Path(self.get_app_config("ffmpeg.ffmpeg", Scope.User, "ffmpeg")),
+            max_size=self.get_app_config("ffmpeg.covers_cache_size", Scope.User, 64 * 1024 * 1024)
+        )
+        # Album cover of the edited file
+        self._album_cover: Optional[AlbumCover] = None
+
         self._dialog = QDialog(self._parent)
         # self._dialog.key_press_event = self._key_press_event
         self._dialog.set_object_name("MetadataEditor")
@@ -149,7 +169,21 @@ class MetadataEditor(
         -metadata:s:v title="album cover"
         -metadata:s:v comment="cover (front)" out.mp3
         """
-        media_file: MediaFile = SnapshotRegistry.get(media_file_name)
+        # Read tags and attached pictures skipped by the files list probe
+        details_worker = MediaFileDetailsWorker(
+            SnapshotRegistry.get(media_file_name),
+            self._ffprobe_command,
+            self._cover_cache
+        )
+        details_worker.signals.completed.connect(self._details_worker_completed)
+        details_worker.signals.failed.connect(self._details_worker_failed)
+        QThreadPool.global_instance().start(details_worker)
+
+    def _details_worker_failed(self, exception: Exception) -> None:
+        logger.debug(str(exception))
+
+    def _details_worker_completed(self, media_file: MediaFile, album_cover: AlbumCover) -> None:
+        self._album_cover = album_cover
         self._dialog.close_event = lambda event: self._close_event(event, media_file.name)
         SnapshotRegistry.add_local_snapshot(media_file.name, media_file)
         self._dialog.set_window_title(f"{translate('Edit metadata')} - {media_file.info.filename}")
@@ -189,8 +223,10 @@ class MetadataEditor(
         contributors_list_widget = QListWidget()
         contributors_list_widget.add_items(media_file.metadata.additional_contributors)
 
-        album_cover = media_file.metadata.album_cover
-        image_path = album_cover.image_path.as_posix() if album_cover.image_path.exists() else None
+        # Album cover is extracted by `MediaFileDetailsWorker`, edits don't change the file
+        album_cover = self._album_cover
+        image_path = album_cover.image_path.as_posix() if album_cover else None
+        preview_path = album_cover.image_small_path.as_posix() if album_cover and album_cover.image_small_path else None
         picker_icon = self.get_svg_icon(
             key="icons/folder-open.svg",
             prop=ThemeProperties.AppIconColor
@@ -198,6 +234,7 @@ class MetadataEditor(
         album_cover_widget = AlbumCoverPicker(
             parent=self._dialog,
             image_path=image_path,
+            preview_path=preview_path,
             picker_icon=picker_icon,
             placeholder_text=translate("No image selected"),
             select_album_cover_text=translate("Select album cover image")
@@ -254,20 +291,17 @@ class MetadataEditor(
             return
 
         item.set_text(item.text())
-        media_file_name = item.media_file_name
-        media_file_copy = copy.deepcopy(SnapshotRegistry.get_local_snapshot(media_file_name, Index.End))
-        media_file_copy = update_media_file(media_file_copy, item.field, item.value)
-
-        if not SnapshotRegistry.contains_local(media_file_copy.name, media_file_copy):
-            SnapshotRegistry.add_local_snapshot(media_file_copy.name, media_file_copy)
-            # SnapshotRegistry.sync_local_to_global(media_file_copy.name)
-            # SnapshotRegistry.sync_global_to_inner()
-            self._save_button.set_enabled(True)
-            self._undo_button.set_enabled(True)
-            self._redo_button.set_enabled(False)
+        # New snapshot shares all unchanged fields with the previous one
+        SnapshotRegistry.add_local_change(item.media_file_name, item.field, item.value)
+        # SnapshotRegistry.sync_local_to_global(item.media_file_name)
+        # SnapshotRegistry.sync_global_to_inner()
+        self._save_button.set_enabled(True)
+        self._undo_button.set_enabled(True)
+        self._redo_button.set_enabled(False)
 
     def _save_button_connect(self, media_file: MediaFile) -> None:
         # Sync local and global snapshots
+        # Only snapshots are changed, so the referenced file doesn't need a working copy
         local_snapshot = SnapshotRegistry.get_local_snapshot(media_file.name, Index.End)
         SnapshotRegistry.sync_local_to_global(local_snapshot.name)
         self._save_button.set_enabled(False)
@@ -32,6 +32,7 @@ class AlbumCoverPicker(QLineEdit):
         self,
         parent=None,
         image_path: str = None,
+        preview_path: str = None,
         picker_icon: QIcon = None,
         placeholder_text: str = "No image selected",
         select_album_cover_text: str = "Select album cover image"
@@ -41,7 +42,8 @@ class AlbumCoverPicker(QLineEdit):
         self._image_path = image_path
         self._placeholder_text = f"<{placeholder_text}>"
         self._select_album_cover_text = select_album_cover_text
-        self._image_preview = ImagePreview(self, self._image_path)
+        # Small copy of the image for the tooltip
+        self._image_preview = ImagePreview(self, preview_path or self._image_path)
 
         self._add_image_button = QLineEdit()
         self._add_image_action = QAction()
@@ -0,0 +1,82 @@
+"""
+Benchmark of the SnapshotRegistry operations
+
+Usage: python scripts/bench-snapshots.py --sizes 1000 10000 100000
+"""
+import time
+import random
+import argparse
+from pathlib import Path
+
+import PySide6  # noqa: F401 Required by `__feature__` imports
+
+from pieapp.api.utils.logger import logger
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.registries.snapshots.registry import SnapshotRegistryClass
+
+
+def create_media_file(index: int) -> MediaFile:
+    name = f"folder_{index % 100}/file_{index}.wav"
+    return MediaFile(
+        uuid=str(index),
+        name=name,
+        path=Path(name),
+        output_path=Path(f"output/file_{index}.wav")
+    )
+
+
+def measure(function: callable, arguments: list) -> float:
+    """
+    Returns the average time of one call in microseconds
+    """
+    started_at = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+
+    return (time.perf_counter() - started_at) / max(len(arguments), 1) * 1_000_000
+
+
+def bench(size: int, operations: int) -> dict[str, float]:
+    registry = SnapshotRegistryClass()
+    registry.init()
+
+    media_files = [create_media_file(i) for i in range(size)]
+    names = [i.name for i in media_files]
+    sample = random.sample(names, min(operations, size))
+
+    results = {"add": measure(registry.add, media_files)}
+    results["contains"] = measure(registry.contains, sample)
+    results["get"] = measure(registry.get, sample)
+    results["index"] = measure(registry.index, sample)
+    results["update"] = measure(lambda name: registry.update(name, registry.get(name), -1), sample)
+
+    def sync(name: str) -> None:
+        registry.add_global_snapshot(registry.get(name))
+        registry.sync_global_to_inner()
+
+    results["sync_global_to_inner"] = measure(sync, sample)
+
+    # Remove and lookup the row, as the list does on the file system events
+    def remove(name: str) -> None:
+        registry.index(name)
+        registry.remove(name)
+
+    results["remove"] = measure(remove, sample)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--operations", type=int, default=10_000, help="Number of measured calls of every operation")
+    args = parser.parse_args()
+
+    # Registry logs every call, only the data structure is measured
+    logger.remove()
+    random.seed(0)
+
+    results = {size: bench(size, args.operations) for size in args.sizes}
+    operations = list(next(iter(results.values())))
+    print(f"{'operation, us':<24}" + "".join(f"{size:>12}" for size in results))
+    for operation in operations:
+        print(f"{operation:<24}" + "".join(f"{results[size][operation]:>12.2f}" for size in results))
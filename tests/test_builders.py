@@ -0,0 +1,49 @@
+import uuid
+from pathlib import Path
+
+from pieapp.api.converter.models import Codec
+from pieapp.api.converter.models import FileInfo
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.builders import QueryBuilder
+
+
+def create_media_file(codec_name: str, output_path: str) -> MediaFile:
+    return MediaFile(
+        uuid=str(uuid.uuid4()),
+        name="file",
+        path=Path("file"),
+        output_path=Path(output_path),
+        info=FileInfo(
+            filename="file",
+            file_format="mp3",
+            bit_rate=320000,
+            bit_depth=None,
+            sample_rate=44100,
+            duration=1.0,
+            codec=Codec(name=codec_name, type="audio", long_name=None)
+        ),
+        metadata=Metadata(title="Title")
+    )
+
+
+def test_query_builder_copies_matching_codec():
+    query_builder = QueryBuilder(create_media_file("mp3", "file.MP3"))
+    assert query_builder.can_stream_copy()
+
+    arguments = query_builder.build()
+    assert arguments["c:a"] == "copy"
+    assert arguments["map_metadata"] == 0
+    assert "title=Title" in arguments.values()
+
+
+def test_query_builder_encodes_other_codecs():
+    assert QueryBuilder(create_media_file("opus", "file.ogg")).can_stream_copy()
+    assert not QueryBuilder(create_media_file("flac", "file.mp3")).can_stream_copy()
+    assert not QueryBuilder(create_media_file("aac", "file.unknown")).can_stream_copy()
+
+    media_file = create_media_file("mp3", "file.mp3")
+    media_file.info.codec = None
+    query_builder = QueryBuilder(media_file)
+    assert not query_builder.can_stream_copy()
+    assert "c:a" not in query_builder.build()
@@ -0,0 +1,205 @@
+import os
+import time
+import uuid
+from pathlib import Path
+
+from pieapp.api.converter.models import Codec
+from pieapp.api.converter.models import FileInfo
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ProbeProfile
+from pieapp.api.converter.cache import ConverterCache
+from pieapp.api.converter.cache import ProbeCache
+
+
+def create_converted_job(directory: Path, fingerprint: str = "abc") -> ConverterJob:
+    source_path = directory / "source.wav"
+    source_path.write_bytes(b"source")
+    output_path = directory / "output.mp3"
+    output_path.write_bytes(b"output")
+    media_file = MediaFile(uuid=str(uuid.uuid4()), name=source_path.name, path=source_path, output_path=output_path)
+    return ConverterJob(media_file=media_file, arguments={"b:a": "320k"}, fingerprint=fingerprint)
+
+
+def touch(file_path: Path) -> None:
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_converter_cache_unknown_output(tmp_path):
+    cache = ConverterCache(tmp_path / "cache.json")
+    assert not cache.is_up_to_date(create_converted_job(tmp_path))
+
+
+def test_converter_cache_is_saved_and_loaded(tmp_path):
+    job = create_converted_job(tmp_path)
+    cache = ConverterCache(tmp_path / "caches" / "cache.json")
+    cache.update(job)
+    assert cache.is_up_to_date(job)
+    cache.save()
+
+    assert ConverterCache(tmp_path / "caches" / "cache.json").is_up_to_date(job)
+
+
+def test_converter_cache_invalidation(tmp_path):
+    job = create_converted_job(tmp_path)
+    cache = ConverterCache(tmp_path / "cache.json")
+    cache.update(job)
+
+    # Output arguments changed
+    job.fingerprint = "def"
+    assert not cache.is_up_to_date(job)
+    job.fingerprint = "abc"
+    assert cache.is_up_to_date(job)
+
+    # Source changed
+    touch(job.media_file.path)
+    assert not cache.is_up_to_date(job)
+    cache.update(job)
+    assert cache.is_up_to_date(job)
+
+    # Output changed
+    job.media_file.output_path.write_bytes(b"changed output")
+    assert not cache.is_up_to_date(job)
+    cache.update(job)
+
+    # Output removed
+    job.media_file.output_path.unlink()
+    assert not cache.is_up_to_date(job)
+
+
+def test_converter_cache_with_content_hash(tmp_path):
+    job = create_converted_job(tmp_path)
+    cache = ConverterCache(tmp_path / "cache.json", use_content_hash=True)
+    cache.update(job)
+    assert cache.is_up_to_date(job)
+
+    # Same size and modification time, but another content
+    stat = job.media_file.path.stat()
+    job.media_file.path.write_bytes(b"SOURCE")
+    os.utime(job.media_file.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not cache.is_up_to_date(job)
+
+
+def test_converter_cache_clear(tmp_path):
+    job = create_converted_job(tmp_path)
+    cache = ConverterCache(tmp_path / "cache.json")
+    cache.update(job)
+    cache.clear()
+    assert not cache.is_up_to_date(job)
+
+
+def create_probe_models(file_path: Path) -> tuple[FileInfo, Metadata]:
+    info = FileInfo(
+        filename=file_path.name,
+        file_format="wav",
+        bit_rate=1411200,
+        bit_depth=16,
+        sample_rate=44100,
+        duration=12.5,
+        codec=Codec(name="pcm_s16le", type="audio", long_name=None)
+    )
+    return info, Metadata(title="Title", genre="Rock")
+
+
+def test_probe_cache_hit_and_invalidation(tmp_path):
+    file_path = tmp_path / "file.wav"
+    file_path.write_bytes(b"data")
+    info, metadata = create_probe_models(file_path)
+    cache = ProbeCache(tmp_path / "probe.sqlite3")
+    assert cache.get(file_path) is None
+
+    cache.put(file_path, info, metadata)
+    cached = cache.get(file_path)
+    assert cached[0] == info
+    assert cached[1] == metadata
+
+    # Modified file
+    touch(file_path)
+    assert cache.get(file_path) is None
+
+    cache.put(file_path, info, metadata)
+    cache.invalidate(file_path)
+    assert cache.get(file_path) is None
+
+
+def test_probe_cache_is_saved(tmp_path):
+    file_path = tmp_path / "file.wav"
+    file_path.write_bytes(b"data")
+    cache = ProbeCache(tmp_path / "caches" / "probe.sqlite3")
+    cache.put(file_path, *create_probe_models(file_path))
+    cache.save()
+    cache.close()
+
+    cache = ProbeCache(tmp_path / "caches" / "probe.sqlite3")
+    assert cache.get(file_path) is not None
+    cache.clear()
+    assert cache.get(file_path) is None
+    cache.close()
+
+
+def test_probe_cache_finds_copied_file_by_content_hash(tmp_path):
+    file_path = tmp_path / "file.wav"
+    file_path.write_bytes(b"data")
+    copied_path = tmp_path / "copied.wav"
+    copied_path.write_bytes(b"data")
+
+    cache = ProbeCache(tmp_path / "probe.sqlite3")
+    cache.put(file_path, *create_probe_models(file_path))
+    assert cache.get(copied_path) is None
+    cache.close()
+
+    cache = ProbeCache(tmp_path / "probe_hash.sqlite3", use_content_hash=True)
+    cache.put(file_path, *create_probe_models(file_path))
+    assert cache.get(copied_path) is not None
+    cache.close()
+
+
+def test_probe_cache_evicts_least_recently_used(tmp_path):
+    files = []
+    for index in range(3):
+        file_path = tmp_path / f"{index}.wav"
+        file_path.write_bytes(b"data")
+        files.append(file_path)
+
+    cache = ProbeCache(tmp_path / "probe.sqlite3", max_entries=2)
+    for file_path in files:
+        cache.put(file_path, *create_probe_models(file_path))
+        time.sleep(0.01)
+
+    # The first file is used recently, the second one is evicted
+    assert cache.get(files[0]) is not None
+    cache.save()
+    assert cache.get(files[0]) is not None
+    assert cache.get(files[1]) is None
+    assert cache.get(files[2]) is not None
+    cache.close()
+
+
+def test_probe_cache_summary_entries_never_satisfy_full_requests(tmp_path):
+    file_path = tmp_path / "file.wav"
+    file_path.write_bytes(b"data")
+    cache = ProbeCache(tmp_path / "probe.sqlite3")
+    cache.put(file_path, *create_probe_models(file_path), profile=ProbeProfile.Summary)
+    assert cache.get(file_path, ProbeProfile.Full) is None
+    assert cache.get(file_path, ProbeProfile.Summary)[2] == ProbeProfile.Summary
+
+    # Full entries satisfy summary requests
+    cache.put(file_path, *create_probe_models(file_path), profile=ProbeProfile.Full)
+    assert cache.get(file_path, ProbeProfile.Summary)[2] == ProbeProfile.Full
+    cache.close()
+
+
+def test_probe_cache_drops_other_schema_versions(tmp_path):
+    file_path = tmp_path / "file.wav"
+    file_path.write_bytes(b"data")
+    cache = ProbeCache(tmp_path / "probe.sqlite3")
+    cache.put(file_path, *create_probe_models(file_path))
+    cache._connection.execute("PRAGMA user_version = 1")
+    cache.save()
+    cache.close()
+
+    cache = ProbeCache(tmp_path / "probe.sqlite3")
+    assert cache.get(file_path) is None
+    cache.close()
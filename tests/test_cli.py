@@ -0,0 +1,74 @@
+import wave
+
+from pieapp.api.globals import Global
+from pieapp.app.cli import get_parser
+from pieapp.app.cli import convert
+from pieapp.app.cli import find_input_files
+from pieapp.app.cli import get_output_paths
+
+
+Global.import_module("pieapp.app.globals")
+
+
+def test_find_input_files(tmp_path):
+    (tmp_path / "album" / "cd1").mkdir(parents=True)
+    first = tmp_path / "album" / "cd1" / "01.wav"
+    second = tmp_path / "album" / "02.FLAC"
+    first.touch()
+    second.touch()
+    (tmp_path / "album" / "cover.jpg").touch()
+
+    # Directories are scanned for audio files, duplicates are dropped
+    files = find_input_files([str(tmp_path / "album"), str(first)])
+    assert files == [second.resolve(), first.resolve()]
+
+    assert find_input_files([str(tmp_path / "**" / "*.wav")]) == [first.resolve()]
+    assert find_input_files([str(tmp_path / "missing.wav")]) == []
+
+
+def test_convert_without_input_files(tmp_path, capsys):
+    arguments = get_parser().parse_args([
+        "convert", str(tmp_path / "*.wav"), "-o", str(tmp_path / "output"), "-f", "mp3"
+    ])
+    assert convert(arguments) == 1
+    assert "No input files found" in capsys.readouterr().err
+
+
+def test_get_output_paths_keeps_relative_paths(tmp_path):
+    input_files = [
+        tmp_path / "music" / "A" / "01.flac",
+        tmp_path / "music" / "B" / "01.flac",
+        tmp_path / "music" / "B" / "01.wav",
+        tmp_path / "music" / "02.wav",
+    ]
+    output_paths, errors = get_output_paths(input_files, tmp_path / "output", "mp3")
+    assert output_paths == {
+        input_files[0]: tmp_path / "output" / "A" / "01.mp3",
+        input_files[1]: tmp_path / "output" / "B" / "01.mp3",
+        input_files[3]: tmp_path / "output" / "02.mp3",
+    }
+    # Files which would overwrite another output are reported
+    assert list(errors) == [input_files[2]]
+    assert str(input_files[1]) in errors[input_files[2]]
+
+    output_paths, errors = get_output_paths([input_files[0]], tmp_path / "output", "ogg")
+    assert output_paths == {input_files[0]: tmp_path / "output" / "01.ogg"}
+    assert errors == {}
+
+
+def test_convert_fails_on_unsupported_output_format(tmp_path, capsys):
+    input_file = tmp_path / "01.wav"
+    with wave.open(str(input_file), "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(8000)
+        output.writeframes(b"\x00\x00" * 8000)
+
+    arguments = get_parser().parse_args([
+        "convert", str(input_file), "-o", str(tmp_path / "output"), "-f", "m4a",
+        "--ffmpeg", str(tmp_path / "ffmpeg"), "--ffprobe", str(tmp_path / "ffprobe")
+    ])
+    assert convert(arguments) == 1
+    output = capsys.readouterr().out
+    assert f"[skipped] {input_file} -> {tmp_path / 'output' / '01.m4a'}: Unsupported file format" in output
+    assert "skipped 1" in output
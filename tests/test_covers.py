@@ -0,0 +1,110 @@
+import sys
+import uuid
+from pathlib import Path
+
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.covers import CoverCache
+from pieapp.api.converter.covers import THUMBNAIL_SUFFIX
+from pieapp.api.converter.covers import get_image_file_format
+
+
+# ffmpeg replacement: the attached picture is the content of the source file,
+# every call is counted in the "calls" file next to the script
+FAKE_FFMPEG = """
+import sys
+from pathlib import Path
+
+calls_path = Path(__file__).with_name("calls")
+calls_path.write_text(str(int(calls_path.read_text()) + 1 if calls_path.exists() else 1))
+
+input_path = Path(sys.argv[sys.argv.index("-i") + 1])
+output = [i for i in sys.argv if i != "-y"][-1]
+if output == "pipe:":
+    sys.stdout.buffer.write(input_path.read_bytes())
+else:
+    Path(output).write_bytes(b"thumbnail")
+"""
+
+
+def create_fake_ffmpeg(directory: Path) -> Path:
+    file_path = directory / "ffmpeg"
+    file_path.write_text(f"#!{sys.executable}\n{FAKE_FFMPEG}", encoding="utf-8")
+    file_path.chmod(0o755)
+    return file_path
+
+
+def get_calls_count(ffmpeg_command: Path) -> int:
+    calls_path = ffmpeg_command.with_name("calls")
+    return int(calls_path.read_text()) if calls_path.exists() else 0
+
+
+def create_media_file(file_path: Path, picture: bytes = None) -> MediaFile:
+    file_path.write_bytes(picture or b"")
+    return MediaFile(
+        uuid=str(uuid.uuid4()),
+        name=file_path.name,
+        path=file_path,
+        output_path=file_path,
+        metadata=Metadata(title=None, album_cover=AlbumCover() if picture else None)
+    )
+
+
+def test_get_image_file_format():
+    assert get_image_file_format(b"\x89PNG\r\n") == "png"
+    assert get_image_file_format(b"\xFF\xD8\xFF\xE0") == "jpg"
+    assert get_image_file_format(b"unknown") == "jpg"
+
+
+def test_cover_cache_without_picture(tmp_path):
+    ffmpeg_command = create_fake_ffmpeg(tmp_path)
+    cache = CoverCache(tmp_path / "covers", ffmpeg_command)
+    assert cache.get_album_cover(create_media_file(tmp_path / "1.mp3")) is None
+    assert get_calls_count(ffmpeg_command) == 0
+
+
+def test_cover_cache_shares_covers_of_one_album(tmp_path):
+    ffmpeg_command = create_fake_ffmpeg(tmp_path)
+    cache = CoverCache(tmp_path / "covers", ffmpeg_command)
+    first = create_media_file(tmp_path / "1.mp3", b"\x89PNG album")
+    second = create_media_file(tmp_path / "2.mp3", b"\x89PNG album")
+
+    first_cover = cache.get_album_cover(first)
+    assert first_cover.image_file_format == "png"
+    assert first_cover.image_path.read_bytes() == b"\x89PNG album"
+    assert first_cover.image_small_path.stem == f"{first_cover.image_path.stem}{THUMBNAIL_SUFFIX}"
+    assert first_cover.image_small_path.read_bytes() == b"thumbnail"
+    assert get_calls_count(ffmpeg_command) == 2
+
+    # The same picture is extracted, but the thumbnail isn't created again
+    second_cover = cache.get_album_cover(second)
+    assert second_cover.image_path == first_cover.image_path
+    assert get_calls_count(ffmpeg_command) == 3
+
+    # Unchanged file isn't read again
+    cache.get_album_cover(first)
+    assert get_calls_count(ffmpeg_command) == 3
+
+
+def test_cover_cache_does_not_change_media_file(tmp_path):
+    cache = CoverCache(tmp_path / "covers", create_fake_ffmpeg(tmp_path))
+    media_file = create_media_file(tmp_path / "1.mp3", b"\x89PNG album")
+
+    album_cover = cache.get_album_cover(media_file)
+    assert album_cover is not media_file.metadata.album_cover
+    assert album_cover.image_path is not None
+    assert media_file.metadata.album_cover == AlbumCover()
+    assert not list((tmp_path / "covers").glob(".*.tmp"))
+
+
+def test_cover_cache_evicts_least_recently_used_covers(tmp_path):
+    ffmpeg_command = create_fake_ffmpeg(tmp_path)
+    cache = CoverCache(tmp_path / "covers", ffmpeg_command, max_size=40)
+    first = cache.get_album_cover(create_media_file(tmp_path / "1.mp3", b"\x89PNG first cover"))
+    second = cache.get_album_cover(create_media_file(tmp_path / "2.mp3", b"\x89PNG second cover"))
+
+    assert not first.image_path.exists()
+    assert not first.image_small_path.exists()
+    assert second.image_path.exists()
+    assert second.image_small_path.exists()
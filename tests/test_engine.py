@@ -0,0 +1,204 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+from pieapp.api.converter.models import Codec
+from pieapp.api.converter.models import FileInfo
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.models import ConverterJobStatus
+from pieapp.api.converter.journal import ConverterJournal
+from pieapp.api.converter.engine import ConverterEngine
+from pieapp.api.converter.engine import get_max_processes
+from pieapp.api.converter.engine import split_chunks
+
+
+# ffmpeg replacement: sources with "broken" in the name can't be converted,
+# every absolute path after the input is an output file
+FAKE_FFMPEG = """
+import os
+import sys
+
+input_index = sys.argv.index("-i") + 1
+if "broken" in sys.argv[input_index]:
+    sys.stderr.write("Invalid data found when processing input")
+    sys.exit(1)
+
+for argument in sys.argv[input_index + 1:]:
+    if os.path.isabs(argument):
+        with open(argument, "wb") as output:
+            output.write(b"converted")
+
+print("out_time_us=1000000")
+print("progress=end")
+"""
+
+
+def create_fake_ffmpeg(directory: Path) -> Path:
+    file_path = directory / "ffmpeg"
+    file_path.write_text(f"#!{sys.executable}\n{FAKE_FFMPEG}", encoding="utf-8")
+    file_path.chmod(0o755)
+    return file_path
+
+
+def create_media_file(directory: Path, name: str, file_format: str = "wav") -> MediaFile:
+    path = directory / name
+    path.write_bytes(b"source")
+    return MediaFile(
+        uuid=str(uuid.uuid4()),
+        name=name,
+        path=path,
+        output_path=directory / "output" / f"{path.stem}.mp3",
+        info=FileInfo(
+            filename=name,
+            file_format=file_format,
+            bit_rate=1411200,
+            bit_depth=16,
+            sample_rate=44100,
+            duration=1.0,
+            codec=Codec(name="pcm_s16le", type="audio", long_name=None)
+        ),
+        metadata=Metadata(title=name)
+    )
+
+
+def test_get_max_processes_defaults_to_cpu_count():
+    assert get_max_processes() == (os.cpu_count() or 1)
+    assert get_max_processes(0) == (os.cpu_count() or 1)
+    assert get_max_processes(-2) == (os.cpu_count() or 1)
+    assert get_max_processes(3) == 3
+    assert get_max_processes("5") == 5
+
+
+def test_split_chunks_empty():
+    assert split_chunks([], 10, 4) == []
+
+
+def test_split_chunks_keeps_order_and_items():
+    jobs = list(range(103))
+    chunks = split_chunks(jobs, 10, 2)
+    assert [i for chunk in chunks for i in chunk] == jobs
+    assert all(len(chunk) <= 10 for chunk in chunks)
+
+
+def test_split_chunks_small_batch_keeps_every_process_busy():
+    chunks = split_chunks(list(range(8)), 10, 4)
+    assert len(chunks) == 4
+    assert all(len(chunk) == 2 for chunk in chunks)
+
+
+def test_split_chunks_chunk_size_is_at_least_one():
+    assert split_chunks([1, 2, 3], 0, 8) == [[1], [2], [3]]
+    assert split_chunks([1, 2, 3], None, 1) == [[1], [2], [3]]
+
+
+def test_converter_engine_records_every_job(tmp_path):
+    (tmp_path / "output").mkdir()
+    media_files = [
+        create_media_file(tmp_path, "1.wav"),
+        create_media_file(tmp_path, "broken.wav"),
+        create_media_file(tmp_path, "2.m4a", file_format="m4a"),
+    ]
+    # Output file format isn't supported
+    media_files[2].output_path = media_files[2].output_path.with_suffix(".m4a")
+    engine = ConverterEngine(create_fake_ffmpeg(tmp_path), max_processes=2)
+    completed = []
+    result = engine.run(media_files, on_completed_element=completed.append)
+
+    assert sorted(i.name for i in completed) == sorted(i.name for i in media_files)
+    assert [i.name for i in result.succeeded] == ["1.wav"]
+    assert media_files[0].output_path.read_bytes() == b"converted"
+    assert [i.name for i in result.failed] == ["broken.wav"]
+    assert "Invalid data" in result.failed[0].error
+    assert [i.name for i in result.skipped] == ["2.m4a"]
+
+
+def test_converter_engine_cancels_queued_jobs(tmp_path):
+    (tmp_path / "output").mkdir()
+    media_files = [create_media_file(tmp_path, f"{i}.wav") for i in range(3)]
+    engine = ConverterEngine(create_fake_ffmpeg(tmp_path), chunk_size=1, max_processes=1)
+    result = engine.run(media_files, on_completed_element=lambda job: engine.cancel())
+
+    assert len(result.succeeded) == 1
+    assert len(result.cancelled) == 2
+    assert all(i.status != ConverterJobStatus.Queued for i in result.jobs)
+
+
+def test_create_job_uses_output_file_format(tmp_path):
+    media_file = create_media_file(tmp_path, "1.aac", file_format="aac")
+    assert ConverterEngine.create_job(media_file).arguments is not None
+
+    media_file.output_path = tmp_path / "output" / "1.aac"
+    job = ConverterEngine.create_job(media_file)
+    assert job.arguments is None
+    assert job.fingerprint is None
+
+
+def test_create_multi_target_job(tmp_path):
+    media_file = create_media_file(tmp_path, "1.wav")
+    job = ConverterEngine.create_multi_target_job(media_file, ["mp3", ".OGG", "mp3", "m4a"])
+
+    assert [i.output_path.name for i in job.targets] == ["1.mp3", "1.ogg", "1.m4a"]
+    assert job.targets[2].status == ConverterJobStatus.Skipped
+    assert job.fingerprint is not None
+
+
+def test_converter_engine_writes_every_output_format(tmp_path):
+    (tmp_path / "output").mkdir()
+    media_file = create_media_file(tmp_path, "1.wav")
+    engine = ConverterEngine(create_fake_ffmpeg(tmp_path))
+    result = engine.run([media_file], output_formats=["mp3", "flac"])
+
+    assert len(result.succeeded) == 1
+    for target in result.jobs[0].targets:
+        assert target.status == ConverterJobStatus.Succeeded
+        assert target.output_path.read_bytes() == b"converted"
+
+
+def test_converter_engine_writes_journal_in_groups(tmp_path):
+    (tmp_path / "output").mkdir()
+    media_files = [create_media_file(tmp_path, f"{i}.wav") for i in range(5)]
+    journal = ConverterJournal(tmp_path / "journal.jsonl")
+    groups = []
+    journal_extend = journal.extend
+
+    def extend(jobs):
+        groups.append([i.status for i in jobs])
+        journal_extend(jobs)
+
+    journal.extend = extend
+    engine = ConverterEngine(create_fake_ffmpeg(tmp_path), max_processes=2, journal=journal)
+    result = engine.run(media_files)
+
+    assert len(result.succeeded) == 5
+    # All jobs are queued with one write, then every write has the latest status of the changed jobs
+    assert groups[0] == [ConverterJobStatus.Queued] * 5
+    assert len(groups) <= 1 + 2 * len(media_files)
+    assert groups[-1][-1] == ConverterJobStatus.Succeeded
+    assert not journal.file_path.exists()
+
+
+def test_converter_engine_splits_only_lossless_outputs(tmp_path):
+    engine = ConverterEngine(create_fake_ffmpeg(tmp_path), max_processes=4, segment_threshold=60)
+    for output_name, can_split in (("1.wav", True), ("1.flac", True), ("1.mp3", False), ("1.ogg", False)):
+        media_file = create_media_file(tmp_path, "1.wav")
+        media_file.info.duration = 600.0
+        # Stream copy isn't split
+        media_file.info.codec.name = "mp3"
+        media_file.output_path = tmp_path / "output" / output_name
+        assert engine.can_split(ConverterEngine.create_job(media_file)) == can_split
+
+    # Short files are converted in one process
+    media_file = create_media_file(tmp_path, "1.wav")
+    media_file.output_path = tmp_path / "output" / "1.flac"
+    assert not engine.can_split(ConverterEngine.create_job(media_file))
+
+
+def test_converter_engine_creates_output_folders(tmp_path):
+    media_file = create_media_file(tmp_path, "1.wav")
+    media_file.output_path = tmp_path / "output" / "Album" / "CD1" / "1.mp3"
+    result = ConverterEngine(create_fake_ffmpeg(tmp_path), max_processes=1).run([media_file])
+
+    assert [i.name for i in result.succeeded] == ["1.wav"]
+    assert media_file.output_path.read_bytes() == b"converted"
@@ -0,0 +1,89 @@
+import os
+import errno
+
+import pytest
+
+from pieapp.api.utils import files
+from pieapp.api.utils.files import clone_file
+from pieapp.api.utils.files import FileCloneMethod
+
+
+@pytest.fixture
+def source(tmp_path):
+    file_path = tmp_path / "source.wav"
+    file_path.write_bytes(b"source data")
+    return file_path
+
+
+def raise_os_error(code: int) -> callable:
+    def raise_error(*args, **kwargs):
+        raise OSError(code, os.strerror(code))
+
+    return raise_error
+
+
+def test_clone_file_falls_back_to_hardlink(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(files, "_reflink_file", lambda *args: False)
+    destination = tmp_path / "destination.wav"
+    assert clone_file(source, destination) == FileCloneMethod.Hardlink
+    assert destination.samefile(source)
+
+    # Already linked file is kept
+    assert clone_file(source, destination) == FileCloneMethod.Hardlink
+    assert destination.samefile(source)
+
+
+def test_clone_file_falls_back_to_copy(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(files, "_reflink_file", lambda *args: False)
+    monkeypatch.setattr(os, "link", raise_os_error(errno.EXDEV))
+    destination = tmp_path / "destination.wav"
+    destination.write_bytes(b"old data")
+
+    assert clone_file(source, destination) == FileCloneMethod.Copy
+    assert destination.read_bytes() == b"source data"
+    assert not destination.samefile(source)
+    assert destination.stat().st_mtime_ns == source.stat().st_mtime_ns
+
+
+def test_hardlink_file_raises_unexpected_errors(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(os, "link", raise_os_error(errno.ENOENT))
+    with pytest.raises(OSError):
+        files._hardlink_file(source, tmp_path / "destination.wav")
+
+
+def test_reflink_file_failure_removes_destination(tmp_path, source, monkeypatch):
+    fcntl = pytest.importorskip("fcntl")
+    monkeypatch.setattr(fcntl, "ioctl", raise_os_error(errno.EOPNOTSUPP))
+    destination = tmp_path / "destination.wav"
+    assert not files._reflink_file(source, destination)
+    assert not destination.exists()
+
+
+def test_clone_file_without_hardlink_copies_data(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(files, "_reflink_file", lambda *args: False)
+    destination = tmp_path / "destination.wav"
+    os.link(source, destination)
+
+    # Hardlinked destination is replaced with a copy, which can be modified in place
+    assert clone_file(source, destination, allow_hardlink=False) == FileCloneMethod.Copy
+    assert not destination.samefile(source)
+    destination.write_bytes(b"modified")
+    assert source.read_bytes() == b"source data"
+
+
+def test_copy_file_reports_progress(tmp_path):
+    source = tmp_path / "source.wav"
+    source.write_bytes(os.urandom(10000))
+    destination = tmp_path / "destination.wav"
+    progress = []
+
+    files.copy_file(source, destination, buffer_size=4096, on_progress=progress.append)
+    assert destination.read_bytes() == source.read_bytes()
+    assert progress == [4096, 4096, 1808]
+
+
+def test_clone_file_reports_linked_file_at_once(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(files, "_reflink_file", lambda *args: False)
+    progress = []
+    clone_file(source, tmp_path / "destination.wav", on_progress=progress.append)
+    assert progress == [source.stat().st_size]
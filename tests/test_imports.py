@@ -0,0 +1,151 @@
+import uuid
+from pathlib import Path
+
+from pieapp.api.globals import Global
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.imports import read_references
+from pieapp.api.converter.imports import write_references
+from pieapp.api.converter.imports import remove_references
+from pieapp.api.converter.imports import get_working_copy
+from pieapp.api.converter.imports import is_written_in_place
+from pieapp.api.converter.imports import get_device_concurrency
+from pieapp.api.converter.imports import get_moved_paths
+from pieapp.api.converter.imports import scan_audio_files
+from pieapp.api.converter.imports import get_scan_root
+from pieapp.api.converter.imports import get_relative_name
+from pieapp.api.converter.imports import get_unique_name
+
+
+Global.import_module("pieapp.app.globals")
+
+
+def test_references(tmp_path):
+    assert read_references(tmp_path) == []
+
+    first, second = Path("/music/1.wav"), Path("/music/2.wav")
+    write_references(tmp_path, [first])
+    write_references(tmp_path, [first, second])
+    assert read_references(tmp_path) == [first, second]
+
+    remove_references(tmp_path, [first])
+    assert read_references(tmp_path) == [second]
+
+    remove_references(tmp_path)
+    assert read_references(tmp_path) == []
+
+
+def create_referenced_file(directory: Path, name: str) -> MediaFile:
+    original_path = directory / name
+    original_path.parent.mkdir(parents=True, exist_ok=True)
+    original_path.write_bytes(name.encode("utf-8"))
+    return MediaFile(
+        uuid=str(uuid.uuid4()),
+        name=name,
+        path=original_path,
+        output_path=directory / "output" / name,
+        is_reference=True
+    )
+
+
+def test_get_working_copy_keeps_original_file(tmp_path):
+    media_file = create_referenced_file(tmp_path, "music/1.wav")
+    original_path = media_file.path
+
+    working_copy = get_working_copy(media_file, tmp_path / "temp")
+    assert not working_copy.is_reference
+    assert working_copy.path.read_bytes() == b"music/1.wav"
+    assert not working_copy.path.samefile(original_path)
+    # Snapshots share their models, so the given model isn't changed
+    assert media_file.is_reference
+    assert media_file.path == original_path
+
+    # Copied files are returned as is
+    assert get_working_copy(working_copy, tmp_path / "temp") is working_copy
+
+
+def test_get_working_copy_of_files_with_the_same_name(tmp_path):
+    first = get_working_copy(create_referenced_file(tmp_path, "A/1.wav"), tmp_path / "temp")
+    second = get_working_copy(create_referenced_file(tmp_path, "B/1.wav"), tmp_path / "temp")
+    assert first.path != second.path
+    assert first.path.read_bytes() == b"A/1.wav"
+    assert second.path.read_bytes() == b"B/1.wav"
+
+
+def test_is_written_in_place(tmp_path):
+    media_file = create_referenced_file(tmp_path, "music/1.wav")
+    assert not is_written_in_place(media_file)
+
+    media_file.output_path = media_file.path.with_suffix(".mp3")
+    assert not is_written_in_place(media_file)
+    # One of the outputs of the multi-target conversion replaces the source
+    assert is_written_in_place(media_file, ["mp3", "WAV"])
+
+    media_file.output_path = media_file.path
+    assert is_written_in_place(media_file)
+    # Copied files are never the originals
+    assert not is_written_in_place(get_working_copy(media_file, tmp_path / "temp"))
+
+
+def test_get_moved_paths(tmp_path):
+    paths = [tmp_path / "A" / "1.wav", tmp_path / "A" / "CD1" / "2.wav", tmp_path / "B" / "1.wav"]
+    assert get_moved_paths(paths, paths[0], tmp_path / "C" / "3.wav") == {paths[0]: tmp_path / "C" / "3.wav"}
+    # Files of the moved directory are moved with it
+    assert get_moved_paths(paths, tmp_path / "A", tmp_path / "D") == {
+        paths[0]: tmp_path / "D" / "1.wav",
+        paths[1]: tmp_path / "D" / "CD1" / "2.wav",
+    }
+    assert get_moved_paths(paths, tmp_path / "E.wav", tmp_path / "F.wav") == {}
+
+
+def test_get_device_concurrency(tmp_path):
+    assert get_device_concurrency(tmp_path) == 4
+    assert get_device_concurrency(tmp_path, 8) == 8
+    assert get_device_concurrency(tmp_path, {"/": 2}) == 2
+
+    # The longest mount point wins
+    concurrency = {"/": 2, str(tmp_path.parent): 6, str(tmp_path / "other"): 1}
+    assert get_device_concurrency(tmp_path / "temp", concurrency) == 6
+    assert get_device_concurrency(tmp_path / "temp", {"/mnt/nas": 8}, default=3) == 3
+
+
+def create_files(directory: Path, names: list[str]) -> None:
+    for name in names:
+        file_path = directory / name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(b"")
+
+
+def test_scan_audio_files(tmp_path):
+    create_files(tmp_path, ["b.wav", "a.MP3", "cover.jpg", "A/2.flac", "A/1.flac", "A/B/1.ogg", "C/1.wav"])
+    (tmp_path / "link").symlink_to(tmp_path / "A", target_is_directory=True)
+
+    files = [i.relative_to(tmp_path).as_posix() for i in scan_audio_files([tmp_path])]
+    assert files == ["a.MP3", "b.wav", "A/1.flac", "A/2.flac", "A/B/1.ogg", "C/1.wav"]
+
+    files = [i.relative_to(tmp_path).as_posix() for i in scan_audio_files([tmp_path], recursive=False)]
+    assert files == ["a.MP3", "b.wav"]
+
+    # Selected files are filtered by extension too
+    files = list(scan_audio_files([tmp_path / "cover.jpg", tmp_path / "b.wav", tmp_path / "missing.wav"]))
+    assert files == [tmp_path / "b.wav"]
+
+
+def test_get_relative_name():
+    assert get_scan_root([Path("/music/A"), Path("/music/B/1.wav")]) == Path("/music")
+    root = get_scan_root([Path("/music/A"), Path("/music/B")])
+    assert get_relative_name(Path("/music/A/CD1/1.wav"), root) == "A/CD1/1.wav"
+    assert get_relative_name(Path("/other/1.wav"), root) == "1.wav"
+
+    # Selected files are named by their file names
+    root = get_scan_root([Path("/music/A/1.wav"), Path("/music/A/2.wav")])
+    assert get_relative_name(Path("/music/A/1.wav"), root) == "1.wav"
+
+
+def test_get_unique_name():
+    taken_names = set()
+    assert get_unique_name("A/1.wav", taken_names) == "A/1.wav"
+    assert get_unique_name("B/1.wav", taken_names) == "B/1.wav"
+    # Outputs of both files would have the same path
+    assert get_unique_name("A/1.flac", taken_names) == "A/1 (2).flac"
+    assert get_unique_name("a/1.WAV", taken_names) == "a/1 (3).WAV"
+    assert taken_names == {"a/1", "b/1", "a/1 (2)", "a/1 (3)"}
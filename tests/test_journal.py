@@ -0,0 +1,83 @@
+import uuid
+from pathlib import Path
+
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ConverterJob
+from pieapp.api.converter.models import ConverterJobStatus
+from pieapp.api.converter import journal as journal_module
+from pieapp.api.converter.journal import ConverterJournal
+
+
+def create_job(directory: Path, name: str, status: str = ConverterJobStatus.Queued) -> ConverterJob:
+    path = directory / name
+    path.touch()
+    media_file = MediaFile(
+        uuid=str(uuid.uuid4()),
+        name=name,
+        path=path,
+        output_path=directory / "output" / f"{path.stem}.mp3"
+    )
+    return ConverterJob(media_file=media_file, status=status, arguments={"b:a": "320k"}, fingerprint="abc")
+
+
+def test_journal_read_missing_file(tmp_path):
+    journal = ConverterJournal(tmp_path / "journal.jsonl")
+    assert journal.read() == []
+    assert journal.get_unfinished_jobs() == []
+
+
+def test_journal_resumes_only_unfinished_jobs(tmp_path):
+    journal = ConverterJournal(tmp_path / "journal" / "journal.jsonl")
+    queued = create_job(tmp_path, "queued.wav")
+    running = create_job(tmp_path, "running.wav")
+    succeeded = create_job(tmp_path, "succeeded.wav")
+    for job in (queued, running, succeeded):
+        journal.append(job)
+
+    running.status = ConverterJobStatus.Running
+    journal.append(running)
+    succeeded.status = ConverterJobStatus.Succeeded
+    journal.append(succeeded)
+
+    jobs = {i.name: i for i in journal.get_unfinished_jobs()}
+    assert set(jobs) == {"queued.wav", "running.wav"}
+    assert jobs["queued.wav"].media_file.path == queued.media_file.path
+    assert jobs["queued.wav"].media_file.output_path == queued.media_file.output_path
+    assert jobs["queued.wav"].arguments == {"b:a": "320k"}
+    assert jobs["queued.wav"].fingerprint == "abc"
+    assert jobs["running.wav"].status == ConverterJobStatus.Queued
+
+
+def test_journal_skips_deleted_sources_and_broken_lines(tmp_path):
+    journal = ConverterJournal(tmp_path / "journal.jsonl")
+    deleted = create_job(tmp_path, "deleted.wav")
+    kept = create_job(tmp_path, "kept.wav")
+    journal.append(deleted)
+    journal.append(kept)
+    deleted.media_file.path.unlink()
+    # Line written partially before crash
+    with open(journal.file_path, "a", encoding="utf-8") as output:
+        output.write('{"name": "broken')
+
+    assert len(journal.read()) == 2
+    assert [i.name for i in journal.get_unfinished_jobs()] == ["kept.wav"]
+
+
+def test_journal_clear(tmp_path):
+    journal = ConverterJournal(tmp_path / "journal.jsonl")
+    journal.append(create_job(tmp_path, "file.wav"))
+    journal.clear()
+    assert not journal.file_path.exists()
+    assert journal.get_unfinished_jobs() == []
+    journal.clear()
+
+
+def test_journal_extend_syncs_once(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(journal_module.os, "fsync", calls.append)
+    journal = ConverterJournal(tmp_path / "journal.jsonl")
+    jobs = [create_job(tmp_path, f"{i}.wav") for i in range(5)]
+    journal.extend(jobs)
+
+    assert len(calls) == 1
+    assert [i["name"] for i in journal.read()] == [i.name for i in jobs]
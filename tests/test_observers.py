@@ -0,0 +1,35 @@
+import time
+import shutil
+from pathlib import Path
+
+from PySide6.QtCore import QCoreApplication
+
+from pieapp.api.converter.observers import FileSystemWatcher
+
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_watcher_emits_moved_paths(tmp_path):
+    (tmp_path / "A").mkdir()
+    file_path = tmp_path / "A" / "1.wav"
+    file_path.write_bytes(b"source")
+    new_file_path = tmp_path / "A" / "2.wav"
+
+    watcher = FileSystemWatcher()
+    moved = []
+    watcher.events.sig_file_moved.connect(lambda *arguments: moved.append(arguments))
+    watcher.start(str(tmp_path / "A"))
+    try:
+        shutil.move(file_path, new_file_path)
+        for _ in range(100):
+            QCoreApplication.processEvents()
+            if moved:
+                break
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+
+    # Destination is a path, so the moved file can be replaced with `dataclasses.replace`
+    assert moved == [(file_path, new_file_path, False)]
+    assert isinstance(moved[0][1], Path)
@@ -0,0 +1,258 @@
+import struct
+from pathlib import Path
+
+import pytest
+
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import ProbeProfile
+from pieapp.api.converter.probe import OggProbe
+from pieapp.api.converter.probe import WaveProbe
+from pieapp.api.converter.probe import UnsupportedFileError
+from pieapp.api.converter.probe import get_probe_builder
+from pieapp.api.converter.probe import probe_native
+from pieapp.api.converter.probe import parse_probe_result
+from pieapp.api.converter.probe import _PROBE_PROFILE_ARGUMENTS
+
+
+def get_riff_chunk(chunk_id: bytes, data: bytes) -> bytes:
+    return chunk_id + struct.pack("<I", len(data)) + data + b"\x00" * (len(data) & 1)
+
+
+def write_wave(file_path: Path, seconds: float = 1.0, tags: dict[bytes, bytes] = None) -> None:
+    channels, sample_rate, bits_per_sample = 2, 44100, 16
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    fmt = struct.pack("<HHIIHH", 1, channels, sample_rate, byte_rate, channels * bits_per_sample // 8, bits_per_sample)
+    chunks = get_riff_chunk(b"fmt ", fmt)
+    if tags:
+        info = b"INFO" + b"".join(get_riff_chunk(k, v + b"\x00") for k, v in tags.items())
+        chunks += get_riff_chunk(b"LIST", info)
+    chunks += get_riff_chunk(b"data", b"\x00" * int(byte_rate * seconds))
+    file_path.write_bytes(b"RIFF" + struct.pack("<I", len(chunks) + 4) + b"WAVE" + chunks)
+
+
+def get_vorbis_comments(comments: dict[str, str]) -> bytes:
+    data = struct.pack("<I", 4) + b"test" + struct.pack("<I", len(comments))
+    for key, value in comments.items():
+        comment = f"{key}={value}".encode("utf-8")
+        data += struct.pack("<I", len(comment)) + comment
+    return data
+
+
+def write_flac(file_path: Path, sample_rate: int, channels: int, total_samples: int, comments: dict = None) -> None:
+    bits = (sample_rate << 44) | ((channels - 1) << 41) | (15 << 36) | total_samples
+    stream_info = b"\x10\x00\x10\x00" + b"\x00" * 6 + bits.to_bytes(8, "big") + b"\x00" * 16
+    vorbis_comment = get_vorbis_comments(comments or {})
+    file_path.write_bytes(
+        b"fLaC"
+        + bytes([0]) + len(stream_info).to_bytes(3, "big") + stream_info
+        + bytes([0x80 | 4]) + len(vorbis_comment).to_bytes(3, "big") + vorbis_comment
+    )
+
+
+def get_id3v2_tag(frames: dict[str, str]) -> bytes:
+    data = b""
+    for frame_id, value in frames.items():
+        frame = b"\x03" + value.encode("utf-8")
+        data += frame_id.encode("latin-1") + struct.pack(">I", len(frame)) + b"\x00\x00" + frame
+
+    size = len(data)
+    syncsafe_size = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x03\x00\x00" + syncsafe_size + data
+
+
+# MPEG-1 Layer III, 128 kbit/s, 44100 Hz, stereo
+MP3_FRAME_HEADER: bytes = b"\xFF\xFB\x90\x00"
+MP3_FRAME_SIZE: int = 144 * 128000 // 44100
+
+
+def write_mp3(file_path: Path, frames_count: int, tags: dict[str, str] = None, xing_frames_count: int = None) -> None:
+    frames = [MP3_FRAME_HEADER + b"\x00" * (MP3_FRAME_SIZE - 4) for _ in range(frames_count)]
+    if xing_frames_count is not None:
+        # Xing header follows 32 bytes of stereo side information
+        xing = b"Xing" + struct.pack(">II", 0x01, xing_frames_count)
+        frames[0] = (MP3_FRAME_HEADER + b"\x00" * 32 + xing).ljust(MP3_FRAME_SIZE, b"\x00")
+    file_path.write_bytes((get_id3v2_tag(tags) if tags else b"") + b"".join(frames))
+
+
+def get_ogg_page(serial: int, sequence: int, granule: int, packets: list[bytes], header_type: int = 0) -> bytes:
+    lacing_values = []
+    for packet in packets:
+        lacing_values += [255] * (len(packet) // 255) + [len(packet) % 255]
+
+    header = b"OggS" + struct.pack("<BBqIIIB", 0, header_type, granule, serial, sequence, 0, len(lacing_values))
+    return header + bytes(lacing_values) + b"".join(packets)
+
+
+def write_ogg(file_path: Path, identification: bytes, comment: bytes, last_granule: int) -> None:
+    serial = 1234
+    file_path.write_bytes(
+        get_ogg_page(serial, 0, 0, [identification], header_type=2)
+        + get_ogg_page(serial, 1, 0, [comment])
+        + get_ogg_page(serial, 2, last_granule // 2, [b"\x00" * 300])
+        + get_ogg_page(serial, 3, last_granule, [b"\x00" * 100], header_type=4)
+    )
+
+
+def test_get_probe_builder():
+    assert isinstance(get_probe_builder(Path("file.WAV")), WaveProbe)
+    assert isinstance(get_probe_builder(Path("file.opus")), OggProbe)
+    assert get_probe_builder(Path("file.m4a")) is None
+
+
+def test_wave_probe(tmp_path):
+    file_path = tmp_path / "file.wav"
+    write_wave(file_path, seconds=1.5, tags={b"INAM": b"Title", b"IGNR": b"Rock"})
+    info, metadata = probe_native(file_path)
+    assert info.codec.name == "pcm_s16le"
+    assert info.sample_rate == 44100
+    assert info.channels == 2
+    assert info.bit_depth == 16
+    assert info.bit_rate == 1411200
+    assert info.duration == pytest.approx(1.5)
+    assert metadata.title == "Title"
+    assert metadata.genre == "Rock"
+
+
+def test_wave_probe_truncated_file(tmp_path):
+    file_path = tmp_path / "file.wav"
+    write_wave(file_path, seconds=2.0)
+    file_path.write_bytes(file_path.read_bytes()[:-44100 * 4])
+    info, _ = probe_native(file_path)
+    assert info.duration == pytest.approx(1.0)
+
+
+def test_wave_probe_unsupported_file(tmp_path):
+    file_path = tmp_path / "file.wav"
+    file_path.write_bytes(b"not a wave file")
+    with pytest.raises(UnsupportedFileError):
+        WaveProbe(file_path).probe_file_info()
+
+    assert probe_native(file_path) is None
+
+
+def test_flac_probe(tmp_path):
+    file_path = tmp_path / "file.flac"
+    write_flac(file_path, 48000, 2, 48000 * 3, {"TITLE": "Title", "ALBUMARTIST": "Artist"})
+    info, metadata = probe_native(file_path)
+    assert info.codec.name == "flac"
+    assert info.sample_rate == 48000
+    assert info.channels == 2
+    assert info.bit_depth == 16
+    assert info.duration == pytest.approx(3.0)
+    assert metadata.title == "Title"
+    assert metadata.primary_artist == "Artist"
+
+
+def test_flac_probe_unknown_length(tmp_path):
+    file_path = tmp_path / "file.flac"
+    write_flac(file_path, 48000, 2, 0)
+    assert probe_native(file_path) is None
+
+
+def test_mp3_probe_constant_bit_rate(tmp_path):
+    file_path = tmp_path / "file.mp3"
+    write_mp3(file_path, 20, tags={"TIT2": "Title", "TCON": "Rock"})
+    info, metadata = probe_native(file_path)
+    assert info.codec.name == "mp3"
+    assert info.sample_rate == 44100
+    assert info.channels == 2
+    assert info.bit_rate == 128000
+    assert info.duration == pytest.approx(20 * MP3_FRAME_SIZE * 8 / 128000)
+    assert metadata.title == "Title"
+    assert metadata.genre == "Rock"
+
+
+def test_mp3_probe_xing_header(tmp_path):
+    file_path = tmp_path / "file.mp3"
+    write_mp3(file_path, 20, xing_frames_count=1000)
+    info, _ = probe_native(file_path)
+    assert info.duration == pytest.approx(1000 * 1152 / 44100)
+
+
+def test_mp3_probe_without_frames(tmp_path):
+    file_path = tmp_path / "file.mp3"
+    file_path.write_bytes(get_id3v2_tag({"TIT2": "Title"}) + b"\x00" * 1024)
+    assert probe_native(file_path) is None
+
+
+def test_mp3_probe_leaves_unsupported_tags_to_ffprobe(tmp_path):
+    file_path = tmp_path / "file.mp3"
+    write_mp3(file_path, 20, tags={"TIT2": "Title"})
+    data = file_path.read_bytes()
+
+    # Unsynchronised tag
+    file_path.write_bytes(data[:5] + b"\x80" + data[6:])
+    assert probe_native(file_path) is None
+
+    # Unknown version
+    file_path.write_bytes(data[:3] + b"\x05" + data[4:])
+    assert probe_native(file_path) is None
+
+    # ID3v1 tag without ID3v2 tags
+    write_mp3(file_path, 20)
+    id3v1_tag = b"TAG" + b"Title".ljust(30, b"\x00") + b"\x00" * 94 + b"\x11"
+    file_path.write_bytes(file_path.read_bytes() + id3v1_tag)
+    assert probe_native(file_path) is None
+
+    # ID3v2 tags are read natively, ID3v1 tag is skipped
+    file_path.write_bytes(data + id3v1_tag)
+    info, metadata = probe_native(file_path)
+    assert metadata.title == "Title"
+    assert info.duration == pytest.approx(20 * MP3_FRAME_SIZE * 8 / 128000)
+
+
+def test_ogg_vorbis_probe(tmp_path):
+    file_path = tmp_path / "file.ogg"
+    identification = b"\x01vorbis" + struct.pack("<IBIiIiB", 0, 2, 44100, 0, 160000, 0, 0xB8) + b"\x01"
+    comment = b"\x03vorbis" + get_vorbis_comments({"TITLE": "Title", "TRACKNUMBER": "3"}) + b"\x01"
+    write_ogg(file_path, identification, comment, 44100 * 4)
+    info, metadata = probe_native(file_path)
+    assert info.codec.name == "vorbis"
+    assert info.sample_rate == 44100
+    assert info.channels == 2
+    assert info.bit_rate == 160000
+    assert info.duration == pytest.approx(4.0)
+    assert metadata.title == "Title"
+
+
+def test_ogg_opus_probe(tmp_path):
+    file_path = tmp_path / "file.opus"
+    pre_skip = 312
+    identification = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 44100, 0, 0)
+    comment = b"OpusTags" + get_vorbis_comments({"TITLE": "Title"})
+    write_ogg(file_path, identification, comment, 48000 * 2 + pre_skip)
+    info, metadata = probe_native(file_path)
+    assert info.codec.name == "opus"
+    assert info.sample_rate == 48000
+    assert info.channels == 1
+    assert info.duration == pytest.approx(2.0)
+    assert metadata.title == "Title"
+
+
+def test_parse_probe_result_picks_audio_stream_after_attached_picture():
+    probe_result = {
+        "streams": [
+            {"codec_name": "mjpeg", "codec_type": "video", "disposition": {"attached_pic": 1}},
+            {"codec_name": "flac", "codec_type": "audio", "sample_rate": "96000", "channels": 2, "bits_per_sample": 24},
+        ],
+        "format": {"filename": "/music/file.flac", "duration": "12.5", "bit_rate": "3000000", "tags": {"title": "Title"}},
+    }
+    media_file = MediaFile(uuid="1", name="file.flac", path=Path("/music/file.flac"), output_path=Path("file.mp3"))
+    media_file = parse_probe_result(media_file, probe_result, ProbeProfile.Full)
+    assert media_file.uuid != "1"
+    assert media_file.probe_profile == ProbeProfile.Full
+    assert media_file.info.codec.name == "flac"
+    assert media_file.info.sample_rate == 96000
+    assert media_file.info.bit_depth == 24
+    # FLAC streams have no bit rate
+    assert media_file.info.bit_rate == 3000000
+    assert media_file.info.duration == 12.5
+    assert media_file.metadata.title == "Title"
+    assert media_file.metadata.album_cover is not None
+
+
+def test_summary_profile_reads_attached_pictures():
+    arguments = _PROBE_PROFILE_ARGUMENTS[ProbeProfile.Summary]
+    # Attached pictures are video streams, so all streams are read
+    assert "-select_streams" not in arguments
+    assert any("stream_disposition=attached_pic" in i for i in arguments)
@@ -0,0 +1,72 @@
+import sys
+import asyncio
+
+import pytest
+
+from pieapp.api.converter.processes import ProcessLoop
+from pieapp.api.converter.processes import run_process
+
+
+@pytest.fixture
+def process_loop():
+    process_loop = ProcessLoop(name="test-process-loop")
+    yield process_loop
+    process_loop.stop()
+
+
+def test_process_loop_runs_coroutines(process_loop):
+    async def add(a: int, b: int) -> int:
+        await asyncio.sleep(0)
+        return a + b
+
+    assert process_loop.run(add(1, 2)) == 3
+    assert process_loop.submit(add(2, 3)).result() == 5
+    assert not process_loop.is_loop_thread()
+
+
+def test_process_loop_run_from_loop_thread_raises(process_loop):
+    async def run_nested() -> None:
+        coroutine = asyncio.sleep(0)
+        try:
+            process_loop.run(coroutine)
+        finally:
+            coroutine.close()
+
+    with pytest.raises(RuntimeError):
+        process_loop.run(run_nested())
+
+
+def test_run_process_collects_output(process_loop):
+    script = "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"
+    result = process_loop.run(run_process([sys.executable, "-c", script]))
+    assert result.returncode == 3
+    assert result.stdout.strip() == b"out"
+    assert result.stderr.strip() == b"err"
+
+
+def test_run_process_streams_lines(process_loop):
+    lines = []
+    result = process_loop.run(run_process(
+        [sys.executable, "-c", "print('a'); print('b')"],
+        on_line=lines.append
+    ))
+    assert result.returncode == 0
+    assert [i.strip() for i in lines] == ["a", "b"]
+
+
+def test_run_process_is_killed_on_cancel(process_loop):
+    processes = []
+
+    async def run_and_cancel() -> None:
+        task = asyncio.ensure_future(run_process(
+            [sys.executable, "-c", "import time; time.sleep(60)"],
+            on_start=processes.append
+        ))
+        while not processes:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    process_loop.run(run_and_cancel())
+    assert processes[0].returncode is not None
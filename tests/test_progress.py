@@ -0,0 +1,73 @@
+from pieapp.api.converter.progress import parse_out_time
+from pieapp.api.converter.progress import parse_speed
+from pieapp.api.converter.progress import parse_total_size
+from pieapp.api.converter.progress import read_progress
+from pieapp.api.converter.progress import ProgressReader
+
+
+def get_progress_lines(blocks: list[dict[str, str]]) -> list[str]:
+    return [f"{key}={value}\n" for block in blocks for key, value in block.items()]
+
+
+def test_parse_out_time():
+    assert parse_out_time({"out_time_us": "1500000"}) == 1.5
+    assert parse_out_time({"out_time_ms": "2000000"}) == 2.0
+    assert parse_out_time({"out_time_us": "-20000"}) == 0.0
+    assert parse_out_time({"out_time_us": "N/A", "out_time": "01:02:03.500000"}) == 3723.5
+    assert parse_out_time({"out_time": "N/A"}) == 0.0
+    assert parse_out_time({}) == 0.0
+
+
+def test_parse_speed_and_total_size():
+    assert parse_speed({"speed": " 12.5x"}) == 12.5
+    assert parse_speed({"speed": "N/A"}) is None
+    assert parse_total_size({"total_size": "1024"}) == 1024
+    assert parse_total_size({"total_size": "N/A"}) == 0
+
+
+def test_read_progress_yields_blocks_with_percents():
+    lines = get_progress_lines([
+        {"out_time_us": "5000000", "total_size": "100", "speed": "2x", "progress": "continue"},
+        {"out_time_us": "10000000", "total_size": "200", "speed": "2x", "progress": "end"},
+    ])
+    progress = list(read_progress("file.wav", lines, duration=10.0, interval=0))
+    assert [i.out_time for i in progress] == [5.0, 10.0]
+    assert [i.percent for i in progress] == [50.0, 100.0]
+    assert [i.is_end for i in progress] == [False, True]
+    assert progress[-1].total_size == 200
+    assert progress[-1].speed == 2.0
+    assert all(i.name == "file.wav" for i in progress)
+
+
+def test_read_progress_without_duration_has_no_percents():
+    lines = get_progress_lines([{"out_time_us": "5000000", "progress": "end"}])
+    progress = list(read_progress("file.wav", lines))
+    assert len(progress) == 1
+    assert progress[0].percent is None
+
+
+def test_read_progress_is_rate_limited_but_keeps_the_last_block():
+    lines = get_progress_lines([{"out_time_us": str(i * 1000000), "progress": "continue"} for i in range(100)])
+    lines += get_progress_lines([{"out_time_us": "100000000", "progress": "end"}])
+    progress = list(read_progress("file.wav", lines, duration=100.0, interval=3600))
+    assert len(progress) <= 2
+    assert progress[-1].is_end
+    assert progress[-1].out_time == 100.0
+
+
+def test_progress_reader_returns_complete_blocks():
+    reader = ProgressReader("file.wav", duration=4.0, interval=0)
+    assert reader.feed("out_time_us=1000000\n") is None
+    assert reader.feed("\n") is None
+    progress = reader.feed("progress=continue\n")
+    assert progress.out_time == 1.0
+    assert progress.percent == 25.0
+    assert not progress.is_end
+
+    # Block values don't leak into the next block
+    reader.feed("speed=1x\n")
+    progress = reader.feed("progress=end\n")
+    assert progress.out_time == 0.0
+    assert progress.speed == 1.0
+    assert progress.percent == 100.0
+    assert progress.is_end
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from pieapp.api.converter.segments import get_segments
+from pieapp.api.converter.segments import write_concat_list
+from pieapp.api.converter.segments import SEGMENT_ALIGNMENT_SAMPLES
+
+
+def test_get_segments_short_file_is_not_split():
+    assert get_segments(30.0, 44100, 8) == [(0.0, None)]
+    assert get_segments(3600.0, 44100, 1) == [(0.0, None)]
+
+
+def test_get_segments_count_is_limited_by_min_duration():
+    segments = get_segments(150.0, 44100, 8, min_segment_duration=60.0)
+    assert len(segments) == 2
+
+
+def test_get_segments_are_aligned_and_contiguous():
+    sample_rate = 48000
+    segments = get_segments(3600.0, sample_rate, 8)
+    assert len(segments) == 8
+    assert segments[0][0] == 0.0
+    # The last segment is read until the end of the source
+    assert segments[-1][1] is None
+
+    for (start, length), (next_start, _) in zip(segments, segments[1:]):
+        samples = round(length * sample_rate)
+        assert samples % SEGMENT_ALIGNMENT_SAMPLES == 0
+        assert round(start * sample_rate) + samples == round(next_start * sample_rate)
+
+
+def test_write_concat_list_escapes_quotes(tmp_path):
+    file_path = tmp_path / "concat.txt"
+    write_concat_list(file_path, [Path("/tmp/a.wav"), Path("/tmp/it's.wav")])
+    assert file_path.read_text(encoding="utf-8") == "file '/tmp/a.wav'\nfile '/tmp/it'\\''s.wav'\n"
@@ -0,0 +1,466 @@
+import sys
+import random
+import uuid
+import datetime
+from pathlib import Path
+
+import pytest
+
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import Codec
+from pieapp.api.converter.models import FileInfo
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.models import replace_media_file
+from pieapp.api.registries.snapshots.history import MediaFileHistory
+from pieapp.api.registries.snapshots.journal import SnapshotJournal
+from pieapp.api.registries.snapshots.journal import dump_media_file
+from pieapp.api.registries.snapshots.journal import load_media_file
+from pieapp.api.registries.snapshots.spill import SnapshotList
+from pieapp.api.registries.snapshots.spill import SnapshotMemoryBudget
+from pieapp.api.registries.snapshots.spill import SnapshotSpillStore
+from pieapp.api.registries.snapshots.spill import get_snapshot_size
+from pieapp.api.registries.snapshots.registry import RowIndex
+from pieapp.api.registries.snapshots.registry import SnapshotRegistryClass
+
+
+def create_media_file(name: str) -> MediaFile:
+    return MediaFile(
+        uuid=str(uuid.uuid4()),
+        name=name,
+        path=Path(name),
+        output_path=Path(name),
+        metadata=Metadata(title=name)
+    )
+
+
+def create_registry() -> SnapshotRegistryClass:
+    registry = SnapshotRegistryClass()
+    registry.init()
+    return registry
+
+
+@pytest.fixture
+def registry():
+    return create_registry()
+
+
+def test_row_index_matches_list():
+    rows = RowIndex()
+    names = []
+    generator = random.Random(0)
+    for i in range(2000):
+        if names and generator.random() < 0.4:
+            name = names.pop(generator.randrange(len(names)))
+            rows.remove(name)
+        else:
+            name = f"{i}.wav"
+            names.append(name)
+            rows.add(name)
+
+        for name in generator.sample(names, min(len(names), 5)):
+            assert rows.index(name) == names.index(name)
+
+    # Removed sequence numbers are dropped on rebuild
+    assert len(rows._tree) - 1 <= 2 * len(names) + 1
+    assert [rows.index(i) for i in names] == list(range(len(names)))
+
+    rows.clear()
+    rows.add("1.wav")
+    assert rows.index("1.wav") == 0
+
+
+def test_registry_versions(registry):
+    first, second = create_media_file("1.wav"), create_media_file("2.wav")
+    registry.add(first)
+    registry.add(second)
+
+    assert registry.count() == 2
+    assert registry.contains("2.wav")
+    assert registry.index("2.wav") == 1
+    assert registry.get("missing.wav") is None
+
+    updated = create_media_file("1.wav")
+    registry.update("1.wav", updated)
+    assert registry.get("1.wav", 1) is updated
+    assert registry.get("1.wav") is updated
+    assert registry.values() == [updated, second]
+
+    registry.remove("1.wav")
+    assert not registry.contains("1.wav")
+    assert registry.index("2.wav") == 0
+    with pytest.raises(ValueError):
+        registry.index("1.wav")
+
+
+def test_replace_media_file_shares_unchanged_models():
+    media_file = create_media_file("1.wav")
+    new_media_file = replace_media_file(media_file, "metadata.genre", "Rock")
+    assert new_media_file.uuid != media_file.uuid
+    assert new_media_file.metadata.genre == "Rock"
+    assert media_file.metadata.genre is None
+    assert new_media_file.path is media_file.path
+
+    new_media_file = replace_media_file(new_media_file, "output_path", Path("1.mp3"))
+    assert new_media_file.output_path == Path("1.mp3")
+    assert new_media_file.metadata.genre == "Rock"
+
+
+def test_media_file_history_reconstructs_versions():
+    history = MediaFileHistory(checkpoint_interval=3)
+    versions = [history.append(create_media_file("1.wav"))]
+    for i in range(10):
+        versions.append(history.append_change("metadata.track_number", i))
+
+    # Every 4th version is a full model
+    assert sum(isinstance(i, MediaFile) for i in history._entries) == 3
+    assert len(history) == len(versions)
+    assert versions[-1] in history
+
+    # Random access and iteration give the same versions
+    for index in (5, 2, 10, 0, 7, -1):
+        assert history[index] == versions[index]
+    assert list(history) == versions
+    with pytest.raises(IndexError):
+        history[len(versions)]
+
+    history.clear()
+    assert len(history) == 0
+    assert versions[0] not in history
+
+
+def test_snapshot_list_spills_old_snapshots(tmp_path):
+    store = SnapshotSpillStore(tmp_path / "spill.db")
+    # Room for three integers
+    budget = SnapshotMemoryBudget(max_resident_size=3 * sys.getsizeof(0), store=store)
+    first = SnapshotList(budget, range(5))
+    second = SnapshotList(budget, [5, 6])
+
+    # The last snapshot of every list is kept in memory and isn't counted
+    assert store.count() == 2
+    assert first._slots[-1].value == 4
+    assert second._slots[-1].value == 6
+
+    # Evicted snapshots are loaded back on access
+    assert list(first) == [0, 1, 2, 3, 4]
+    assert first[1:3] == [1, 2]
+    assert second[0] == 5
+    assert store.count() == 2
+
+    first[0] = 10
+    del first[3:]
+    second.clear()
+    assert list(first) == [10, 1, 2]
+    assert store.count() <= 2
+
+    budget.clear()
+    assert store.count() == 0
+    store.close()
+
+
+def test_snapshot_list_without_store_keeps_everything():
+    snapshots = SnapshotList(SnapshotMemoryBudget(max_resident_size=1), range(5))
+    assert all(i.value is not None for i in snapshots._slots)
+    assert list(snapshots) == [0, 1, 2, 3, 4]
+
+
+def test_snapshot_memory_budget_removes_dropped_slots(tmp_path):
+    store = SnapshotSpillStore(tmp_path / "spill.db")
+    budget = SnapshotMemoryBudget(store=store)
+    snapshots = SnapshotList(budget, range(100))
+    assert len(budget._slots) == 99
+
+    del snapshots[1:]
+    assert len(budget._slots) < 50
+    assert budget.resident_size == sys.getsizeof(0)
+    store.close()
+
+
+def test_snapshot_memory_budget_counts_only_changed_models(tmp_path):
+    store = SnapshotSpillStore(tmp_path / "spill.db")
+    budget = SnapshotMemoryBudget(store=store)
+    media_file = create_media_file("1.wav")
+    snapshots = SnapshotList(budget, [media_file])
+    snapshots.append(replace_media_file(media_file, "metadata.track_number", 1))
+    snapshots.append(replace_media_file(snapshots[-1], "metadata.track_number", 2))
+
+    # The second snapshot shares everything but metadata with the first one
+    assert budget.resident_size == get_snapshot_size(media_file) + get_snapshot_size(snapshots[1], media_file)
+    assert get_snapshot_size(snapshots[1], media_file) < get_snapshot_size(snapshots[1])
+    store.close()
+
+
+def test_snapshot_list_shares_reloaded_models(tmp_path):
+    store = SnapshotSpillStore(tmp_path / "spill.db")
+    budget = SnapshotMemoryBudget(max_resident_size=0, store=store)
+    media_file = create_media_file("1.wav")
+    snapshots = SnapshotList(budget, [media_file])
+    snapshots.append(replace_media_file(media_file, "metadata.track_number", 1))
+    assert snapshots._slots[0].value is None
+
+    reloaded = snapshots[0]
+    assert reloaded == media_file
+    assert reloaded.info is snapshots[1].info
+    assert reloaded.metadata is not snapshots[1].metadata
+    assert reloaded.metadata.album_cover is snapshots[1].metadata.album_cover
+    store.close()
+
+
+def test_registry_history_limit(registry, tmp_path):
+    registry.set_history_limit(2, tmp_path / "spill.db")
+    registry.add(create_media_file("1.wav"))
+    versions = [registry.get("1.wav")]
+    for i in range(5):
+        versions.append(replace_media_file(versions[-1], "metadata.track_number", i))
+        registry.update("1.wav", versions[-1])
+
+    assert [registry.get("1.wav", i) for i in range(1, len(versions))] == versions[1:]
+    assert registry.get("1.wav") == versions[-1]
+
+
+def test_dump_and_load_media_file():
+    media_file = create_media_file("1.wav")
+    media_file.info = FileInfo(
+        filename="1.wav",
+        file_format="wav",
+        bit_rate=1411200,
+        bit_depth=16,
+        sample_rate=44100,
+        duration=1.5,
+        codec=Codec(name="pcm_s16le", type="audio", long_name=None)
+    )
+    media_file.metadata.album_cover = AlbumCover(image_path=Path("cover.png"), image_file_format="png")
+    media_file.metadata.year_of_composition = datetime.date(2001, 2, 3)
+    assert load_media_file(dump_media_file(media_file)) == media_file
+
+
+def test_snapshot_journal(tmp_path):
+    journal = SnapshotJournal(tmp_path / "journal" / "snapshots.jsonl")
+    assert journal.read() == []
+
+    journal.append("add", name="1.wav")
+    journal.append("remove", name="1.wav", version=None)
+    with open(journal.file_path, "a", encoding="utf-8") as output:
+        output.write('{"op": "broken')
+    assert journal.read() == [{"op": "add", "name": "1.wav"}, {"op": "remove", "name": "1.wav", "version": None}]
+
+    journal.rewrite([{"op": "versions", "name": "1.wav"}])
+    assert journal.read() == [{"op": "versions", "name": "1.wav"}]
+
+    journal.clear()
+    assert journal.read() == []
+
+
+def test_registry_replays_journal(tmp_path):
+    journal_path = tmp_path / "snapshots.jsonl"
+    registry = create_registry()
+    registry.set_journal(SnapshotJournal(journal_path))
+    for name in ("1.wav", "2.wav", "3.wav"):
+        registry.add(create_media_file(name))
+    registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Rock"))
+    registry.remove("2.wav")
+    registry.add_global_snapshot(registry.get("3.wav"))
+
+    restored = create_registry()
+    restored.set_journal(SnapshotJournal(journal_path))
+    assert restored.replay_journal() == 2
+    assert restored.values() == registry.values()
+    assert restored.get("1.wav", 1).metadata.genre == "Rock"
+    # Every new version is a global snapshot
+    assert restored.get_global_snapshot(0) == registry.get("1.wav")
+    assert restored.get_global_snapshot(1) == registry.get("3.wav")
+
+    # Journal is compacted after replay and gives the same state
+    entries = SnapshotJournal(journal_path).read()
+    assert [i["op"] for i in entries] == ["versions", "versions", "global_snapshots"]
+
+    compacted = create_registry()
+    compacted.set_journal(SnapshotJournal(journal_path))
+    assert compacted.replay_journal() == 2
+    assert compacted.get("1.wav", 1) == registry.get("1.wav", 1)
+    assert compacted.values() == registry.values()
+
+
+def test_registry_batch_emits_one_signal(registry):
+    for name in ("1.wav", "2.wav"):
+        registry.add(create_media_file(name))
+
+    modified, batches = [], []
+    registry.sig_snapshot_modified.connect(modified.append)
+    registry.sig_snapshots_modified.connect(batches.append)
+    with registry.batch():
+        for name in ("1.wav", "2.wav"):
+            registry.update(name, replace_media_file(registry.get(name), "metadata.genre", "Rock"))
+        with registry.batch():
+            registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Pop"))
+
+    assert modified == []
+    assert batches == [["1.wav", "2.wav"]]
+
+
+def test_registry_undoes_batch_at_once(registry):
+    registry.add(create_media_file("1.wav"))
+    with registry.batch():
+        for genre in ("Rock", "Pop"):
+            registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", genre))
+
+    assert registry.get_global_snapshot_index() == 1
+    media_file, is_array_end = registry.update_global_snapshot_index(-1)
+    assert registry.get_global_snapshot_index() == -1
+    assert media_file.metadata.genre is None
+    assert registry.get("1.wav").metadata.genre is None
+    assert is_array_end
+
+    media_file, is_array_end = registry.update_global_snapshot_index(1)
+    assert registry.get_global_snapshot_index() == 1
+    assert media_file.metadata.genre == "Pop"
+    assert registry.get("1.wav").metadata.genre == "Pop"
+    assert is_array_end
+
+
+def test_registry_undoes_base_snapshot_group(registry):
+    registry.add(create_media_file("1.wav"))
+    registry.add_global_snapshot(registry.get("1.wav"))
+    with registry.batch():
+        registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Rock"))
+
+    media_file, is_array_end = registry.update_global_snapshot_index(-1)
+    assert registry.get_global_snapshot_index() == 0
+    assert media_file.metadata.genre is None
+    assert not is_array_end
+
+
+def test_registry_writes_batch_to_journal_at_once(tmp_path, registry):
+    journal_path = tmp_path / "snapshots.jsonl"
+    registry.set_journal(SnapshotJournal(journal_path))
+    registry.add(create_media_file("1.wav"))
+    with registry.batch():
+        registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Rock"))
+        assert [i["op"] for i in SnapshotJournal(journal_path).read()] == ["add"]
+
+    operations = [i["op"] for i in SnapshotJournal(journal_path).read()]
+    assert operations == ["add", "begin_batch", "update", "end_batch"]
+
+
+def test_registry_undo_restores_versions_of_batch(registry):
+    for name in ("1.wav", "2.wav"):
+        registry.add(create_media_file(name))
+    registry.add_global_snapshot(registry.get("1.wav"))
+    registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Jazz"))
+    with registry.batch():
+        for name in ("1.wav", "2.wav"):
+            registry.update(name, replace_media_file(registry.get(name), "metadata.genre", "Rock"))
+        registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Pop"))
+
+    previous_index = registry.get_global_snapshot_index()
+    registry.update_global_snapshot_index(-1)
+    assert registry.get_global_snapshot_names(previous_index, registry.get_global_snapshot_index()) == [
+        "1.wav", "2.wav"
+    ]
+    assert registry.get("1.wav").metadata.genre == "Jazz"
+    assert registry.get("2.wav").metadata.genre is None
+
+    registry.update_global_snapshot_index(1)
+    assert registry.get("1.wav").metadata.genre == "Pop"
+    assert registry.get("2.wav").metadata.genre == "Rock"
+
+
+def test_registry_update_outside_batch_can_be_undone(registry):
+    registry.add(create_media_file("1.wav"))
+    registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Rock"))
+    assert registry.get_global_snapshot_index() == 0
+
+    media_file, is_array_end = registry.update_global_snapshot_index(-1)
+    assert media_file.metadata.genre is None
+    assert registry.get("1.wav").metadata.genre is None
+    assert is_array_end
+    assert registry.get_global_snapshot_names(0, registry.get_global_snapshot_index()) == ["1.wav"]
+
+    # Nothing is left to undo
+    registry.update_global_snapshot_index(-1)
+    assert registry.get_global_snapshot_index() == -1
+    assert registry.get_global_snapshot_names(-1, -1) == []
+
+
+def test_registry_values_return_current_versions(registry):
+    for name in ("1.wav", "2.wav"):
+        registry.add(create_media_file(name))
+    first = registry.get("1.wav")
+    registry.update("1.wav", replace_media_file(first, "metadata.genre", "Rock"))
+
+    registry.update_global_snapshot_index(-1)
+    assert registry.values() == [first, registry.get("2.wav")]
+    assert registry.values(as_path=True) == [Path("1.wav"), Path("2.wav")]
+
+
+def test_registry_new_change_drops_undone_changes(registry):
+    registry.add(create_media_file("1.wav"))
+    for genre in ("Rock", "Pop"):
+        registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", genre))
+
+    registry.update_global_snapshot_index(-1)
+    assert registry.get("1.wav").metadata.genre == "Rock"
+    registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Jazz"))
+    assert registry.get_global_snapshot_index() == 1
+
+    # Undo restores the version before the new change, not the undone one
+    registry.update_global_snapshot_index(-1)
+    assert registry.get("1.wav").metadata.genre == "Rock"
+    _, is_array_end = registry.update_global_snapshot_index(1)
+    assert registry.get("1.wav").metadata.genre == "Jazz"
+    assert is_array_end
+    assert [i.metadata.genre for i in (registry.get("1.wav", v) for v in range(1, 3))] == ["Rock", "Jazz"]
+
+
+def test_registry_without_global_snapshots_has_nothing_to_undo(registry):
+    assert registry.update_global_snapshot_index(-1) == (None, True)
+
+
+def test_registry_replay_skips_unfinished_batch(tmp_path):
+    journal_path = tmp_path / "snapshots.jsonl"
+    registry = create_registry()
+    registry.set_journal(SnapshotJournal(journal_path))
+    registry.add(create_media_file("1.wav"))
+    media_file = replace_media_file(registry.get("1.wav"), "metadata.genre", "Rock")
+    # Write of the batch was cut off before `end_batch`
+    journal = SnapshotJournal(journal_path)
+    journal.append("begin_batch")
+    journal.append("update", name="1.wav", version=None, media_file=dump_media_file(media_file))
+
+    restored = create_registry()
+    restored.set_journal(SnapshotJournal(journal_path))
+    assert restored.replay_journal() == 1
+    assert restored.get("1.wav").metadata.genre is None
+    assert restored.get_global_snapshot(0) is None
+
+
+def test_registry_replays_undo(tmp_path):
+    journal_path = tmp_path / "snapshots.jsonl"
+    registry = create_registry()
+    registry.set_journal(SnapshotJournal(journal_path))
+    registry.add(create_media_file("1.wav"))
+    registry.update("1.wav", replace_media_file(registry.get("1.wav"), "metadata.genre", "Rock"))
+    registry.update_global_snapshot_index(-1)
+
+    restored = create_registry()
+    restored.set_journal(SnapshotJournal(journal_path))
+    restored.replay_journal()
+    assert restored.get("1.wav").metadata.genre is None
+    restored.update_global_snapshot_index(1)
+    assert restored.get("1.wav").metadata.genre == "Rock"
+
+
+def test_registry_undoes_synced_local_snapshot(registry):
+    registry.add(create_media_file("1.wav"))
+    registry.add_local_snapshot("1.wav", registry.get("1.wav"))
+    registry.add_local_change("1.wav", "metadata.genre", "Rock")
+    registry.sync_local_to_global("1.wav")
+    registry.sync_global_to_inner()
+    # The synced snapshot isn't added again
+    registry.sync_global_to_inner()
+    assert registry.get("1.wav").metadata.genre == "Rock"
+    assert registry.get("1.wav", 1).metadata.genre == "Rock"
+    assert len(registry._inner_snapshots["1.wav"]) == 2
+
+    registry.update_global_snapshot_index(-1)
+    assert registry.get("1.wav").metadata.genre is None
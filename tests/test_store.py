@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+
+from pieapp.api.converter import store
+from pieapp.api.converter.store import ContentStore
+
+
+def create_file(file_path: Path, data: bytes) -> Path:
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(data)
+    return file_path
+
+
+def test_content_store_stores_unchanged_files_once(tmp_path):
+    content_store = ContentStore(tmp_path / "store")
+    source = create_file(tmp_path / "A" / "1.wav", b"data")
+    first = content_store.add(source)
+    second = content_store.add(source)
+    other = content_store.add(create_file(tmp_path / "C" / "1.wav", b"other data"))
+
+    assert first == second
+    assert first.name == "1.wav"
+    assert content_store.contains(first)
+    assert first.read_bytes() == b"data"
+    assert other.parent != first.parent
+    assert other.read_bytes() == b"other data"
+
+    # Modified source is stored again
+    os.utime(source, ns=(0, 0))
+    assert content_store.add(source) != first
+
+
+def test_content_store_doesnt_read_sources(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(store, "get_content_hash", calls.append)
+    file_path = create_file(tmp_path / "1.wav", b"data")
+    content_store = ContentStore(tmp_path / "store")
+    stored_path = content_store.add(file_path)
+    content_store.save()
+
+    assert ContentStore(tmp_path / "store").add(file_path) == stored_path
+    assert calls == []
+
+
+def test_content_store_deduplicates_identical_files(tmp_path):
+    content_store = ContentStore(tmp_path / "store")
+    first = content_store.add(create_file(tmp_path / "A" / "1.wav", b"data"))
+    second = content_store.add(create_file(tmp_path / "B" / "1.wav", b"data"))
+    renamed = content_store.add(create_file(tmp_path / "B" / "2.wav", b"data"))
+    other = content_store.add(create_file(tmp_path / "C" / "1.wav", b"atad"))
+    assert len({first, second, renamed}) == 3
+
+    assert content_store.deduplicate() == 2
+    # Paths of the stored files are kept
+    assert second.samefile(first)
+    assert renamed.samefile(first)
+    assert renamed.read_bytes() == b"data"
+    assert not other.samefile(first)
+    assert content_store.deduplicate() == 0
+
+
+def test_content_store_add_takes_reference(tmp_path):
+    content_store = ContentStore(tmp_path / "store")
+    stored_path = content_store.add(create_file(tmp_path / "1.wav", b"data"))
+
+    # Imported file isn't removed before it is opened
+    assert content_store.collect() == 0
+    assert content_store.get_referenced_files() == [stored_path]
+
+
+def test_content_store_collects_unreferenced_files(tmp_path):
+    content_store = ContentStore(tmp_path / "store")
+    first = content_store.add(create_file(tmp_path / "1.wav", b"first"))
+    second = content_store.add(create_file(tmp_path / "2.wav", b"second"))
+    content_store.acquire(first)
+
+    content_store.release(first)
+    content_store.release(second)
+    assert content_store.collect() == 1
+    assert first.exists()
+    assert not second.parent.exists()
+
+    # References are saved with the index
+    assert ContentStore(tmp_path / "store").get_referenced_files() == [first]
+
+    content_store.release_all()
+    assert content_store.collect() == 1
+    assert content_store.get_referenced_files() == []
+
+
+def test_content_store_collect_prunes_index(tmp_path):
+    content_store = ContentStore(tmp_path / "store")
+    source = create_file(tmp_path / "1.wav", b"data")
+    stored_path = content_store.add(source)
+    content_store.add(create_file(tmp_path / "2.wav", b"data"))
+    content_store.deduplicate()
+    content_store.release_all()
+    content_store.collect()
+
+    assert content_store._sources == {}
+    assert content_store._hashes == {}
+    assert content_store._references == {}
+    # Removed file is stored again
+    assert not stored_path.exists()
+    assert content_store.add(source).exists()
@@ -0,0 +1,321 @@
+import sys
+import uuid
+import threading
+from pathlib import Path
+
+from PySide6.QtCore import QCoreApplication
+
+from pieapp.api.globals import Global
+from pieapp.api.converter.models import MediaFile
+from pieapp.api.converter.models import Metadata
+from pieapp.api.converter.models import AlbumCover
+from pieapp.api.converter.models import ProbeProfile
+from pieapp.api.converter.workers import ProbeWorker
+from pieapp.api.converter.workers import ConverterWorker
+from pieapp.api.converter.workers import MediaFileDetailsWorker
+from pieapp.api.converter.workers import ScanFilesWorker
+from pieapp.api.converter.workers import WorkingCopyWorker
+
+
+# ffprobe replacement: files with "broken" in the name can't be probed, full profile reads tags
+FAKE_FFPROBE = """
+import sys
+import json
+
+file_path = sys.argv[-1]
+if "broken" in file_path:
+    sys.stderr.write("Invalid data found when processing input")
+    sys.exit(1)
+
+if "garbage" in file_path:
+    print("not json")
+    sys.exit(0)
+
+if "video" in file_path:
+    print(json.dumps({"streams": [{"codec_name": "h264", "codec_type": "video"}], "format": {}}))
+    sys.exit(0)
+
+print(json.dumps({
+    "streams": [{
+        "codec_name": "aac",
+        "codec_type": "audio",
+        "sample_rate": "44100",
+        "channels": 2,
+        "channel_layout": "stereo",
+        "bit_rate": "256000",
+    }],
+    "format": {
+        "filename": file_path,
+        "duration": "10.5",
+        "bit_rate": "256000",
+        "tags": {"title": "Title", "genre": "Rock"} if "-show_format" in sys.argv else {},
+    },
+}))
+"""
+
+
+Global.import_module("pieapp.app.globals")
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def create_fake_ffprobe(directory: Path) -> Path:
+    file_path = directory / "ffprobe"
+    file_path.write_text(f"#!{sys.executable}\n{FAKE_FFPROBE}", encoding="utf-8")
+    file_path.chmod(0o755)
+    return file_path
+
+
+def create_media_files(directory: Path, names: list[str]) -> list[MediaFile]:
+    media_files = []
+    for name in names:
+        path = directory / name
+        path.write_bytes(b"\x00" * 16)
+        media_files.append(MediaFile(uuid=str(uuid.uuid4()), name=name, path=path, output_path=path))
+
+    return media_files
+
+
+def create_probe_worker(media_files: list[MediaFile], ffprobe_command: Path, **kwargs) -> ProbeWorker:
+    return ProbeWorker(media_files, ffprobe_command, **kwargs)
+
+
+def run_probe_worker(worker: ProbeWorker) -> dict[str, list]:
+    signals = {"completed_batch": [], "completed": [], "failed": []}
+    worker.signals.completed_batch.connect(lambda i: signals["completed_batch"].append(i))
+    worker.signals.completed.connect(lambda i: signals["completed"].append(i))
+    worker.signals.failed.connect(lambda i: signals["failed"].append(i))
+    worker.run()
+    assert worker.wait(10)
+    # Signals emitted from the process loop thread are queued
+    QCoreApplication.processEvents()
+    return signals
+
+
+def test_probe_worker_emits_batches(tmp_path):
+    media_files = create_media_files(tmp_path, [f"{i}.m4a" for i in range(7)])
+    worker = create_probe_worker(media_files, create_fake_ffprobe(tmp_path), max_processes=2, batch_size=3)
+    signals = run_probe_worker(worker)
+
+    assert signals["failed"] == []
+    assert all(len(i) <= 3 for i in signals["completed_batch"])
+    batch_names = sorted(i.name for batch in signals["completed_batch"] for i in batch)
+    assert batch_names == sorted(i.name for i in media_files)
+    assert len(signals["completed"]) == 1
+    assert sorted(i.name for i in signals["completed"][0]) == batch_names
+
+    media_file = signals["completed"][0][0]
+    assert media_file.info.codec.name == "aac"
+    assert media_file.info.sample_rate == 44100
+    assert media_file.info.duration == 10.5
+
+
+def test_probe_worker_failed_file_does_not_abort_batch(tmp_path):
+    media_files = create_media_files(tmp_path, ["1.m4a", "broken.m4a", "2.m4a"])
+    signals = run_probe_worker(create_probe_worker(media_files, create_fake_ffprobe(tmp_path)))
+
+    assert len(signals["failed"]) == 1
+    assert sorted(i.name for i in signals["completed"][0]) == ["1.m4a", "2.m4a"]
+
+
+def test_scan_files_worker_emits_batches(tmp_path):
+    for i in range(5):
+        (tmp_path / f"{i}.wav").write_bytes(b"")
+
+    worker = ScanFilesWorker([tmp_path], batch_size=2)
+    batches, completed = [], []
+    worker.signals.found_batch.connect(batches.append)
+    worker.signals.completed.connect(completed.append)
+    worker.run()
+
+    assert [len(i) for i in batches] == [2, 2, 1]
+    assert completed == [5]
+
+
+def test_probe_worker_reports_every_failed_file(tmp_path):
+    names = ["1.m4a", "broken.m4a", "garbage.m4a", "video.m4a"]
+    media_files = create_media_files(tmp_path, names)
+    signals = run_probe_worker(create_probe_worker(media_files, create_fake_ffprobe(tmp_path)))
+
+    errors = sorted(str(i) for i in signals["failed"])
+    assert len(errors) == 3
+    assert errors[0].startswith("broken.m4a: Invalid data")
+    assert errors[1].startswith("garbage.m4a: ")
+    assert errors[2] == "video.m4a: No audio stream found"
+    assert [i.name for i in signals["completed"][0]] == ["1.m4a"]
+
+
+class BrokenProbeCache:
+
+    def get(self, *args):
+        return None
+
+    def put(self, *args):
+        pass
+
+    def save(self):
+        raise OSError("disk is full")
+
+
+def test_probe_worker_always_completes(tmp_path):
+    media_files = create_media_files(tmp_path, ["1.m4a"])
+    worker = create_probe_worker(media_files, create_fake_ffprobe(tmp_path), cache=BrokenProbeCache())
+    signals = run_probe_worker(worker)
+
+    assert [str(i) for i in signals["failed"]] == ["disk is full"]
+    assert [i.name for i in signals["completed"][0]] == ["1.m4a"]
+
+
+class FakeCoverCache:
+
+    def get_album_cover(self, media_file: MediaFile) -> AlbumCover:
+        return AlbumCover(image_path=media_file.path.with_suffix(".png"))
+
+
+def test_media_file_details_worker_keeps_edited_fields(tmp_path):
+    ffprobe_command = create_fake_ffprobe(tmp_path)
+    media_file = run_probe_worker(create_probe_worker(create_media_files(tmp_path, ["1.m4a"]), ffprobe_command))
+    media_file = media_file["completed"][0][0]
+    assert media_file.probe_profile == ProbeProfile.Summary
+    media_file.metadata = Metadata(title="Edited")
+
+    worker = MediaFileDetailsWorker(media_file, ffprobe_command, FakeCoverCache())
+    completed, failed = [], []
+    worker.signals.completed.connect(lambda *args: completed.append(args))
+    worker.signals.failed.connect(failed.append)
+    worker.run()
+    QCoreApplication.processEvents()
+
+    assert failed == []
+    details, album_cover = completed[0]
+    assert album_cover.image_path == tmp_path / "1.png"
+    assert details.probe_profile == ProbeProfile.Full
+    assert details.metadata.title == "Edited"
+    assert details.metadata.genre == "Rock"
+    assert details.info.duration == 10.5
+    # Summary model may be shared by snapshots and is left as is
+    assert details is not media_file
+    assert media_file.probe_profile == ProbeProfile.Summary
+    assert media_file.metadata.genre is None
+
+
+def test_media_file_details_worker_completes_on_failure(tmp_path):
+    media_file = create_media_files(tmp_path, ["broken.m4a"])[0]
+    worker = MediaFileDetailsWorker(media_file, create_fake_ffprobe(tmp_path), FakeCoverCache())
+    completed, failed = [], []
+    worker.signals.completed.connect(lambda *args: completed.append(args))
+    worker.signals.failed.connect(failed.append)
+    worker.run()
+    QCoreApplication.processEvents()
+
+    assert len(failed) == 1
+    assert completed[0][0] is media_file
+
+
+def test_working_copy_worker(tmp_path):
+    media_files = create_media_files(tmp_path, ["1.wav", "2.wav"])
+    media_files[0].is_reference = True
+    (tmp_path / "2.wav").unlink()
+    media_files[1].is_reference = True
+
+    worker = WorkingCopyWorker(media_files, tmp_path / "temp")
+    completed, failed = [], []
+    worker.signals.completed.connect(completed.append)
+    worker.signals.failed.connect(failed.append)
+    worker.run()
+
+    # Missing file doesn't stop the rest
+    assert len(failed) == 1
+    working_copy = completed[0][0]
+    assert not working_copy.is_reference
+    assert working_copy.path.is_relative_to(tmp_path / "temp")
+    assert working_copy.path.read_bytes() == media_files[0].path.read_bytes()
+
+
+class QueueingProbeCache:
+    """
+    Adds files to the queue of the running worker
+    """
+
+    def __init__(self, media_files: list[MediaFile]) -> None:
+        self.worker: ProbeWorker = None
+        self._media_files = media_files
+
+    def get(self, *args):
+        if self._media_files:
+            assert not self.worker.add(self._media_files)
+            self._media_files = []
+        return None
+
+    def put(self, *args):
+        pass
+
+    def save(self):
+        pass
+
+
+def test_probe_worker_shares_queue_between_batches(tmp_path):
+    media_files = create_media_files(tmp_path, [f"{i}.m4a" for i in range(6)])
+    cache = QueueingProbeCache(media_files[4:])
+    worker = create_probe_worker([], create_fake_ffprobe(tmp_path), max_processes=1, cache=cache)
+    cache.worker = worker
+    assert not worker.add([])
+    assert worker.add(media_files[:3])
+    # Worker is started once, the next batches are added to its queue
+    assert not worker.add(media_files[3:4])
+    signals = run_probe_worker(worker)
+
+    assert signals["failed"] == []
+    probed_names = sorted(i.name for completed in signals["completed"] for i in completed)
+    assert probed_names == sorted(i.name for i in media_files)
+    # Queue is drained, so the next batch starts the worker again
+    assert worker.add(create_media_files(tmp_path, ["6.m4a"]))
+
+
+class BlockingProbeCache:
+    """
+    Keeps the file in the cache lookup until it is released
+    """
+
+    def __init__(self) -> None:
+        self.released = threading.Event()
+
+    def get(self, *args):
+        self.released.wait(10)
+        return None
+
+    def put(self, *args):
+        pass
+
+    def save(self):
+        pass
+
+
+def test_probe_worker_run_does_not_wait_for_probe(tmp_path):
+    media_files = create_media_files(tmp_path, ["1.m4a"])
+    cache = BlockingProbeCache()
+    worker = create_probe_worker(media_files, create_fake_ffprobe(tmp_path), cache=cache)
+    completed = []
+    worker.signals.completed.connect(completed.append)
+
+    # The pool thread is released while the file is probed on the process loop
+    worker.run()
+    assert not worker.wait(0.1)
+    cache.released.set()
+    assert worker.wait(10)
+    QCoreApplication.processEvents()
+    assert [i.name for i in completed[0]] == ["1.m4a"]
+
+
+def test_converter_worker_emits_result(tmp_path):
+    media_files = create_media_files(tmp_path, ["1.wav"])
+    # Output file format isn't supported, so no ffmpeg process is started
+    media_files[0].output_path = tmp_path / "output" / "1.m4a"
+    worker = ConverterWorker(media_files, tmp_path / "ffmpeg", max_processes=1)
+    completed = []
+    worker.signals.completed.connect(completed.append)
+
+    worker.run()
+    assert worker.wait(10)
+    QCoreApplication.processEvents()
+    assert [i.name for i in completed[0].skipped] == ["1.wav"]